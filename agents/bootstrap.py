@@ -0,0 +1,58 @@
+import os
+import json
+import time
+import logging
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("ChAIAgent.bootstrap")
+
+
+class BootstrapCache:
+    """
+    Short-lived local record of server state that `ChAIAgent` has already
+    verified (toolgroups registered), so a restart within `ttl` seconds can
+    skip those round trips.
+
+    Entries are keyed by everything the verification depended on; changing
+    the LlamaStack URL, vector DB id or MCP endpoint misses the cache.
+    """
+
+    def __init__(self, path: Path, ttl: float):
+        self.path = Path(path)
+        self.ttl = ttl
+
+    def _read(self) -> dict:
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key: str) -> Optional[dict]:
+        if self.ttl <= 0:
+            return None
+        entry = self._read().get(key)
+        if not entry or time.time() - entry.get("verified_at", 0) > self.ttl:
+            return None
+        return entry
+
+    def put(self, key: str, **state):
+        if self.ttl <= 0:
+            return
+        data = self._read()
+        now = time.time()
+        data = {k: v for k, v in data.items() if now - v.get("verified_at", 0) <= self.ttl}
+        data[key] = {"verified_at": now, **state}
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps(data))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("Could not write bootstrap cache %s: %s", self.path, e)
+
+    def invalidate(self, key: str):
+        data = self._read()
+        if data.pop(key, None) is not None:
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps(data))
+            os.replace(tmp, self.path)
@@ -0,0 +1,107 @@
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("ChAIAgent.cache")
+
+
+class SemanticAnswerCache:
+    """
+    Prompt-embedding cache for agent answers.
+
+    Prompts are embedded with the agent's shared `BatchEmbedder` and kept in a
+    fixed-size matrix, so lookup is a single matrix-vector product. Entries
+    expire after `ttl` seconds; when full, the least recently used entry is
+    evicted. The whole cache is dropped whenever the corpus version changes.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        threshold: float = 0.95,
+        ttl: float = 3600.0,
+        max_entries: int = 512,
+    ):
+        import numpy as np
+
+        self._np = np
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        dim = embedder.dim
+
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._values: list = [None] * max_entries
+        self._lock = threading.RLock()
+        self._last_embedding = None
+        self.corpus_version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        logger.info("Semantic cache ready (model=%s, threshold=%.2f, ttl=%ss, size=%d)",
+                    embedder.model_name, threshold, ttl, max_entries)
+
+    def _embed(self, prompt: str):
+        # get() followed by put() for the same prompt is the common miss path
+        last = self._last_embedding
+        if last is not None and last[0] == prompt:
+            return last[1]
+        vec = self.embedder.encode([prompt.strip()])[0]
+        self._last_embedding = (prompt, vec)
+        return vec
+
+    def _sync_version(self, corpus_version: Optional[str]):
+        if corpus_version != self.corpus_version:
+            if self._valid.any():
+                logger.info("Corpus changed (%s → %s); clearing answer cache",
+                            self.corpus_version, corpus_version)
+            self.clear()
+            self.corpus_version = corpus_version
+
+    def get(self, prompt: str, corpus_version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        np = self._np
+        vec = self._embed(prompt)
+        now = time.time()
+        with self._lock:
+            self._sync_version(corpus_version)
+            self._valid &= (now - self._created) < self.ttl
+            if not self._valid.any():
+                self.misses += 1
+                return None
+            sims = self._vectors @ vec
+            sims[~self._valid] = -np.inf
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._last_used[best] = now
+            self.hits += 1
+            logger.debug("Cache hit (sim=%.3f) for %r", sims[best], prompt)
+            return dict(self._values[best])
+
+    def put(self, prompt: str, value: Dict[str, Any], corpus_version: Optional[str] = None):
+        np = self._np
+        vec = self._embed(prompt)
+        now = time.time()
+        with self._lock:
+            self._sync_version(corpus_version)
+            self._valid &= (now - self._created) < self.ttl
+            free = np.flatnonzero(~self._valid)
+            slot = int(free[0]) if free.size else int(np.argmin(self._last_used))
+            self._vectors[slot] = vec
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self._valid[slot] = True
+            self._values[slot] = dict(value)
+
+    def clear(self):
+        with self._lock:
+            self._valid[:] = False
+            self._values = [None] * self.max_entries
+
+    def __len__(self) -> int:
+        return int(self._valid.sum())
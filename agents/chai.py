@@ -1,22 +1,34 @@
 import os
 import json
+import time
+import uuid
+import asyncio
+import threading
 import yaml
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
-from typing import List, Any, Dict
+from typing import TYPE_CHECKING, List, Any, Dict, Iterator, AsyncIterator, Optional
 
-from llama_stack_client import LlamaStackClient, Agent, RAGDocument
-from llama_stack_client.types import UserMessage
-from llama_stack_client.lib.agents.event_logger import EventLogger
-from memory.chroma_store import ChromaMemoryStore
+from llama_stack_client import LlamaStackClient, AsyncLlamaStackClient, Agent, RAGDocument
+from llama_stack_client.types import SystemMessage, UserMessage
+from agents.bootstrap import BootstrapCache
+from agents.ingest import IngestionManifest, iter_batches, iter_extracted
+from agents.pipelines import PipelineIndex, PipelineTool
+from agents.cache import SemanticAnswerCache
+from agents.chunking import chunk_document
+from agents.sessions import AsyncSessionPool, SessionLedger
+from agents.singleflight import SingleFlight, TurnAbandoned, normalize_prompt
+from agents.telemetry import record_turn, turn_tokens
+from agents.tools import ToolResultCache, mcp_tools, tool_def
+from utils.metrics import REGISTRY, estimate_tokens, open_trace
 
-from rich.pretty import pprint
-from termcolor import cprint
-
-try:
-    from PyPDF2 import PdfReader
-except ImportError:
-    PdfReader = None
+if TYPE_CHECKING:
+    # Both pull in NumPy; imported where they are first used
+    from agents.embedding import BatchEmbedder
+    from agents.retriever import HybridRetriever
 
 
 # ── DEFAULT LOGGING ──
@@ -31,33 +43,103 @@ logging.getLogger("chromadb").setLevel(logging.INFO)
 
 logger = logging.getLogger("ChAIAgent")
 
-USE_CHROMA = True
-CHAT_HISTORY_FILE = Path(".chat_history.json")
-
-
 def load_config(path: str = "config.yaml") -> Dict[str, Any]:
     with open(path, "r") as f:
         return yaml.safe_load(f)
 
 
-def load_json_history() -> List[dict]:
-    if CHAT_HISTORY_FILE.exists():
-        data = json.loads(CHAT_HISTORY_FILE.read_text())
-        logger.debug("Loaded %d messages from disk history", len(data))
-        return data
-    logger.debug("No disk history found at %s", CHAT_HISTORY_FILE)
-    return []
+RAG_TOOL_NAMES = {"knowledge_search", "builtin::rag/knowledge_search"}
 
 
-def save_json_history(history: List[dict]):
-    CHAT_HISTORY_FILE.write_text(json.dumps(history, indent=2))
-    logger.debug("Saved %d messages to disk history", len(history))
+def rag_context(step) -> List[str]:
+    """
+    Text chunks returned by `knowledge_search` in a tool execution step.
+    """
+    if getattr(step, "tool", None) == "builtin::rag/knowledge_search":
+        return [item.text for item in step.output]
+    chunks = []
+    for resp in getattr(step, "tool_responses", None) or []:
+        if str(resp.tool_name) not in RAG_TOOL_NAMES:
+            continue
+        content = resp.content
+        items = content if isinstance(content, list) else [content]
+        chunks.extend(getattr(item, "text", item) for item in items if item)
+    return chunks
+
+
+def stream_events(chunk) -> Iterator[dict]:
+    """
+    Translate one agent stream chunk into ChAI stream events:
+
+    - `{"type": "text", "delta": str}` as the model generates text
+    - `{"type": "tool_call", "tool_name": str, "arguments": str}` per executed tool call
+    - `{"type": "context", "chunks": [str]}` when `knowledge_search` returns
+    - `{"type": "done", "content": str, "context": [str]}` once the turn completes
+      (`context` is filled in by the caller)
+    """
+    event = getattr(chunk, "event", None)
+    payload = getattr(event, "payload", None)
+    if payload is None:
+        return
+    etype = payload.event_type
+    if etype == "step_progress":
+        delta = payload.delta
+        if getattr(delta, "type", None) == "text" and delta.text:
+            yield {"type": "text", "delta": delta.text}
+    elif etype == "step_complete" and payload.step_type == "tool_execution":
+        step = payload.step_details
+        for call in step.tool_calls:
+            yield {
+                "type": "tool_call",
+                "tool_name": str(call.tool_name),
+                "arguments": getattr(call, "arguments_json", None) or json.dumps(call.arguments),
+            }
+        chunks = rag_context(step)
+        if chunks:
+            yield {"type": "context", "chunks": chunks}
+    elif etype == "turn_complete":
+        yield {"type": "done", "content": payload.turn.output_message.content, "context": []}
+
+
+def with_prefetched_context(prompt: str, chunks: List[str]) -> str:
+    """
+    Prompt with locally retrieved chunks attached in the same `[BEGIN]`/`[END]`
+    framing `knowledge_search` results use.
+    """
+    if not chunks:
+        return prompt
+    body = "\n\n".join(chunks)
+    return f"{prompt}\n\nRelevant documentation:\n[BEGIN]\n{body}\n[END]"
+
+
+def with_recalled_messages(prompt: str, messages: Optional[List[dict]]) -> str:
+    """
+    Prompt with relevant earlier messages (from `recall`) attached, oldest
+    first, instead of replaying the whole conversation.
+    """
+    if not messages:
+        return prompt
+    lines = [f"{m['role']}: {m['content']}" for m in sorted(messages, key=lambda m: m.get("ts") or 0)]
+    return "Relevant earlier messages:\n" + "\n".join(lines) + f"\n\nQuestion:\n{prompt}"
+
+
+def completed_turn(chunk):
+    """
+    The finished `Turn` carried by a `turn_complete` chunk, else None.
+    """
+    payload = getattr(getattr(chunk, "event", None), "payload", None)
+    if getattr(payload, "event_type", None) == "turn_complete":
+        return payload.turn
+    return None
 
 
 def step_printer(steps):
     """
     Print formatted steps when stream=False
     """
+    from rich.pretty import pprint
+    from termcolor import cprint
+
     for i, step in enumerate(steps):
         tname = type(step).__name__
         print(f"\n{'-'*10} 📍 Step {i+1}: {tname} {'-'*10}")
@@ -85,6 +167,9 @@ def step_printer(steps):
 
 class ChAIAgent:
     def __init__(self, config_path: str = "config.yaml", thread_id: str = "chat_memory"):
+        t_start = time.perf_counter()
+        self.startup_timings: Dict[str, float] = {}
+
         # Load config & optionally enable DEBUG
         cfg = load_config(config_path)
         lvl = cfg.get("logging", {}).get("level", "").upper()
@@ -108,10 +193,30 @@ class ChAIAgent:
         self.sse_url = f"{self.mcp_url}/sse"
         logger.debug("Using MCP server URL: %s", self.mcp_url)
 
+        # Read-only mcp::chris tools answered from a client-side TTL cache
+        tc_cfg = mcp_cfg.get("cache", {})
+        self.cacheable_tools = list(tc_cfg.get("tools") or [])
+        self.tool_cache = ToolResultCache(
+            ttl=float(tc_cfg.get("ttl_seconds", 300)),
+            max_entries=int(tc_cfg.get("max_entries", 1024)),
+        ) if self.cacheable_tools else None
+
         # LlamaStack client & model
         ls_cfg = cfg["llama_stack"]
-        self.client = LlamaStackClient(base_url=ls_cfg["base_url"])
+        self.base_url = ls_cfg["base_url"]
+        # client-side retries of failed requests (408/409/429/5xx, connection errors)
+        self.max_retries = int(ls_cfg.get("max_retries", 2))
+        self.client = LlamaStackClient(base_url=self.base_url, max_retries=self.max_retries)
         self.model = ls_cfg["model"]
+        self.max_concurrency = int(ls_cfg.get("max_concurrency", 8))
+        # Bounded server-side history: rotate sessions past the token budget
+        self.session_ledger = SessionLedger(
+            budget=int(ls_cfg.get("session_token_budget", 6000)),
+            carry_turns=int(ls_cfg.get("session_carry_turns", 2)),
+        )
+        self.summary_tokens = int(ls_cfg.get("session_summary_tokens", 300))
+        # Pretty-print every step to stdout (rich/termcolor); off by default
+        self.debug_steps = bool(ls_cfg.get("debug_steps", False))
         logger.debug("LlamaStackClient @ %s, model=%s", ls_cfg["base_url"], self.model)
 
         # Vector DB settings
@@ -128,19 +233,136 @@ class ChAIAgent:
         # Ingestion settings
         ing = cfg["ingestion"]
         self.docs_dir = Path(ing["local_docs_dir"])
-        logger.debug("Ingest: docs_dir=%s", self.docs_dir)
+        self.rebuild_stale_ratio = float(ing.get("rebuild_stale_ratio", 0.25))
+        self.ingest_workers = int(ing.get("workers", 4))
+        self.ingest_queue_size = int(ing.get("queue_size", 16))
+        self.batch_max_docs = int(ing.get("batch_max_docs", 32))
+        self.batch_max_bytes = int(ing.get("batch_max_bytes", 4 * 1024 * 1024))
+        self.insert_retries = int(ing.get("insert_retries", 3))
+        # `local`: heading-aware chunking + batched local embedding, vectors
+        # inserted via vector_io; `remote`: rag_tool.insert does both server-side
+        self.ingest_pipeline = ing.get("pipeline", "local")
+        self.chunk_overlap = int(ing.get("chunk_overlap", 64))
+        self.embed_batch_size = int(ing.get("embed_batch_size", 64))
+        self.embed_threads = int(ing.get("embed_threads", 0))
+        self.embedding_cache_path = ing.get("embedding_cache", ".chai_embeddings.db")
+        self._embedder: Optional["BatchEmbedder"] = None
+        self._embedder_failed = False
+        self._embedder_lock = threading.Lock()
+        self.manifest = IngestionManifest(
+            Path(ing.get("manifest_path", ".ingest_manifest.json")), self.vector_db
+        )
+        logger.debug("Ingest: docs_dir=%s manifest=%s", self.docs_dir, self.manifest.path)
+
+        # Per-turn metrics: Prometheus registry (+ optional HTTP endpoint and JSONL trace)
+        m_cfg = cfg.get("metrics", {})
+        self.trace = open_trace(m_cfg.get("trace_path"))
+        if m_cfg.get("http_port"):
+            server = REGISTRY.serve(int(m_cfg["http_port"]))
+            logger.info("Serving metrics on :%s/metrics", server.server_address[1])
+
+        self.bootstrap_cache = BootstrapCache(
+            Path(ls_cfg.get("bootstrap_cache_path", ".chai_bootstrap.json")),
+            float(ls_cfg.get("bootstrap_cache_ttl", 300)),
+        )
+        self._bootstrap_key = f"{self.base_url}|{self.vector_db}|{self.sse_url}"
+        self.mcp_tools: List[str] = []
+        self.mcp_tool_defs: List[dict] = []
+        # False if mcp::chris could not be registered; the agent runs without it
+        self.mcp_registered = True
+
+        # Compiled plugin_tree DAGs; answers structural questions locally
+        p_cfg = cfg.get("pipelines", {})
+        self.pipeline_direct = bool(p_cfg.get("answer_directly", True))
+        self.pipeline_index = self._timed("pipelines", self._open_pipeline_index, p_cfg)
+
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="chai-bootstrap") as pool:
+            # Register toolgroups (skipped if a recent start already did) while
+            # the vector DB is checked
+            self._bootstrap_server_state(pool)
+
+            # Sync docs (only new/changed files are inserted) while the agent
+            # and its session are created; neither depends on the other
+            ingest = pool.submit(self._timed, "ingest", self._ingest_documents)
+            self.agent = self._timed("agent", self._create_agent)
+            self.session_id = self._timed("session", self.agent.create_session, "chris_session")
+            logger.debug("Session created: %s", self.session_id)
+            ingest.result()
 
-        # Register toolgroups & ingest docs
-        self._register_toolgroups()
-        if self._ensure_vector_db():
-            self._ingest_documents()
+        # Answer cache (greedy decoding makes answers reusable)
+        self.answer_cache = self._timed("answer_cache", self._create_answer_cache)
 
-        # Build agent + session
-        self.agent = self._create_agent()
-        self.session_id = self.agent.create_session("chris_session")
-        logger.debug("Session created: %s", self.session_id)
+        # Local BM25 + dense index over the same corpus (see retrieve()); built
+        # in the background once startup is done, so neither startup nor a
+        # turn ever waits for it
+        self.retrieval_cfg = cfg.get("retrieval", {})
+        self.prefetch_k = int(self.retrieval_cfg.get("prefetch_k", 0))
+        self.retriever: Optional["HybridRetriever"] = None
+        self._retriever_failed = not self.retrieval_cfg.get("enabled", False)
+        self._retriever_lock = threading.Lock()
+        self._retriever_thread: Optional[threading.Thread] = None
 
-    def _register_toolgroups(self):
+        # Identical concurrent questions share one in-flight turn
+        self.inflight = SingleFlight()
+
+        # Async side (see astart()); built lazily so sync-only callers never pay for it
+        self.async_client: Optional[AsyncLlamaStackClient] = None
+        self.async_agent = None
+        self.session_pool: Optional[AsyncSessionPool] = None
+        self._astart_lock: Optional[asyncio.Lock] = None
+
+        self.startup_seconds = time.perf_counter() - t_start
+        logger.info("ChAIAgent ready in %.2fs (%s)", self.startup_seconds,
+                    ", ".join(f"{k}={v:.2f}s" for k, v in self.startup_timings.items()))
+        self._refresh_retriever()
+
+    def _timed(self, phase: str, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.startup_timings[phase] = time.perf_counter() - t0
+
+    def _bootstrap_server_state(self, pool: ThreadPoolExecutor):
+        # The vector DB is always checked (one cheap list call): a restarted
+        # LlamaStack may have lost it even though the manifest says every
+        # document was inserted. Only toolgroup registration is cached.
+        vector_db = pool.submit(self._timed, "vector_db", self._ensure_vector_db)
+        cached = self.bootstrap_cache.get(self._bootstrap_key)
+        # tool proxies need the full definitions, which older entries lack
+        if cached and self.cacheable_tools and not cached.get("mcp_tool_defs"):
+            cached = None
+        confirmed = False
+        if cached:
+            self.mcp_tools = cached.get("mcp_tools", [])
+            self.mcp_tool_defs = cached.get("mcp_tool_defs", [])
+            logger.info("Using cached toolgroup state (verified %.0fs ago)",
+                        time.time() - cached["verified_at"])
+        else:
+            confirmed = self._timed("toolgroups", self._register_toolgroups)
+        if vector_db.result():
+            # Fresh vector DB: whatever the manifest says was never inserted here
+            self.manifest.reset()
+        # a failed registration is not cached, so the next start retries it
+        if confirmed:
+            self.bootstrap_cache.put(self._bootstrap_key, mcp_tools=self.mcp_tools,
+                                     mcp_tool_defs=self.mcp_tool_defs)
+
+    @classmethod
+    async def create(cls, config_path: str = "config.yaml", thread_id: str = "chat_memory") -> "ChAIAgent":
+        """
+        Async bootstrap: run the blocking setup off the event loop, then
+        bring up the async client, agent and session pool.
+        """
+        self = await asyncio.to_thread(cls, config_path, thread_id)
+        await self.astart()
+        return self
+
+    def _register_toolgroups(self) -> bool:
+        """
+        Register `builtin::rag` and `mcp::chris` if missing and fetch the MCP
+        tool list. False if `mcp::chris` could not be registered or listed.
+        """
         existing = {t.toolgroup_id for t in self.client.tools.list()}
         logger.debug("Existing toolgroups: %s", existing)
 
@@ -160,15 +382,20 @@ class ChAIAgent:
                 logger.info("Registered toolgroup: mcp::chris")
             except Exception as e:
                 logger.warning("Failed registering mcp::chris: %s", e)
+                self.mcp_registered = False
+                return False
         else:
             logger.info("Toolgroup mcp::chris already present")
 
         try:
             tools = self.client.tools.list(toolgroup_id="mcp::chris")
-            tool_ids = [t.identifier for t in tools]
-            logger.info("Tools available in mcp::chris: %s", tool_ids)
+            self.mcp_tools = [t.identifier for t in tools]
+            self.mcp_tool_defs = [tool_def(t) for t in tools]
+            logger.info("Tools available in mcp::chris: %s", self.mcp_tools)
         except Exception as e:
             logger.warning("Could not fetch tools for mcp::chris: %s", e)
+            return False
+        return True
 
     def _ensure_vector_db(self) -> bool:
         existing = {db.provider_resource_id for db in self.client.vector_dbs.list()}
@@ -185,46 +412,267 @@ class ChAIAgent:
         logger.debug("Vector DB %s already exists", self.vector_db)
         return False
 
-    def _ingest_documents(self):
-        logger.info("Ingesting docs into VectorDB `%s`", self.vector_db)
-        docs: List[RAGDocument] = []
+    def _rebuild_vector_db(self):
+        """
+        Drop and re-register the vector DB so stale chunks are purged.
+        The RAG tool has no per-document delete, so this is the only way
+        to get rid of chunks belonging to removed or superseded documents.
+        """
+        logger.info("Rebuilding vector DB `%s` (%d stale documents)",
+                    self.vector_db, len(self.manifest.stale))
+        try:
+            self.client.vector_dbs.unregister(self.vector_db)
+        except Exception as e:
+            logger.warning("Failed unregistering vector DB %s: %s", self.vector_db, e)
+        self._ensure_vector_db()
+        self.manifest.reset()
+
+    def embedder(self) -> Optional["BatchEmbedder"]:
+        """
+        Shared local embedder (created on first use), or None if
+        sentence-transformers is unavailable.
+        """
+        with self._embedder_lock:
+            if self._embedder is None and not self._embedder_failed:
+                try:
+                    from agents.embedding import BatchEmbedder, EmbeddingCache
+
+                    self._embedder = BatchEmbedder(
+                        self.embedding_model,
+                        batch_size=self.embed_batch_size,
+                        threads=self.embed_threads,
+                        cache=EmbeddingCache(Path(self.embedding_cache_path)),
+                        expected_dim=self.embedding_dim,
+                    )
+                except Exception as e:
+                    logger.warning("Local embedding unavailable: %s", e)
+                    self._embedder_failed = True
+            return self._embedder
+
+    def _local_chunks(self, batch) -> List[Dict[str, Any]]:
+        """
+        Heading-aware chunks for a batch of documents, with precomputed
+        embeddings, ready for `vector_io.insert`.
+        """
+        chunks = []
+        for f, _, doc in batch:
+            for i, chunk in enumerate(chunk_document(doc["content"], Path(f).suffix,
+                                                     self.chunk_size, self.chunk_overlap)):
+                chunks.append({
+                    "content": chunk["text"],
+                    "metadata": {
+                        "document_id": doc["document_id"],
+                        "source": str(f),
+                        "heading": chunk["heading"],
+                        "chunk_index": i,
+                        "token_count": estimate_tokens(chunk["text"]),
+                    },
+                    "hash": chunk["hash"],
+                })
+        vectors = self.embedder().embed([c["content"] for c in chunks], [c.pop("hash") for c in chunks])
+        for chunk, vec in zip(chunks, vectors):
+            chunk["embedding"] = vec.tolist()
+        return chunks
+
+    def _insert_batch(self, batch) -> bool:
+        """
+        Insert one batch of extracted documents, retrying with exponential
+        backoff. Returns False if the batch still failed after all retries.
+        """
+        if self.ingest_pipeline == "local" and self.embedder() is not None:
+            docs = [f for f, _, _ in batch]
+            chunks = None
+
+            def insert():
+                # chunking and embedding fail the batch like the insert does
+                nonlocal chunks
+                if chunks is None:
+                    chunks = self._local_chunks(batch)
+                self.client.vector_io.insert(chunks=chunks, vector_db_id=self.vector_db)
+        else:
+            docs = [RAGDocument(**doc) for _, _, doc in batch]
 
-        # Local files
-        for f in self.docs_dir.rglob("*"):
+            def insert():
+                self.client.tool_runtime.rag_tool.insert(
+                    documents=docs,
+                    vector_db_id=self.vector_db,
+                    chunk_size_in_tokens=self.chunk_size
+                )
+
+        for attempt in range(1, self.insert_retries + 1):
             try:
-                if f.suffix == ".pdf" and PdfReader:
-                    text = "\n".join(p.extract_text() or "" for p in PdfReader(f).pages)
-                    docs.append(RAGDocument(
-                        document_id=f.name,
-                        content=text,
-                        mime_type="application/pdf",
-                        metadata={"source": str(f)}
-                    ))
-                elif f.suffix in {".md", ".txt", ".adoc"}:
-                    text = f.read_text(encoding="utf-8")
-                    docs.append(RAGDocument(
-                        document_id=f.name,
-                        content=text,
-                        mime_type="text/plain",
-                        metadata={"source": str(f)}
-                    ))
+                insert()
+                return True
             except Exception as e:
-                logger.warning("Failed reading %s: %s", f, e)
+                if attempt == self.insert_retries:
+                    logger.error("Giving up on batch of %d docs after %d attempts: %s",
+                                 len(docs), attempt, e)
+                    return False
+                delay = 2 ** (attempt - 1)
+                logger.warning("Insert of %d docs failed (attempt %d/%d): %s; retrying in %ds",
+                               len(docs), attempt, self.insert_retries, e, delay)
+                time.sleep(delay)
 
-        if docs:
-            self.client.tool_runtime.rag_tool.insert(
-                documents=docs,
-                vector_db_id=self.vector_db,
-                chunk_size_in_tokens=self.chunk_size
+    def _ingest_documents(self):
+        """
+        Bring the vector DB in line with `docs_dir` using the ingestion
+        manifest: insert new/changed documents and retire removed ones.
+        """
+        pending, removed = self.manifest.diff(self.docs_dir)
+        for key in removed:
+            self.manifest.forget(key)
+        for f, entry in pending:
+            self.manifest.record(str(f), entry)
+
+        if self.manifest.stale and self.manifest.stale_ratio() > self.rebuild_stale_ratio:
+            self._rebuild_vector_db()
+            pending, _ = self.manifest.diff(self.docs_dir)
+        elif self.manifest.stale:
+            logger.info("%d stale documents retained in `%s` (ratio %.2f <= %.2f)",
+                        len(self.manifest.stale), self.vector_db,
+                        self.manifest.stale_ratio(), self.rebuild_stale_ratio)
+
+        if not pending:
+            logger.info("VectorDB `%s` up to date (%d documents, %d removed)",
+                        self.vector_db, len(self.manifest.entries), len(removed))
+            self.manifest.save()
+            return
+
+        logger.info("Ingesting %d new/changed docs into VectorDB `%s`",
+                    len(pending), self.vector_db)
+        # Nothing counts as ingested until its batch has been inserted, so
+        # failures are retried on the next start
+        for f, _ in pending:
+            self.manifest.entries.pop(str(f), None)
+
+        def extracted():
+            for f, entry, doc, err in iter_extracted(
+                pending, workers=self.ingest_workers, max_in_flight=self.ingest_queue_size
+            ):
+                if err is not None:
+                    logger.warning("Failed reading %s: %s", f, err)
+                    continue
+                yield f, entry, doc
+
+        inserted = failed = 0
+        for batch in iter_batches(extracted(), self.batch_max_docs, self.batch_max_bytes):
+            if self._insert_batch(batch):
+                for f, entry, _ in batch:
+                    self.manifest.record(str(f), entry)
+                inserted += len(batch)
+                self.manifest.save()
+                logger.debug("Inserted batch of %d docs (%d so far)", len(batch), inserted)
+            else:
+                failed += len(batch)
+
+        logger.info("Inserted %d documents (%d failed)", inserted, failed)
+        self.manifest.save()
+
+    def _create_answer_cache(self) -> Optional[SemanticAnswerCache]:
+        ccfg = self.config.get("cache", {})
+        if not ccfg.get("enabled", False):
+            return None
+        embedder = self.embedder()
+        if embedder is None:
+            logger.warning("Answer cache disabled: no local embedder")
+            return None
+        try:
+            return SemanticAnswerCache(
+                embedder,
+                threshold=float(ccfg.get("similarity_threshold", 0.95)),
+                ttl=float(ccfg.get("ttl_seconds", 3600)),
+                max_entries=int(ccfg.get("max_entries", 512)),
             )
-            logger.info("Inserted %d documents", len(docs))
-        else:
-            logger.debug("No docs to ingest in %s", self.docs_dir)
+        except Exception as e:
+            logger.warning("Answer cache disabled: %s", e)
+            return None
 
-    def _create_agent(self) -> Agent:
-        logger.info("Creating RAG+MCP agent")
-        return Agent(
-            client=self.client,
+    def _build_retriever(self):
+        """
+        Open the local index and rebuild it if the corpus changed; runs on
+        the `chai-retriever` thread. The new retriever is only published
+        once it is in sync, so searches never see a half-built index.
+        """
+        r_cfg = self.retrieval_cfg
+        try:
+            from agents.retriever import HybridRetriever
+
+            retriever = HybridRetriever(
+                Path(r_cfg.get("index_dir", ".chai_index")),
+                embedder=self.embedder() if r_cfg.get("dense", True) else None,
+                chunk_tokens=self.chunk_size,
+                chunk_overlap=self.chunk_overlap,
+            )
+            retriever.sync(self.manifest)
+            self.retriever = retriever
+        except Exception as e:
+            logger.warning("Local retrieval disabled: %s", e)
+            self._retriever_failed = True
+
+    def _refresh_retriever(self):
+        """
+        Start a background build of the local index unless retrieval is off
+        or a build is already running.
+        """
+        with self._retriever_lock:
+            if self._retriever_failed or (self._retriever_thread is not None
+                                          and self._retriever_thread.is_alive()):
+                return
+            self._retriever_thread = threading.Thread(
+                target=self._build_retriever, name="chai-retriever", daemon=True)
+            self._retriever_thread.start()
+
+    def _open_pipeline_index(self, p_cfg: Dict[str, Any]) -> Optional[PipelineIndex]:
+        if not p_cfg.get("enabled", False):
+            return None
+        try:
+            return PipelineIndex(
+                Path(p_cfg.get("dir", "pipelines")),
+                Path(p_cfg.get("cache_path", ".chai_pipelines.json")),
+            )
+        except Exception as e:
+            logger.warning("Pipeline index disabled: %s", e)
+            return None
+
+    def _direct_answer(self, prompt: str) -> Optional[dict]:
+        """
+        Answer simple pipeline-structure questions straight from the DAG
+        index, skipping retrieval and generation.
+        """
+        if self.pipeline_index is None or not self.pipeline_direct:
+            return None
+        content = self.pipeline_index.answer(prompt)
+        return {"content": content, "context": []} if content else None
+
+    def retrieve(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Top-`k` chunks from the local index, without a server round trip.
+        Empty until the background build finishes; if the corpus changed
+        since the index was built, a rebuild starts and the old index keeps
+        answering until it is done.
+        """
+        retriever = self.retriever
+        if retriever is None or retriever.corpus_version != self.manifest.corpus_version:
+            self._refresh_retriever()
+        if retriever is None:
+            return []
+        return retriever.search(query, k)
+
+    def _prefetch(self, prompt: str, memory: Optional[List[dict]] = None):
+        """
+        Message content and pre-fetched context for a turn. With `prefetch_k`
+        set, local hits ride along with the prompt so the model can answer
+        without calling `knowledge_search`; `memory` (recalled messages) is
+        attached ahead of the question.
+        """
+        content = with_recalled_messages(prompt, memory)
+        if not self.prefetch_k:
+            return content, []
+        chunks = [hit["text"] for hit in self.retrieve(prompt, self.prefetch_k)]
+        return with_prefetched_context(content, chunks), chunks
+
+    def _agent_kwargs(self) -> Dict[str, Any]:
+        return dict(
             model=self.model,
             instructions=self.config["llama_stack"]["instructions"],
             tools=[
@@ -232,7 +680,9 @@ class ChAIAgent:
                     name="builtin::rag/knowledge_search",
                     args={"vector_db_ids": [self.vector_db]},
                 ),
-                "mcp::chris",
+                *(mcp_tools("mcp::chris", self.mcp_tool_defs, self.cacheable_tools,
+                            self.client, self.tool_cache) if self.mcp_registered else []),
+                *([PipelineTool(self.pipeline_index)] if self.pipeline_index else []),
             ],
             tool_config={"tool_choice": "auto"},
             sampling_params={
@@ -241,33 +691,417 @@ class ChAIAgent:
             },
         )
 
-    def ask(self, prompt: str, stream: bool = False) -> dict:
-        logger.debug("ask() ➞ prompt=%r, stream=%s", prompt, stream)
+    def _create_agent(self) -> Agent:
+        logger.info("Creating RAG+MCP agent")
+        return Agent(client=self.client, **self._agent_kwargs())
 
-        # Only send the current user prompt (agent's `instructions` is applied internally)
-        messages = [
-            UserMessage(role="user", content=prompt),
-        ]
-        logger.debug("Messages being sent → %s", messages)
+    async def astart(self):
+        """
+        Create the shared async client and agent used by `aask`. All
+        concurrent turns go through this one client's connection pool.
+        """
+        if self.session_pool is not None:
+            return
+        # created on the running loop; callers arriving during startup wait here
+        if self._astart_lock is None:
+            self._astart_lock = asyncio.Lock()
+        async with self._astart_lock:
+            if self.session_pool is not None:
+                return
+            from llama_stack_client.lib.agents.agent import AsyncAgent
 
-        resp = self.agent.create_turn(
-            messages=messages,
-            session_id=self.session_id,
-            stream=stream
-        )
+            client = AsyncLlamaStackClient(base_url=self.base_url, max_retries=self.max_retries)
+            try:
+                agent = AsyncAgent(client=client, **self._agent_kwargs())
+                await agent.initialize()
+            except BaseException:
+                await client.close()
+                raise
+            self.async_client, self.async_agent = client, agent
+            self.session_pool = AsyncSessionPool(agent, self.max_concurrency)
+        logger.info("Async agent ready (max_concurrency=%d)", self.max_concurrency)
 
-        if stream:
-            for entry in EventLogger().log(resp):
-                entry.print()
-            return {}
-
-        step_printer(resp.steps)
-        context = [
-            item.text
-            for step in resp.steps
-            if getattr(step, "tool", None) == "builtin::rag/knowledge_search"
-            for item in step.output
-        ]
-        content = resp.output_message.content
+    async def aclose(self):
+        if self.async_client is not None:
+            await self.async_client.close()
+        self.async_client = self.async_agent = self.session_pool = None
+        self._astart_lock = None
+
+    def _record(self, prompt: str, t0: float, mode: str, turn=None, outcome: str = "ok",
+                session_id: Optional[str] = None):
+        session_id = session_id or self.session_id
+        record_turn(prompt, time.perf_counter() - t0, mode, turn=turn, outcome=outcome,
+                    session_id=session_id, trace=self.trace)
+        if turn is not None:
+            self.session_ledger.record(session_id, prompt, str(turn.output_message.content),
+                                       turn_tokens(turn))
+        if self.debug_steps and turn is not None:
+            step_printer(turn.steps)
+
+    # ── Session rotation ──────────────────────────────────────────────────────
+    def _summarize(self, transcript: str) -> str:
+        """
+        Compact summary of a session transcript; empty if the model call
+        fails (the rotated session then carries only the recent turns).
+        """
+        try:
+            resp = self.client.inference.chat_completion(
+                model_id=self.model,
+                messages=[
+                    SystemMessage(role="system", content=(
+                        "Summarize this conversation between a user and a ChRIS assistant for "
+                        "the assistant's own later reference. Keep patient names, plugins, "
+                        "pipelines, measurements and open questions; drop pleasantries. "
+                        f"Answer in at most {self.summary_tokens} tokens.")),
+                    UserMessage(role="user", content=transcript),
+                ],
+                sampling_params={"max_tokens": self.summary_tokens, "strategy": {"type": "greedy"}},
+            )
+            return str(resp.completion_message.content).strip()
+        except Exception as e:
+            logger.warning("Session summary failed; carrying recent turns only: %s", e)
+            return ""
+
+    def _server_session(self, session_id: str) -> str:
+        """
+        Server session currently backing `session_id`, rotating it first if
+        its history is over budget.
+        """
+        if self.session_ledger.due(session_id):
+            summary = self._summarize(self.session_ledger.transcript(session_id))
+            fresh = self.agent.create_session(f"chris_session-{uuid.uuid4().hex[:8]}")
+            self.session_ledger.rotated(session_id, fresh, summary)
+        return self.session_ledger.current(session_id)
+
+    async def _aserver_session(self, session_id: str) -> str:
+        if self.session_ledger.due(session_id):
+            summary = await asyncio.to_thread(self._summarize, self.session_ledger.transcript(session_id))
+            fresh = await self.async_agent.create_session(f"chris_session-{uuid.uuid4().hex[:8]}")
+            self.session_ledger.rotated(session_id, fresh, summary)
+        return self.session_ledger.current(session_id)
+
+    def _seeded(self, session_id: str, content: str) -> str:
+        seed = self.session_ledger.take_seed(session_id)
+        return f"{seed}\n\nNew question:\n{content}" if seed else content
+
+    def _turn_result(self, turn, prefetched: Optional[List[str]] = None) -> dict:
+        context = list(prefetched or [])
+        context += [chunk for step in turn.steps for chunk in rag_context(step)]
+        content = turn.output_message.content
         logger.debug("Assistant → %r", content)
         return {"content": content, "context": context}
+
+    # ── Request coalescing ────────────────────────────────────────────────────
+    @staticmethod
+    def _flight_key(prompt: str, corpus_version: str) -> str:
+        return f"{corpus_version}|{normalize_prompt(prompt)}"
+
+    def _shareable(self, session_id: str, memory: Optional[List[dict]] = None) -> bool:
+        """
+        Whether a turn's answer may be shared with other callers (answer
+        cache, coalescing): only if it starts without conversation state,
+        since a follow-up ("summarize that") depends on its own history, and
+        without recalled `memory`, which is private to the caller's thread.
+        """
+        return not memory and self.session_ledger.fresh(session_id)
+
+    def _lead_or_wait(self, key: str):
+        """
+        `(flight, None)` if this caller should run the turn, `flight` being
+        its own future to settle, else `(None, result)` once the identical
+        turn already in flight has finished.
+        """
+        while True:
+            flight, leader = self.inflight.begin(key)
+            if leader:
+                return flight, None
+            try:
+                return None, dict(flight.result())
+            except TurnAbandoned:
+                continue
+
+    async def _alead_or_wait(self, key: str):
+        while True:
+            flight, leader = self.inflight.begin(key)
+            if leader:
+                return flight, None
+            try:
+                return None, dict(await asyncio.wrap_future(flight))
+            except TurnAbandoned:
+                continue
+
+    @contextmanager
+    def _leading(self, key: str, flight):
+        """
+        Scope of a leader's turn: waiters get its error if it fails, or are
+        told to run their own turn if it stops without a result. A turn that
+        is not shared (`flight` None) has no waiters.
+        """
+        if flight is None:
+            yield
+            return
+        try:
+            yield
+        except Exception as e:
+            self.inflight.finish(key, flight, error=e)
+            raise
+        finally:
+            self.inflight.finish(key, flight, error=TurnAbandoned())
+
+    # ── Turn pipeline ─────────────────────────────────────────────────────────
+    # Every mode runs the same steps: an early answer (pipeline index, answer
+    # cache), coalescing with an identical shared turn, prefetch, session
+    # rotation and seeding, the recorded turn, then caching the answer and
+    # handing it to waiters. Modes differ only in how the turn itself runs.
+    def _early_answer(self, prompt: str, corpus_version: str, shared: bool):
+        """
+        `(result, outcome)` for a question answered without a turn: straight
+        from the pipeline index or, for a shareable turn, the answer cache.
+        `(None, None)` otherwise.
+        """
+        direct = self._direct_answer(prompt)
+        if direct is not None:
+            return direct, "pipeline_index"
+        if shared and self.answer_cache:
+            cached = self.answer_cache.get(prompt, corpus_version)
+            if cached is not None:
+                logger.info("Answered from cache")
+                return cached, "cache_hit"
+        return None, None
+
+    def _turn_messages(self, session_id: str, content: str) -> List[UserMessage]:
+        # after rotation (_server_session), which sets the seed taken here
+        return [UserMessage(role="user", content=self._seeded(session_id, content))]
+
+    def _finish(self, key: str, flight, prompt: str, result: dict, corpus_version: str, shared: bool):
+        """
+        Cache a shareable answer and hand it to callers waiting on `flight`.
+        """
+        if shared and self.answer_cache:
+            self.answer_cache.put(prompt, result, corpus_version)
+        if flight is not None:
+            self.inflight.finish(key, flight, result)
+
+    def _recorded_turn(self, prompt: str, t0: float, mode: str, session_id: str, start):
+        """
+        The turn `start()` runs, recorded; a failure is recorded as an error.
+        """
+        try:
+            turn = start()
+        except Exception:
+            self._record(prompt, t0, mode, outcome="error", session_id=session_id)
+            raise
+        self._record(prompt, t0, mode, turn=turn, session_id=session_id)
+        return turn
+
+    async def _arecorded_turn(self, prompt: str, t0: float, mode: str, session_id: str, start):
+        try:
+            turn = await start()
+        except Exception:
+            self._record(prompt, t0, mode, outcome="error", session_id=session_id)
+            raise
+        self._record(prompt, t0, mode, turn=turn, session_id=session_id)
+        return turn
+
+    def _recorded_stream(self, prompt: str, t0: float, mode: str, session_id: str,
+                         start) -> Iterator:
+        """
+        Chunks of the streamed turn `start()` opens. The turn is recorded
+        once it completes, or as an error if opening or reading it fails.
+        """
+        done = False
+        try:
+            for chunk in start():
+                turn = completed_turn(chunk)
+                if turn is not None:
+                    done = True
+                    self._record(prompt, t0, mode, turn=turn, session_id=session_id)
+                yield chunk
+        except Exception:
+            if not done:
+                self._record(prompt, t0, mode, outcome="error", session_id=session_id)
+            raise
+
+    async def _arecorded_stream(self, prompt: str, t0: float, mode: str, session_id: str,
+                                start) -> AsyncIterator:
+        done = False
+        try:
+            async for chunk in await start():
+                turn = completed_turn(chunk)
+                if turn is not None:
+                    done = True
+                    self._record(prompt, t0, mode, turn=turn, session_id=session_id)
+                yield chunk
+        except Exception:
+            if not done:
+                self._record(prompt, t0, mode, outcome="error", session_id=session_id)
+            raise
+
+    @staticmethod
+    def _events(chunk, context: List[str]) -> Iterator[dict]:
+        """
+        ChAI events for one chunk of a live turn. Retrieved chunks are added
+        to `context`, which the `done` event carries.
+        """
+        for event in stream_events(chunk):
+            logger.debug("stream event: %s", event["type"])
+            if event["type"] == "context":
+                context.extend(event["chunks"])
+            elif event["type"] == "done":
+                event["context"] = context
+                logger.debug("Assistant → %r", event["content"])
+            yield event
+
+    @staticmethod
+    def _replay(result: dict) -> Iterator[dict]:
+        """
+        Events for an answer that did not come from a live turn (cache hit,
+        or a coalesced copy of another caller's turn).
+        """
+        yield {"type": "text", "delta": result["content"]}
+        if result.get("context"):
+            yield {"type": "context", "chunks": result["context"]}
+        yield {"type": "done", "content": result["content"], "context": result.get("context", [])}
+
+    # ── Sync ──────────────────────────────────────────────────────────────────
+    def ask(self, prompt: str, stream: bool = False, session_id: Optional[str] = None,
+            memory: Optional[List[dict]] = None):
+        """
+        Run one turn. Returns `{"content", "context"}`, or with `stream=True`
+        a generator of events (see `stream_events`) ending in a `done` event.
+        `session_id` defaults to the agent's own session; `memory` holds
+        recalled earlier messages to include with the prompt.
+        """
+        logger.debug("ask() ➞ prompt=%r, stream=%s", prompt, stream)
+        t0 = time.perf_counter()
+        session_id = session_id or self.session_id
+        mode = "stream" if stream else "sync"
+
+        corpus_version = self.manifest.corpus_version
+        shared = self._shareable(session_id, memory)
+        early, outcome = self._early_answer(prompt, corpus_version, shared)
+        if early is not None:
+            self._record(prompt, t0, mode, outcome=outcome, session_id=session_id)
+            return self._replay(early) if stream else early
+        if stream:
+            return self._stream_turn(prompt, t0, corpus_version, session_id, memory, shared)
+
+        key = self._flight_key(prompt, corpus_version)
+        flight, result = self._lead_or_wait(key) if shared else (None, None)
+        if result is not None:
+            self._record(prompt, t0, mode, outcome="coalesced", session_id=session_id)
+            return result
+
+        with self._leading(key, flight):
+            content, prefetched = self._prefetch(prompt, memory)
+            server_session = self._server_session(session_id)
+            messages = self._turn_messages(session_id, content)
+            logger.debug("Messages being sent → %s", messages)
+            start = partial(self.agent.create_turn, messages=messages, session_id=server_session,
+                            stream=False)
+            turn = self._recorded_turn(prompt, t0, mode, session_id, start)
+            result = self._turn_result(turn, prefetched)
+            self._finish(key, flight, prompt, result, corpus_version, shared)
+            return result
+
+    def _stream_turn(self, prompt: str, t0: float, corpus_version: str, session_id: str,
+                     memory: Optional[List[dict]] = None, shared: bool = False) -> Iterator[dict]:
+        key = self._flight_key(prompt, corpus_version)
+        flight, result = self._lead_or_wait(key) if shared else (None, None)
+        if result is not None:
+            self._record(prompt, t0, "stream", outcome="coalesced", session_id=session_id)
+            yield from self._replay(result)
+            return
+
+        with self._leading(key, flight):
+            content, context = self._prefetch(prompt, memory)
+            if context:
+                yield {"type": "context", "chunks": list(context)}
+            server_session = self._server_session(session_id)
+            messages = self._turn_messages(session_id, content)
+            start = partial(self.agent.create_turn, messages=messages, session_id=server_session,
+                            stream=True)
+            for chunk in self._recorded_stream(prompt, t0, "stream", session_id, start):
+                for event in self._events(chunk, context):
+                    if event["type"] == "done":
+                        result = {"content": event["content"], "context": context}
+                        self._finish(key, flight, prompt, result, corpus_version, shared)
+                    yield event
+
+    # ── Async ─────────────────────────────────────────────────────────────────
+    async def aask(self, prompt: str, session_key: str = "default",
+                   memory: Optional[List[dict]] = None) -> dict:
+        """
+        Async counterpart of `ask`. Each `session_key` gets its own LlamaStack
+        session; different keys run concurrently up to `max_concurrency`.
+        """
+        logger.debug("aask() ➞ key=%r prompt=%r", session_key, prompt)
+        t0 = time.perf_counter()
+        await self.astart()
+
+        corpus_version = self.manifest.corpus_version
+        shared = self._shareable(await self.session_pool.session_for(session_key), memory)
+        early, outcome = await asyncio.to_thread(self._early_answer, prompt, corpus_version, shared)
+        if early is not None:
+            self._record(prompt, t0, "async", outcome=outcome)
+            return early
+
+        key = self._flight_key(prompt, corpus_version)
+        flight, result = await self._alead_or_wait(key) if shared else (None, None)
+        if result is not None:
+            self._record(prompt, t0, "async", outcome="coalesced")
+            return result
+
+        with self._leading(key, flight):
+            content, prefetched = await asyncio.to_thread(self._prefetch, prompt, memory)
+            async with self.session_pool.acquire(session_key) as session_id:
+                server_session = await self._aserver_session(session_id)
+                messages = self._turn_messages(session_id, content)
+                start = partial(self.async_agent.create_turn, messages=messages,
+                                session_id=server_session, stream=False)
+                turn = await self._arecorded_turn(prompt, t0, "async", session_id, start)
+            result = self._turn_result(turn, prefetched)
+            await asyncio.to_thread(self._finish, key, flight, prompt, result, corpus_version, shared)
+            return result
+
+    async def astream(self, prompt: str, session_key: str = "default",
+                      memory: Optional[List[dict]] = None) -> AsyncIterator[dict]:
+        """
+        Async-iterator mode of `aask`; yields the same events as `ask(stream=True)`.
+        """
+        t0 = time.perf_counter()
+        await self.astart()
+
+        corpus_version = self.manifest.corpus_version
+        shared = self._shareable(await self.session_pool.session_for(session_key), memory)
+        early, outcome = await asyncio.to_thread(self._early_answer, prompt, corpus_version, shared)
+        if early is not None:
+            self._record(prompt, t0, "async_stream", outcome=outcome)
+            for event in self._replay(early):
+                yield event
+            return
+
+        key = self._flight_key(prompt, corpus_version)
+        flight, result = await self._alead_or_wait(key) if shared else (None, None)
+        if result is not None:
+            self._record(prompt, t0, "async_stream", outcome="coalesced")
+            for event in self._replay(result):
+                yield event
+            return
+
+        with self._leading(key, flight):
+            content, context = await asyncio.to_thread(self._prefetch, prompt, memory)
+            if context:
+                yield {"type": "context", "chunks": list(context)}
+            async with self.session_pool.acquire(session_key) as session_id:
+                server_session = await self._aserver_session(session_id)
+                messages = self._turn_messages(session_id, content)
+                start = partial(self.async_agent.create_turn, messages=messages,
+                                session_id=server_session, stream=True)
+                async for chunk in self._arecorded_stream(prompt, t0, "async_stream", session_id, start):
+                    for event in self._events(chunk, context):
+                        if event["type"] == "done":
+                            result = {"content": event["content"], "context": context}
+                            await asyncio.to_thread(self._finish, key, flight, prompt, result,
+                                                    corpus_version, shared)
+                        yield event
@@ -0,0 +1,109 @@
+import re
+import hashlib
+from typing import Iterator, List, Tuple
+
+from utils.metrics import estimate_tokens
+
+MD_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+ADOC_HEADING = re.compile(r"^(={1,6})\s+(.*?)\s*$")
+# Markdown ``` / ~~~ fences and AsciiDoc ---- / .... listing blocks
+FENCE = re.compile(r"^(```|~~~|----|\.\.\.\.)")
+
+HEADING_SUFFIXES = {".md": MD_HEADING, ".adoc": ADOC_HEADING}
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def split_sections(text: str, suffix: str) -> List[Tuple[List[str], str]]:
+    """
+    Split a document at its headings into `(heading_path, body)` pairs,
+    where `heading_path` lists the enclosing headings from the top level
+    down. Headings inside fenced/listing blocks are ignored; formats without
+    headings come back as a single section.
+    """
+    pattern = HEADING_SUFFIXES.get(suffix)
+    if pattern is None:
+        return [([], text)]
+
+    sections: List[Tuple[List[str], str]] = []
+    path: List[Tuple[int, str]] = []
+    lines: List[str] = []
+    fenced = False
+
+    def close():
+        body = "\n".join(lines).strip()
+        if body:
+            sections.append(([title for _, title in path], body))
+        lines.clear()
+
+    for line in text.splitlines():
+        if FENCE.match(line):
+            fenced = not fenced
+        match = None if fenced else pattern.match(line)
+        if match:
+            close()
+            level = len(match.group(1))
+            path = [(lvl, title) for lvl, title in path if lvl < level] + [(level, match.group(2))]
+        else:
+            lines.append(line)
+    close()
+    return sections
+
+
+def _windows(lines: List[str], max_tokens: int, overlap: int) -> Iterator[str]:
+    """
+    Pack whole lines into windows of at most `max_tokens`, repeating about
+    `overlap` tokens of trailing lines at the start of the next window. A
+    single line longer than a window is cut by words.
+    """
+    overlap = min(overlap, max_tokens // 2)
+    units: List[str] = []
+    for line in lines:
+        if estimate_tokens(line) <= max_tokens:
+            units.append(line)
+            continue
+        words = line.split()
+        step = max(1, int(max_tokens * 0.75))
+        units.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+
+    window: List[str] = []
+    size = 0
+    for unit in units:
+        cost = estimate_tokens(unit) + 1
+        if window and size + cost > max_tokens:
+            yield "\n".join(window)
+            carry: List[str] = []
+            carried = 0
+            for prev in reversed(window):
+                carried += estimate_tokens(prev) + 1
+                if carried > overlap:
+                    break
+                carry.insert(0, prev)
+            window, size = carry, sum(estimate_tokens(u) + 1 for u in carry)
+        window.append(unit)
+        size += cost
+    if window:
+        yield "\n".join(window)
+
+
+def chunk_document(text: str, suffix: str, chunk_tokens: int = 512, overlap: int = 64) -> List[dict]:
+    """
+    Heading-aware chunks for one document as `{"text", "heading", "hash"}`.
+
+    Each chunk stays within one section and starts with that section's
+    heading path, so a chunk read on its own still says what it is about.
+    Short neighbouring sections are not merged; long ones are split on
+    line boundaries with `overlap` tokens carried between pieces.
+    """
+    chunks = []
+    for path, body in split_sections(text, suffix):
+        heading = " > ".join(path)
+        budget = max(16, chunk_tokens - estimate_tokens(heading) - 1)
+        for piece in _windows(body.splitlines(), budget, overlap):
+            if not piece.strip():
+                continue
+            content = f"{heading}\n{piece}" if heading else piece
+            chunks.append({"text": content, "heading": heading, "hash": chunk_hash(content)})
+    return chunks
@@ -0,0 +1,126 @@
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger("ChAIAgent.embedding")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    hash  TEXT NOT NULL,
+    dim   INTEGER NOT NULL,
+    vec   BLOB NOT NULL,
+    PRIMARY KEY (model, hash)
+) WITHOUT ROWID;
+"""
+
+
+class EmbeddingCache:
+    """
+    On-disk float32 vectors keyed by (model, chunk hash), so unchanged chunks
+    are never embedded twice, across restarts included.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def get_many(self, model: str, hashes: Sequence[str]) -> dict:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # stay under SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, vec FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+                    [model, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, hashes: Sequence[str], vectors: np.ndarray):
+        rows = [(model, h, int(v.shape[0]), np.asarray(v, dtype=np.float32).tobytes())
+                for h, v in zip(hashes, vectors)]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BatchEmbedder:
+    """
+    Local sentence-transformers embedder for chunk text.
+
+    Texts are embedded in batches of `batch_size` on `threads` CPU threads
+    (0 keeps torch's default) and vectors are L2-normalized. With a cache,
+    only texts whose hash has no stored vector are sent to the model.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = 64,
+        threads: int = 0,
+        cache: Optional[EmbeddingCache] = None,
+        expected_dim: Optional[int] = None,
+    ):
+        from sentence_transformers import SentenceTransformer
+
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        if expected_dim and self.dim != expected_dim:
+            raise ValueError(f"Embedding model {model_name} has dim {self.dim}, "
+                             f"vector DB expects {expected_dim}")
+        self.batch_size = batch_size
+        self.cache = cache
+        self.embedded = 0
+        self.cached = 0
+        logger.info("Embedder ready (model=%s, dim=%d, batch=%d, threads=%s)",
+                    model_name, self.dim, batch_size, threads or "default")
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vecs = self.model.encode(texts, batch_size=self.batch_size,
+                                 normalize_embeddings=True, convert_to_numpy=True)
+        return np.asarray(vecs, dtype=np.float32)
+
+    def embed(self, texts: Sequence[str], hashes: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        Embeddings for `texts` as an `(n, dim)` array. `hashes` (one per text)
+        enables the on-disk cache.
+        """
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if not texts:
+            return out
+        todo = list(range(len(texts)))
+        if self.cache is not None and hashes is not None:
+            found = self.cache.get_many(self.model_name, hashes)
+            todo = []
+            for i, h in enumerate(hashes):
+                if h in found:
+                    out[i] = found[h]
+                else:
+                    todo.append(i)
+            self.cached += len(texts) - len(todo)
+        if todo:
+            vecs = self.encode([texts[i] for i in todo])
+            out[todo] = vecs
+            self.embedded += len(todo)
+            if self.cache is not None and hashes is not None:
+                self.cache.put_many(self.model_name, [hashes[i] for i in todo], vecs)
+        return out
@@ -0,0 +1,252 @@
+import os
+import json
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("ChAIAgent.ingest")
+
+TEXT_SUFFIXES = {".md", ".txt", ".adoc"}
+PDF_SUFFIXES = {".pdf"}
+SUPPORTED_SUFFIXES = TEXT_SUFFIXES | PDF_SUFFIXES
+
+MANIFEST_VERSION = 1
+
+
+def iter_source_files(docs_dir: Path) -> Iterator[Path]:
+    """
+    Yield every file under `docs_dir` that ingestion knows how to read,
+    in a stable order.
+    """
+    for f in sorted(docs_dir.rglob("*")):
+        if f.is_file() and f.suffix in SUPPORTED_SUFFIXES:
+            yield f
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class IngestionManifest:
+    """
+    Persistent record of what has been inserted into the vector DB.
+
+    Entries are keyed by source path. Text documents are compared by content
+    hash; PDFs by (mtime, size) so unchanged PDFs are never re-read.
+    """
+
+    def __init__(self, path: Path, vector_db: str):
+        self.path = Path(path)
+        self.vector_db = vector_db
+        self.entries: Dict[str, dict] = {}
+        # document_ids whose chunks are still in the vector DB but no
+        # longer correspond to a current file (removed or superseded)
+        self.stale: List[str] = []
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            logger.debug("No ingestion manifest at %s", self.path)
+            return
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable manifest %s: %s", self.path, e)
+            return
+        if data.get("version") != MANIFEST_VERSION or data.get("vector_db") != self.vector_db:
+            logger.info("Manifest %s does not match vector DB `%s`; starting fresh",
+                        self.path, self.vector_db)
+            return
+        self.entries = data.get("entries", {})
+        self.stale = data.get("stale", [])
+        logger.debug("Loaded manifest with %d entries, %d stale",
+                     len(self.entries), len(self.stale))
+
+    def save(self):
+        """
+        Write the manifest atomically (temp file + rename).
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({
+            "version": MANIFEST_VERSION,
+            "vector_db": self.vector_db,
+            "entries": self.entries,
+            "stale": self.stale,
+        }))
+        os.replace(tmp, self.path)
+
+    def reset(self):
+        self.entries = {}
+        self.stale = []
+
+    @property
+    def corpus_version(self) -> str:
+        """
+        Short digest of the ingested corpus; changes whenever any document
+        is added, modified or removed.
+        """
+        h = hashlib.sha256(self.vector_db.encode())
+        for key in sorted(self.entries):
+            h.update(key.encode())
+            h.update(self.entries[key]["document_id"].encode())
+        return h.hexdigest()[:16]
+
+    def _fingerprint(self, f: Path, st: os.stat_result, prev: Optional[dict]) -> Tuple[str, bool]:
+        """
+        Return (hash, changed) for a file relative to its previous entry.
+        """
+        if f.suffix in PDF_SUFFIXES and prev \
+                and prev.get("mtime") == st.st_mtime and prev.get("size") == st.st_size:
+            return prev["hash"], False
+        digest = file_sha256(f)
+        return digest, not prev or prev.get("hash") != digest
+
+    def diff(self, docs_dir: Path) -> Tuple[List[Tuple[Path, dict]], List[str]]:
+        """
+        Compare the manifest against `docs_dir`.
+
+        Returns `(pending, removed)`: pending is a list of `(path, entry)`
+        for new or changed files, removed is a list of manifest keys whose
+        files no longer exist.
+        """
+        pending: List[Tuple[Path, dict]] = []
+        seen = set()
+        for f in iter_source_files(docs_dir):
+            key = str(f)
+            seen.add(key)
+            try:
+                st = f.stat()
+                prev = self.entries.get(key)
+                digest, changed = self._fingerprint(f, st, prev)
+            except OSError as e:
+                logger.warning("Failed reading %s: %s", f, e)
+                continue
+            entry = {
+                "hash": digest,
+                "mtime": st.st_mtime,
+                "size": st.st_size,
+                "document_id": f"{f.name}#{digest[:12]}",
+            }
+            if changed:
+                pending.append((f, entry))
+            elif prev and prev.get("mtime") != st.st_mtime:
+                # content identical (e.g. `touch`); just refresh the stat info
+                prev.update(mtime=st.st_mtime, size=st.st_size)
+        removed = [k for k in self.entries if k not in seen]
+        return pending, removed
+
+    def record(self, key: str, entry: dict):
+        prev = self.entries.get(key)
+        if prev and prev["document_id"] != entry["document_id"]:
+            self.stale.append(prev["document_id"])
+        self.entries[key] = entry
+
+    def forget(self, key: str):
+        prev = self.entries.pop(key, None)
+        if prev:
+            self.stale.append(prev["document_id"])
+
+    def stale_ratio(self) -> float:
+        live = len(self.entries)
+        return len(self.stale) / live if live else float(bool(self.stale))
+
+
+# ── Extraction ────────────────────────────────────────────────────────────────
+def extract_document(path: str, entry: dict) -> dict:
+    """
+    Read one source file into a plain dict (picklable, so it can run in a
+    worker process). PDFs are parsed page by page with PyPDF2.
+    """
+    f = Path(path)
+    if f.suffix in PDF_SUFFIXES:
+        from PyPDF2 import PdfReader
+        text = "\n".join(p.extract_text() or "" for p in PdfReader(f).pages)
+        mime_type = "application/pdf"
+    else:
+        text = f.read_text(encoding="utf-8")
+        mime_type = "text/plain"
+    return {
+        "document_id": entry["document_id"],
+        "content": text,
+        "mime_type": mime_type,
+        "metadata": {"source": path, "sha256": entry["hash"]},
+    }
+
+
+def iter_extracted(
+    pending: Iterable[Tuple[Path, dict]],
+    workers: int = 4,
+    max_in_flight: int = 16,
+) -> Iterator[Tuple[Path, dict, Optional[dict], Optional[Exception]]]:
+    """
+    Extract documents in a process pool and yield `(path, entry, doc, error)`
+    as they complete.
+
+    At most `max_in_flight` documents are submitted or waiting to be consumed
+    at any time, so memory stays bounded regardless of corpus size. With
+    `workers <= 0` extraction runs inline.
+    """
+    if workers <= 0:
+        for f, entry in pending:
+            try:
+                yield f, entry, extract_document(str(f), entry), None
+            except Exception as e:
+                yield f, entry, None, e
+        return
+
+    items = iter(pending)
+    # spawn, not fork: this runs from a worker thread of a multi-threaded
+    # process (bootstrap pool, Streamlit), and forking with live threads can deadlock
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        in_flight = {}
+
+        def fill():
+            while len(in_flight) < max_in_flight:
+                try:
+                    f, entry = next(items)
+                except StopIteration:
+                    return
+                in_flight[pool.submit(extract_document, str(f), entry)] = (f, entry)
+
+        fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                f, entry = in_flight.pop(fut)
+                try:
+                    yield f, entry, fut.result(), None
+                except Exception as e:
+                    yield f, entry, None, e
+            fill()
+
+
+def iter_batches(
+    docs: Iterable[Tuple[Path, dict, dict]],
+    max_docs: int = 32,
+    max_bytes: int = 4 * 1024 * 1024,
+) -> Iterator[List[Tuple[Path, dict, dict]]]:
+    """
+    Group extracted documents into insert batches bounded by document count
+    and total content size. A single document larger than `max_bytes` is
+    sent on its own.
+    """
+    batch: List[Tuple[Path, dict, dict]] = []
+    size = 0
+    for item in docs:
+        doc_size = len(item[2]["content"].encode("utf-8"))
+        if batch and (len(batch) >= max_docs or size + doc_size > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(item)
+        size += doc_size
+    if batch:
+        yield batch
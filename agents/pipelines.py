@@ -0,0 +1,314 @@
+import os
+import re
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+from llama_stack_client.lib.agents.client_tool import ClientTool
+from llama_stack_client.types.tool_def_param import Parameter
+
+from agents.ingest import file_sha256
+
+logger = logging.getLogger("ChAIAgent.pipelines")
+
+JOIN_PLUGIN = "pl-topologicalcopy"
+CACHE_VERSION = 1
+
+# answer() phrasing per structural query
+ANSWER_KEYS = {"after": "runs_after", "before": "runs_before",
+               "downstream": "downstream", "upstream": "upstream"}
+HEADINGS = {"after": "these run after `{node}`", "before": "`{node}` takes input from",
+            "downstream": "everything downstream of `{node}`", "upstream": "`{node}` depends on"}
+NOTHING = {"after": "nothing runs after `{node}`", "before": "`{node}` is a root and takes no input",
+           "downstream": "nothing is downstream of `{node}`", "upstream": "`{node}` depends on nothing"}
+
+# Whole-question shapes answer() handles; anything longer goes to the model
+_NODE = r"(?:the )?(?:node |plugin )?`?(?P<node>[\w.:-]+)`?"
+_WHAT = r"(?:what|which)(?: nodes?| plugins?| steps?)?"
+QUESTION_PATTERNS = [(re.compile(rf"^{pattern}\s*\??$"), query) for pattern, query in [
+    (rf"{_WHAT} (?:runs?|comes?|executes?|happens?) (?:right |directly |next )?after {_NODE}", "after"),
+    (rf"(?:what(?: are|'s| is) )?(?:the )?children of {_NODE}", "after"),
+    (rf"what(?:'s| is) next after {_NODE}", "after"),
+    (rf"{_WHAT} (?:runs?|comes?|executes?|happens?) (?:right |directly )?before {_NODE}", "before"),
+    (rf"(?:what(?: are|'s| is) )?(?:the )?parents? of {_NODE}", "before"),
+    (rf"{_WHAT} feeds? into {_NODE}", "before"),
+    (rf"(?:what(?: is|'s| are) )?(?:everything |all )?(?:nodes )?downstream (?:of|from) {_NODE}", "downstream"),
+    (rf"(?:what(?: is|'s| are) )?(?:everything |all )?(?:nodes )?upstream (?:of|from) {_NODE}", "upstream"),
+    (rf"what does {_NODE} depend on", "upstream"),
+]]
+
+
+def _split_plugin(spec: str):
+    name, _, version = (spec or "").strip().partition(" ")
+    return name, version.strip() or None
+
+
+def compile_pipeline(spec: dict, source: str) -> dict:
+    """
+    Turn a pipeline YAML document into a DAG: per-node plugin/version,
+    parents (the `previous` node plus, for `pl-topologicalcopy` joins, every
+    node listed in `plugininstances`), children, depth and the critical
+    (longest) path from a root to a leaf.
+    """
+    nodes: Dict[str, dict] = {}
+    for item in spec.get("plugin_tree") or []:
+        title = item["title"]
+        plugin, version = _split_plugin(item.get("plugin", ""))
+        params = item.get("plugin_parameter_defaults") or {}
+        joins = []
+        if plugin == JOIN_PLUGIN and params.get("plugininstances"):
+            joins = [t.strip() for t in str(params["plugininstances"]).split(",") if t.strip()]
+        previous = item.get("previous")
+        parents = list(dict.fromkeys(([previous] if previous else []) + joins))
+        nodes[title] = {
+            "title": title, "plugin": plugin, "version": version, "previous": previous,
+            "joins": joins, "parents": parents, "children": [], "params": params,
+        }
+
+    for node in nodes.values():
+        for parent in node["parents"]:
+            if parent in nodes:
+                nodes[parent]["children"].append(node["title"])
+            else:
+                logger.warning("%s: node %s refers to unknown node %s", source, node["title"], parent)
+
+    # Kahn's algorithm; depth = longest chain of dependencies above a node
+    order: List[str] = []
+    pending = {t: sum(p in nodes for p in n["parents"]) for t, n in nodes.items()}
+    ready = [t for t, k in pending.items() if k == 0]
+    best_parent: Dict[str, Optional[str]] = {t: None for t in nodes}
+    for t in nodes:
+        nodes[t]["depth"] = 0
+    while ready:
+        t = ready.pop(0)
+        order.append(t)
+        for c in nodes[t]["children"]:
+            if nodes[t]["depth"] + 1 > nodes[c]["depth"]:
+                nodes[c]["depth"] = nodes[t]["depth"] + 1
+                best_parent[c] = t
+            pending[c] -= 1
+            if pending[c] == 0:
+                ready.append(c)
+    if len(order) != len(nodes):
+        logger.warning("%s: plugin_tree has a cycle; depths are partial", source)
+
+    critical: List[str] = []
+    if order:
+        t = max(order, key=lambda n: nodes[n]["depth"])
+        while t is not None:
+            critical.insert(0, t)
+            t = best_parent[t]
+
+    return {
+        "name": spec.get("name", Path(source).stem),
+        "description": spec.get("description", ""),
+        "source": source,
+        "nodes": nodes,
+        "roots": [t for t, n in nodes.items() if not n["parents"]],
+        "leaves": [t for t, n in nodes.items() if not n["children"]],
+        "order": order,
+        "critical_path": critical,
+    }
+
+
+class PipelineIndex:
+    """
+    In-memory DAG index of every pipeline YAML under `pipelines_dir`.
+
+    Compiled pipelines are cached in `cache_path` by file hash, so only new
+    or changed specs are parsed again on start. Lookups are dictionary
+    accesses on the compiled graph.
+    """
+
+    def __init__(self, pipelines_dir: Path, cache_path: Path):
+        self.pipelines_dir = Path(pipelines_dir)
+        self.cache_path = Path(cache_path)
+        self.pipelines: Dict[str, dict] = {}
+        # node title -> names of pipelines containing it
+        self.by_node: Dict[str, List[str]] = {}
+        # lowercased node title or plugin name -> name as given to _find()
+        self._names: Dict[str, str] = {}
+        self.refresh()
+
+    def _read_cache(self) -> dict:
+        try:
+            data = json.loads(self.cache_path.read_text())
+            return data["files"] if data.get("version") == CACHE_VERSION else {}
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def refresh(self) -> int:
+        """
+        Load every pipeline, recompiling only changed files. Returns the
+        number of files compiled.
+        """
+        cached = self._read_cache()
+        files, compiled = {}, 0
+        for f in sorted(self.pipelines_dir.rglob("*.y*ml")):
+            key = str(f)
+            digest = file_sha256(f)
+            entry = cached.get(key)
+            if not entry or entry["hash"] != digest:
+                try:
+                    entry = {"hash": digest, "pipeline": compile_pipeline(yaml.safe_load(f.read_text()), key)}
+                except Exception as e:
+                    logger.warning("Skipping pipeline %s: %s", f, e)
+                    continue
+                compiled += 1
+            files[key] = entry
+
+        if compiled or set(files) != set(cached):
+            tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+            try:
+                tmp.write_text(json.dumps({"version": CACHE_VERSION, "files": files}))
+                os.replace(tmp, self.cache_path)
+            except OSError as e:
+                logger.warning("Could not write pipeline cache %s: %s", self.cache_path, e)
+
+        self.pipelines = {e["pipeline"]["name"]: e["pipeline"] for e in files.values()}
+        self.by_node, plugins = {}, {}
+        for name, p in self.pipelines.items():
+            for title, n in p["nodes"].items():
+                self.by_node.setdefault(title, []).append(name)
+                plugins.setdefault(n["plugin"], []).append(title)
+        # a plugin name stands for a node only where it runs once; titles win
+        self._names = {plugin.lower(): plugin for plugin, titles in plugins.items()
+                       if plugin and len(titles) == 1}
+        self._names.update((t.lower(), t) for t in self.by_node)
+        logger.info("Pipeline index: %d pipelines (%d recompiled)", len(self.pipelines), compiled)
+        return compiled
+
+    # ── Lookups ───────────────────────────────────────────────────────────────
+    def _find(self, node: str, pipeline: Optional[str] = None):
+        names = [pipeline] if pipeline else self.by_node.get(node, [])
+        for name in names:
+            p = self.pipelines.get(name)
+            if p and node in p["nodes"]:
+                return p, p["nodes"][node]
+        # fall back to matching by plugin name
+        for p in ([self.pipelines[pipeline]] if pipeline in self.pipelines else self.pipelines.values()):
+            for n in p["nodes"].values():
+                if n["plugin"] == node:
+                    return p, n
+        return None, None
+
+    def _walk(self, p: dict, start: str, edge: str) -> List[str]:
+        seen, stack = [], list(p["nodes"][start][edge])
+        while stack:
+            t = stack.pop(0)
+            if t in p["nodes"] and t not in seen:
+                seen.append(t)
+                stack.extend(p["nodes"][t][edge])
+        return seen
+
+    def _brief(self, p: dict, titles: List[str]) -> List[dict]:
+        return [{"title": t, "plugin": p["nodes"][t]["plugin"], "version": p["nodes"][t]["version"]}
+                for t in titles if t in p["nodes"]]
+
+    def query(self, query: str, node: Optional[str] = None, pipeline: Optional[str] = None) -> dict:
+        """
+        Answer a structural question. `query` is one of: pipelines, pipeline,
+        node, after (children), before (parents), downstream, upstream,
+        critical_path.
+        """
+        if query == "pipelines":
+            return {"pipelines": [{"name": n, "description": p["description"], "nodes": len(p["nodes"])}
+                                  for n, p in self.pipelines.items()]}
+        if query in ("pipeline", "critical_path") and node is None:
+            p = self.pipelines.get(pipeline) if pipeline else next(iter(self.pipelines.values()), None)
+            if p is None:
+                return {"error": f"unknown pipeline {pipeline!r}"}
+            if query == "critical_path":
+                return {"pipeline": p["name"], "critical_path": self._brief(p, p["critical_path"])}
+            return {"pipeline": p["name"], "description": p["description"], "roots": p["roots"],
+                    "leaves": p["leaves"], "order": self._brief(p, p["order"]),
+                    "critical_path": p["critical_path"]}
+
+        p, n = self._find(node or "", pipeline)
+        if n is None:
+            return {"error": f"unknown node {node!r}"}
+        out: Dict[str, Any] = {"pipeline": p["name"], "node": n["title"], "plugin": n["plugin"],
+                               "version": n["version"]}
+        if query == "node":
+            out.update(parents=n["parents"], children=n["children"], joins=n["joins"],
+                       depth=n["depth"], params=n["params"])
+        elif query == "after":
+            out["runs_after"] = self._brief(p, n["children"])
+        elif query == "before":
+            out["runs_before"] = self._brief(p, n["parents"])
+        elif query == "downstream":
+            out["downstream"] = self._brief(p, self._walk(p, n["title"], "children"))
+        elif query == "upstream":
+            out["upstream"] = self._brief(p, self._walk(p, n["title"], "parents"))
+        elif query == "critical_path":
+            out["on_critical_path"] = n["title"] in p["critical_path"]
+            out["critical_path"] = p["critical_path"]
+        else:
+            return {"error": f"unknown query {query!r}"}
+        return out
+
+    # ── Direct answers ────────────────────────────────────────────────────────
+    def answer(self, question: str) -> Optional[str]:
+        """
+        Plain-text answer when the whole question is a simple structural one
+        about a known node title or plugin name ("what runs after
+        dcm-to-mha-1?"); None for anything else.
+        """
+        text = " ".join(question.lower().split())
+        for pattern, query in QUESTION_PATTERNS:
+            m = pattern.match(text)
+            if m and m["node"] in self._names:
+                break
+        else:
+            return None
+        res = self.query(query, self._names[m["node"]])
+        items = res[ANSWER_KEYS[query]]
+        where = f"In **{res['pipeline']}**"
+        if not items:
+            return f"{where}, {NOTHING[query].format(node=res['node'])}."
+        head = f"{where}, {HEADINGS[query].format(node=res['node'])}:"
+        lines = [f"- `{i['title']}` ({i['plugin']} {i['version'] or ''})".rstrip() for i in items]
+        return "\n".join([head, *lines])
+
+
+class PipelineTool(ClientTool):
+    """
+    Local `pipeline_info` tool over a `PipelineIndex`; runs in-process, so
+    structural questions cost no server round trip.
+    """
+
+    def __init__(self, index: PipelineIndex):
+        self.index = index
+
+    def get_name(self) -> str:
+        return "pipeline_info"
+
+    def get_description(self) -> str:
+        return ("Look up the structure of ChRIS pipelines (plugin_tree): which nodes run after or "
+                "before a node, everything downstream/upstream of it, a node's plugin, version and "
+                "parameters, or a pipeline's critical path.")
+
+    def get_params_definition(self) -> Dict[str, Parameter]:
+        return {
+            "query": Parameter(
+                name="query", parameter_type="string", required=True,
+                description="One of: pipelines, pipeline, node, after, before, downstream, upstream, "
+                            "critical_path",
+            ),
+            "node": Parameter(
+                name="node", parameter_type="string", required=False, default=None,
+                description="Node title (e.g. dcm-to-mha-1) or plugin name (e.g. pl-lld_inference)",
+            ),
+            "pipeline": Parameter(
+                name="pipeline", parameter_type="string", required=False, default=None,
+                description="Pipeline name, if the node exists in several pipelines",
+            ),
+        }
+
+    def run_impl(self, query: str, node: Optional[str] = None, pipeline: Optional[str] = None) -> dict:
+        return self.index.query(query, node, pipeline)
+
+    async def async_run_impl(self, **kwargs) -> dict:
+        return self.run_impl(**kwargs)
@@ -0,0 +1,261 @@
+import re
+import json
+import math
+import shutil
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from agents.chunking import chunk_document
+from agents.ingest import extract_document
+
+logger = logging.getLogger("ChAIAgent.retriever")
+
+INDEX_VERSION = 2
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Reciprocal-rank-fusion constant; 60 is the usual choice
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class HybridRetriever:
+    """
+    Local BM25 + dense retriever over the ingested corpus.
+
+    The index lives in `index_dir` as flat NumPy arrays (CSR postings, chunk
+    lengths, normalized embeddings) plus the chunk text, all memory-mapped on
+    load. Documents are split with the same heading-aware chunker as local
+    ingestion. Lexical and dense rankings are merged with reciprocal rank
+    fusion; dense search needs an `embedder` (see `agents.embedding`).
+    """
+
+    def __init__(
+        self,
+        index_dir: Path,
+        embedder=None,
+        chunk_tokens: int = 512,
+        chunk_overlap: int = 64,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.index_dir = Path(index_dir)
+        self.embedder = embedder
+        self.embedding_model = embedder.model_name if embedder is not None else None
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.k1 = k1
+        self.b = b
+        self.corpus_version: Optional[str] = None
+        self._faiss = None
+        self._reset()
+        self.load()
+
+    def _reset(self):
+        self.vocab: Dict[str, int] = {}
+        self.chunk_sources: List[str] = []
+        self.avgdl = 0.0
+        self._ptr = self._post_doc = self._post_tf = self._doc_len = None
+        self._offsets = self._text = self._dense = None
+
+    # ── Build / persist ───────────────────────────────────────────────────────
+    def build(self, docs: Iterable[dict], corpus_version: str):
+        """
+        Index `docs` (dicts as produced by `extract_document`) and write the
+        index to `index_dir`.
+        """
+        texts: List[str] = []
+        hashes: List[str] = []
+        sources: List[str] = []
+        for doc in docs:
+            source = doc["metadata"].get("source", doc["document_id"])
+            for chunk in chunk_document(doc["content"], Path(source).suffix,
+                                        self.chunk_tokens, self.chunk_overlap):
+                texts.append(chunk["text"])
+                hashes.append(chunk["hash"])
+                sources.append(source)
+
+        vocab: Dict[str, int] = {}
+        postings: List[Dict[int, int]] = []
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[i] = len(tokens)
+            for tok in tokens:
+                tid = vocab.setdefault(tok, len(vocab))
+                if tid == len(postings):
+                    postings.append({})
+                postings[tid][i] = postings[tid].get(i, 0) + 1
+
+        ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        ptr[1:] = np.cumsum([len(p) for p in postings])
+        post_doc = np.fromiter((d for p in postings for d in p), dtype=np.int32, count=int(ptr[-1]))
+        post_tf = np.fromiter((tf for p in postings for tf in p.values()), dtype=np.float32,
+                              count=int(ptr[-1]))
+
+        encoded = [t.encode("utf-8") for t in texts]
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(t) for t in encoded])
+        dense = self.embedder.embed(texts, hashes) if self.embedder is not None and texts else None
+
+        tmp = self.index_dir.with_name(self.index_dir.name + ".tmp")
+        old = self.index_dir.with_name(self.index_dir.name + ".old")
+        for leftover in (tmp, old):
+            shutil.rmtree(leftover, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        np.save(tmp / "ptr.npy", ptr)
+        np.save(tmp / "post_doc.npy", post_doc)
+        np.save(tmp / "post_tf.npy", post_tf)
+        np.save(tmp / "doc_len.npy", doc_len)
+        np.save(tmp / "offsets.npy", offsets)
+        (tmp / "chunks.bin").write_bytes(b"".join(encoded))
+        if dense is not None:
+            np.save(tmp / "dense.npy", dense)
+        (tmp / "meta.json").write_text(json.dumps({
+            "version": INDEX_VERSION,
+            "corpus_version": corpus_version,
+            "embedding_model": self.embedding_model if dense is not None else None,
+            "chunk_tokens": self.chunk_tokens,
+            "chunk_overlap": self.chunk_overlap,
+            "avgdl": float(doc_len.mean()) if len(texts) else 0.0,
+            "vocab": vocab,
+            "sources": sources,
+        }))
+
+        # swap the whole directory so readers never see a half-written index
+        if self.index_dir.exists():
+            self.index_dir.rename(old)
+        tmp.rename(self.index_dir)
+        shutil.rmtree(old, ignore_errors=True)
+
+        logger.info("Local index built: %d chunks, %d terms, dense=%s",
+                    len(texts), len(vocab), dense is not None)
+        self.load()
+
+    def sync(self, manifest) -> bool:
+        """
+        Rebuild the index if it does not match the manifest's corpus version.
+        Returns True if a rebuild happened.
+        """
+        version = manifest.corpus_version
+        missing_dense = self.embedder is not None and self._dense is None and len(self)
+        if version == self.corpus_version and not missing_dense:
+            return False
+
+        def docs():
+            for key, entry in sorted(manifest.entries.items()):
+                try:
+                    yield extract_document(key, entry)
+                except Exception as e:
+                    logger.warning("Skipping %s in local index: %s", key, e)
+
+        self.build(docs(), version)
+        return True
+
+    def load(self) -> bool:
+        meta_path = self.index_dir / "meta.json"
+        if not meta_path.exists():
+            return False
+        try:
+            meta = json.loads(meta_path.read_text())
+            if meta.get("version") != INDEX_VERSION or meta.get("chunk_tokens") != self.chunk_tokens \
+                    or meta.get("chunk_overlap") != self.chunk_overlap:
+                logger.info("Local index at %s is outdated; it will be rebuilt", self.index_dir)
+                return False
+            d = self.index_dir
+            self._ptr = np.load(d / "ptr.npy", mmap_mode="r")
+            self._post_doc = np.load(d / "post_doc.npy", mmap_mode="r")
+            self._post_tf = np.load(d / "post_tf.npy", mmap_mode="r")
+            self._doc_len = np.load(d / "doc_len.npy", mmap_mode="r")
+            self._offsets = np.load(d / "offsets.npy", mmap_mode="r")
+            self._text = np.memmap(d / "chunks.bin", dtype=np.uint8, mode="r") \
+                if (d / "chunks.bin").stat().st_size else np.zeros(0, dtype=np.uint8)
+            dense_path = d / "dense.npy"
+            self._dense = None
+            self._faiss = None
+            if meta.get("embedding_model") and meta["embedding_model"] == self.embedding_model \
+                    and dense_path.exists():
+                self._dense = np.load(dense_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable local index %s: %s", self.index_dir, e)
+            self._reset()
+            return False
+        self.vocab = meta["vocab"]
+        self.chunk_sources = meta["sources"]
+        self.avgdl = meta["avgdl"]
+        self.corpus_version = meta["corpus_version"]
+        logger.debug("Loaded local index %s (%d chunks)", self.corpus_version, len(self))
+        return True
+
+    def __len__(self) -> int:
+        return len(self.chunk_sources)
+
+    # ── Search ────────────────────────────────────────────────────────────────
+    def chunk(self, i: int) -> str:
+        return bytes(self._text[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+    def _bm25(self, query: str) -> np.ndarray:
+        n = len(self)
+        scores = np.zeros(n, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * np.asarray(self._doc_len) / (self.avgdl or 1.0))
+        for tok in set(tokenize(query)):
+            tid = self.vocab.get(tok)
+            if tid is None:
+                continue
+            lo, hi = self._ptr[tid], self._ptr[tid + 1]
+            docs = self._post_doc[lo:hi]
+            tf = self._post_tf[lo:hi]
+            idf = math.log(1 + (n - (hi - lo) + 0.5) / ((hi - lo) + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm[docs])
+        return scores
+
+    def _dense_scores(self, query: str) -> Optional[np.ndarray]:
+        if self._dense is None or self.embedder is None:
+            return None
+        q = self.embedder.encode([query])
+        if self._faiss is None:
+            try:
+                import faiss
+                index = faiss.IndexFlatIP(self._dense.shape[1])
+                index.add(np.ascontiguousarray(self._dense))
+                self._faiss = index
+            except ImportError:
+                self._faiss = False
+        if self._faiss:
+            sims, ids = self._faiss.search(q, len(self))
+            scores = np.empty(len(self), dtype=np.float32)
+            scores[ids[0]] = sims[0]
+            return scores
+        return self._dense @ q[0]
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(scores))
+        idx = np.argpartition(-scores, k - 1)[:k]
+        return idx[np.argsort(-scores[idx])]
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Top-`k` chunks for `query` as `{"text", "source", "score"}`, fused
+        from the BM25 and (when available) dense rankings.
+        """
+        if not len(self) or k <= 0:
+            return []
+        depth = min(len(self), k * 4)
+        fused: Dict[int, float] = {}
+
+        bm25 = self._bm25(query)
+        for rank, i in enumerate(self._top(bm25, depth)):
+            if bm25[i] > 0:
+                fused[int(i)] = fused.get(int(i), 0.0) + 1.0 / (RRF_K + rank + 1)
+        dense = self._dense_scores(query)
+        if dense is not None:
+            for rank, i in enumerate(self._top(dense, depth)):
+                fused[int(i)] = fused.get(int(i), 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        best = sorted(fused.items(), key=lambda kv: -kv[1])[:k]
+        return [{"text": self.chunk(i), "source": self.chunk_sources[i], "score": s} for i, s in best]
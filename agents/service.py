@@ -0,0 +1,171 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from agents.chai import ChAIAgent, load_config
+from memory.backends import open_memory_store
+from memory.chunk_store import ChunkStore
+from utils.metrics import estimate_tokens
+
+logger = logging.getLogger("ChAIAgent.service")
+
+
+class SessionHandle:
+    """
+    One user's view of the shared service: their own LlamaStack session and
+    memory thread, on top of the process-wide agent and memory store.
+    """
+
+    def __init__(self, service: "ChAIService", thread_id: str):
+        self.service = service
+        self.thread_id = thread_id
+        self.session_id: Optional[str] = None
+        # a session's turn history is linear; serialize turns from e.g. two tabs
+        self._lock = threading.Lock()
+
+    def _session(self) -> str:
+        if self.session_id is None:
+            self.session_id = self.service.agent.agent.create_session(f"chris_session-{self.thread_id}")
+            logger.debug("Session created for thread %s: %s", self.thread_id, self.session_id)
+        return self.session_id
+
+    def ask(self, prompt: str, stream: bool = False):
+        """
+        Same as `ChAIAgent.ask`, in this handle's session, with relevant
+        earlier messages recalled from memory (see `recall`).
+        """
+        with self._lock:
+            session_id = self._session()
+        memory = self.recall(prompt)
+        if not stream:
+            with self._lock:
+                return self.service.agent.ask(prompt, session_id=session_id, memory=memory)
+        return self._locked_stream(prompt, session_id, memory)
+
+    def _locked_stream(self, prompt: str, session_id: str, memory: List[dict]):
+        with self._lock:
+            yield from self.service.agent.ask(prompt, stream=True, session_id=session_id, memory=memory)
+
+    def recall(self, query: str) -> List[dict]:
+        """
+        Up to `recall_k` earlier messages relevant to `query`, within
+        `recall_max_tokens`. The question itself (already appended to
+        history) is left out. Empty if recall is off or the store fails.
+        """
+        svc = self.service
+        if not svc.recall_k or not hasattr(svc.memory_store, "recall"):
+            return []
+        since = time.time() - svc.recall_max_age if svc.recall_max_age else None
+        thread_id = self.thread_id if svc.recall_scope == "thread" else None
+        try:
+            # one extra, in case the question itself comes back
+            hits = svc.memory_store.recall(query, svc.recall_k + 1, since=since, thread_id=thread_id)
+        except Exception as e:
+            logger.warning("Memory recall failed: %s", e)
+            return []
+        picked, budget = [], svc.recall_max_tokens
+        for msg in hits:
+            if msg["role"] == "user" and msg["content"].strip() == query.strip():
+                continue
+            cost = estimate_tokens(msg["content"])
+            if len(picked) == svc.recall_k or cost > budget:
+                break
+            picked.append(msg)
+            budget -= cost
+        return picked
+
+    # ── Memory (scoped to this handle's thread) ──────────────────────────────
+    def store_context(self, chunks: List[str]) -> List[str]:
+        """
+        Distinct chunk IDs for `chunks`, in first-seen order; the text is stored
+        once in the shared chunk store.
+        """
+        return list(dict.fromkeys(self.service.chunk_store.put_many(chunks)))
+
+    def load_context(self, refs: List[str]) -> List[Optional[str]]:
+        return self.service.chunk_store.get_many(refs)
+
+    def append_message(self, role: str, content: str, context: Optional[list] = None):
+        refs = self.store_context(context) if context else None
+        self.service.memory_store.append_message(role, content, thread_id=self.thread_id, context=refs)
+
+    def get_recent(self, n: int = 50) -> List[dict]:
+        return self.service.memory_store.get_recent(n, thread_id=self.thread_id)
+
+    def get_before(self, cursor: float, n: int = 50) -> List[dict]:
+        return self.service.memory_store.get_before(cursor, n, thread_id=self.thread_id)
+
+
+class ChAIService:
+    """
+    Process-wide agent and memory store shared by every UI session.
+
+    Bootstrap (toolgroups, vector DB, ingestion) happens once per process
+    and all users share its HTTP connection pool. `session(thread_id)` hands
+    out lightweight per-user handles; at most `max_sessions` are kept, least
+    recently used first out.
+    """
+
+    def __init__(self, config_path: str = "config.yaml"):
+        cfg = load_config(config_path)
+        mem_cfg = cfg.get("memory", {})
+        self.agent = ChAIAgent(config_path)
+        self.memory_store = open_memory_store(
+            mem_cfg.get("backend", "chroma"),
+            "chat_memory",
+            sqlite_path=mem_cfg.get("sqlite_path", ".chat_history.db"),
+        )
+        # RAG chunks are stored once by content hash; history keeps only their IDs
+        self.chunk_store = ChunkStore(mem_cfg.get("chunk_store_path", ".chai_chunks.db"))
+        # Relevant past messages are recalled into each turn (0 disables)
+        self.recall_k = int(mem_cfg.get("recall_k", 4))
+        self.recall_scope = mem_cfg.get("recall_scope", "thread")
+        self.recall_max_tokens = int(mem_cfg.get("recall_max_tokens", 800))
+        self.recall_max_age = float(mem_cfg.get("recall_max_age_days", 0)) * 86400
+        svc_cfg = cfg.get("service", {})
+        self.max_sessions = int(svc_cfg.get("max_sessions", 256))
+        # history written without a thread (older Chroma rows, the imported
+        # .chat_history.json) is moved here the first time it is opened
+        self.default_thread = svc_cfg.get("default_thread", "default")
+        self._adopted = False
+        self._handles: "OrderedDict[str, SessionHandle]" = OrderedDict()
+        self._lock = threading.Lock()
+        logger.info("ChAI service ready (max_sessions=%d)", self.max_sessions)
+
+    def session(self, thread_id: Optional[str] = None) -> SessionHandle:
+        """
+        Handle for `thread_id` (a new thread if None), reusing an existing one.
+        """
+        thread_id = thread_id or uuid.uuid4().hex
+        with self._lock:
+            if thread_id == self.default_thread and not self._adopted:
+                self._adopt_unthreaded()
+            handle = self._handles.get(thread_id)
+            if handle is None:
+                handle = self._handles[thread_id] = SessionHandle(self, thread_id)
+                while len(self._handles) > self.max_sessions:
+                    evicted, old = self._handles.popitem(last=False)
+                    if old.session_id is not None:
+                        self.agent.session_ledger.forget(old.session_id)
+                    logger.debug("Evicted session handle %s", evicted)
+            else:
+                self._handles.move_to_end(thread_id)
+            return handle
+
+    def _adopt_unthreaded(self):
+        # caller holds self._lock; retried on the next open if the store fails
+        try:
+            moved = self.memory_store.adopt_unthreaded(self.default_thread)
+        except Exception as e:
+            logger.warning("Could not move unthreaded history into %s: %s", self.default_thread, e)
+            return
+        self._adopted = True
+        if moved:
+            logger.info("Moved %d unthreaded messages into thread %s", moved, self.default_thread)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sessions": len(self._handles), "max_sessions": self.max_sessions}
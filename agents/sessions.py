@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from utils.metrics import estimate_tokens
+
+logger = logging.getLogger("ChAIAgent.sessions")
+
+
+class AsyncSessionPool:
+    """
+    Maps caller keys (e.g. one per analyst) to LlamaStack agent sessions.
+
+    Sessions are created lazily on first use. Turns in the same session are
+    serialized, since a session's history is linear, while turns in
+    different sessions run concurrently up to `max_concurrency`.
+    """
+
+    def __init__(self, agent, max_concurrency: int = 8, session_prefix: str = "chris_session"):
+        self.agent = agent
+        self.session_prefix = session_prefix
+        self._sessions: Dict[str, str] = {}
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._create_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def session_for(self, key: str) -> str:
+        if key in self._sessions:
+            return self._sessions[key]
+        async with self._create_lock:
+            if key not in self._sessions:
+                session_id = await self.agent.create_session(f"{self.session_prefix}-{key}")
+                self._sessions[key] = session_id
+                self._session_locks[key] = asyncio.Lock()
+                logger.debug("Session created for %r: %s", key, session_id)
+        return self._sessions[key]
+
+    @asynccontextmanager
+    async def acquire(self, key: str) -> AsyncIterator[str]:
+        """
+        Reserve a concurrency slot and exclusive use of `key`'s session.
+        """
+        session_id = await self.session_for(key)
+        async with self._session_locks[key]:
+            async with self._slots:
+                yield session_id
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SessionLedger:
+    """
+    Keeps server-side session history within a token budget.
+
+    Callers keep using the session ID they were first given (the logical
+    session); the ledger maps it to the server session currently backing it.
+    Once a session's estimated history passes `budget` tokens it is due for
+    rotation: its transcript is summarized, a fresh server session replaces
+    it, and the next message is seeded with the summary plus the last
+    `carry_turns` exchanges, so prompt size stays flat however long the
+    conversation runs. Only tokens added since the last rotation count
+    towards the budget; the seed is the new session's baseline.
+    """
+
+    def __init__(self, budget: int = 6000, carry_turns: int = 2):
+        self.budget = budget
+        self.carry_turns = carry_turns
+        self._state: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.rotations = 0
+
+    def _entry(self, logical: str) -> dict:
+        return self._state.setdefault(logical, {
+            "current": logical, "tokens": 0, "turns": [], "summary": "", "seed": None,
+            "seed_tokens": 0,
+        })
+
+    def current(self, logical: str) -> str:
+        with self._lock:
+            return self._state[logical]["current"] if logical in self._state else logical
+
+    def take_seed(self, logical: str) -> Optional[str]:
+        """
+        Carry-over text for the first message of a rotated session (once).
+        """
+        with self._lock:
+            entry = self._state.get(logical)
+            if not entry or not entry["seed"]:
+                return None
+            seed, entry["seed"] = entry["seed"], None
+            # the turn carrying the seed reports it as input; see record()
+            entry["seed_tokens"] = estimate_tokens(seed)
+            return seed
+
+    def fresh(self, logical: str) -> bool:
+        """
+        True while `logical` has no conversation state: no recorded turns,
+        no summary and no pending seed.
+        """
+        with self._lock:
+            entry = self._state.get(logical)
+            return not entry or not (entry["turns"] or entry["summary"] or entry["seed"])
+
+    def record(self, logical: str, prompt: str, answer: str, tokens: int):
+        with self._lock:
+            entry = self._entry(logical)
+            entry["tokens"] += max(0, tokens - entry["seed_tokens"])
+            entry["seed_tokens"] = 0
+            entry["turns"].append((prompt, answer))
+
+    def due(self, logical: str) -> bool:
+        with self._lock:
+            entry = self._state.get(logical)
+            return bool(self.budget and entry and entry["tokens"] > self.budget)
+
+    def forget(self, logical: str):
+        """
+        Drop all state for `logical`, e.g. once its caller is gone.
+        """
+        with self._lock:
+            self._state.pop(logical, None)
+
+    def transcript(self, logical: str) -> str:
+        """
+        Previous summary plus every exchange since, for the summarizer.
+        """
+        with self._lock:
+            entry = self._entry(logical)
+            parts = [f"Earlier summary:\n{entry['summary']}"] if entry["summary"] else []
+            parts += [f"User: {q}\nAssistant: {a}" for q, a in entry["turns"]]
+        return "\n\n".join(parts)
+
+    def rotated(self, logical: str, session_id: str, summary: str):
+        with self._lock:
+            entry = self._entry(logical)
+            recent: List[Tuple[str, str]] = entry["turns"][-self.carry_turns:] if self.carry_turns else []
+            seed = [f"Summary of our conversation so far:\n{summary}"] if summary else []
+            if recent:
+                seed.append("Most recent exchanges:\n" + "\n\n".join(
+                    f"User: {q}\nAssistant: {a}" for q, a in recent))
+            entry.update(
+                current=session_id, summary=summary, turns=list(recent),
+                seed="\n\n".join(seed) or None, tokens=0, seed_tokens=0,
+            )
+            self.rotations += 1
+        logger.info("Rotated session %s -> %s (carried %d turns)", logical, session_id, len(recent))
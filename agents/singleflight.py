@@ -0,0 +1,68 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, Tuple
+
+logger = logging.getLogger("ChAIAgent.singleflight")
+
+
+class TurnAbandoned(RuntimeError):
+    """
+    The leading request stopped before finishing (e.g. a stream that was
+    closed early); waiters should run the turn themselves.
+    """
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Case- and whitespace-insensitive form of a prompt, for coalescing.
+    """
+    return " ".join(prompt.lower().split())
+
+
+class SingleFlight:
+    """
+    Deduplicates identical concurrent work.
+
+    The first caller for a key becomes the leader and runs the work; callers
+    arriving while it is in flight get the leader's `Future` and wait on it
+    (`.result()` from threads, `asyncio.wrap_future` from coroutines). The
+    key is released as soon as the leader finishes, so later callers start
+    fresh (or hit the answer cache).
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def begin(self, key: str) -> Tuple[Future, bool]:
+        """
+        `(future, is_leader)` for `key`. The leader must call `finish` with
+        the returned future.
+        """
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                self.coalesced += 1
+                return fut, False
+            fut = self._calls[key] = Future()
+            return fut, True
+
+    def finish(self, key: str, flight: Future, result=None, error: BaseException = None):
+        """
+        Settle the leader's own `flight`. The key is released only if it
+        still maps to that future, so a late call cannot touch a newer flight.
+        """
+        with self._lock:
+            if self._calls.get(key) is flight:
+                del self._calls[key]
+        if flight.done():
+            return
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(result)
+
+    def __len__(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,114 @@
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+from utils.metrics import (
+    REGISTRY, LATENCY_BUCKETS, SIZE_BUCKETS, TOKEN_BUCKETS, TraceWriter, estimate_tokens,
+)
+
+logger = logging.getLogger("ChAIAgent.telemetry")
+
+REGISTRY.histogram("chai_turn_seconds", "Wall time of one ask() turn", LATENCY_BUCKETS)
+REGISTRY.histogram("chai_step_seconds", "Server-reported duration of one agent step", LATENCY_BUCKETS)
+REGISTRY.histogram("chai_tool_payload_bytes", "Size of a tool response payload", SIZE_BUCKETS)
+REGISTRY.histogram("chai_turn_tokens", "Tokens per turn (estimated when not reported)", TOKEN_BUCKETS)
+REGISTRY.counter("chai_turns_total", "Turns by outcome")
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(_text(c) for c in content)
+    return getattr(content, "text", "") or ""
+
+
+def _duration(step) -> Optional[float]:
+    start, end = getattr(step, "started_at", None), getattr(step, "completed_at", None)
+    if start and end:
+        return (end - start).total_seconds()
+    return None
+
+
+def step_breakdown(turn) -> List[Dict[str, Any]]:
+    """
+    Per-step timing and payload sizes for a completed turn.
+    """
+    steps = []
+    for step in turn.steps:
+        entry: Dict[str, Any] = {"type": step.step_type, "seconds": _duration(step)}
+        if step.step_type == "tool_execution":
+            for call, resp in zip(step.tool_calls, step.tool_responses):
+                steps.append({
+                    **entry,
+                    "tool": str(call.tool_name),
+                    "payload_bytes": len(_text(resp.content).encode("utf-8")),
+                })
+            continue
+        if step.step_type == "inference":
+            msg = step.api_model_response
+            entry["completion_tokens"] = estimate_tokens(_text(msg.content))
+            entry["tool_calls"] = [str(c.tool_name) for c in msg.tool_calls or []]
+        steps.append(entry)
+    return steps
+
+
+def turn_tokens(turn) -> int:
+    """
+    Estimated tokens a completed turn adds to its session's history: the
+    input messages, every tool response and the final answer.
+    """
+    total = sum(estimate_tokens(_text(m.content)) for m in turn.input_messages or [])
+    for step in turn.steps:
+        if step.step_type == "tool_execution":
+            total += sum(estimate_tokens(_text(r.content)) for r in step.tool_responses)
+    return total + estimate_tokens(_text(turn.output_message.content))
+
+
+def record_turn(
+    prompt: str,
+    wall_seconds: float,
+    mode: str,
+    turn=None,
+    outcome: str = "ok",
+    session_id: Optional[str] = None,
+    trace: Optional[TraceWriter] = None,
+) -> Dict[str, Any]:
+    """
+    Record one turn in the metrics registry (and the trace file, if any).
+    `turn` is None for turns that never reached the server (cache hits, errors).
+    """
+    steps = step_breakdown(turn) if turn is not None else []
+    content = _text(turn.output_message.content) if turn is not None else ""
+    record = {
+        "ts": time.time(),
+        "session_id": session_id,
+        "mode": mode,
+        "outcome": outcome,
+        "wall_seconds": wall_seconds,
+        "prompt_tokens": estimate_tokens(prompt),
+        "completion_tokens": estimate_tokens(content),
+        "tokens_estimated": True,
+        "steps": steps,
+    }
+
+    REGISTRY.inc("chai_turns_total", mode=mode, outcome=outcome)
+    REGISTRY.observe("chai_turn_seconds", wall_seconds, mode=mode, outcome=outcome)
+    if turn is not None:
+        REGISTRY.observe("chai_turn_tokens", record["prompt_tokens"], direction="prompt")
+        REGISTRY.observe("chai_turn_tokens", record["completion_tokens"], direction="completion")
+    for step in steps:
+        tool = step.get("tool", "")
+        if step["seconds"] is not None:
+            REGISTRY.observe("chai_step_seconds", step["seconds"], step_type=step["type"], tool=tool)
+        if "payload_bytes" in step:
+            REGISTRY.observe("chai_tool_payload_bytes", step["payload_bytes"], tool=tool)
+
+    if trace is not None:
+        try:
+            trace.write(record)
+        except Exception as e:
+            logger.warning("Failed writing trace record: %s", e)
+    logger.debug("Turn %s/%s in %.3fs: %s", mode, outcome, wall_seconds,
+                 [(s["type"], s.get("tool"), s["seconds"]) for s in steps])
+    return record
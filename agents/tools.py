@@ -0,0 +1,177 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from llama_stack_client.lib.agents.client_tool import ClientTool
+from llama_stack_client.types.tool_def_param import Parameter
+
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger("ChAIAgent.tools")
+
+REGISTRY.counter("chai_tool_cache_total", "Cached tool lookups by result (hit/miss)")
+
+
+def _canonical(value: Any) -> Any:
+    # parsed tool calls may carry 2 as 2.0 depending on the path they took
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def cache_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    """
+    Tool name plus canonical JSON of the arguments, so argument order,
+    whitespace and int/float spelling in `arguments_json` do not matter.
+    """
+    return tool_name + ":" + json.dumps(_canonical(arguments), sort_keys=True,
+                                        separators=(",", ":"), default=str)
+
+
+def tool_def(tool) -> dict:
+    """
+    JSON-serializable copy of a server tool definition (for the bootstrap cache).
+    """
+    return {
+        "identifier": tool.identifier,
+        "description": tool.description or "",
+        "parameters": [
+            {
+                "name": p.name,
+                "parameter_type": p.parameter_type,
+                "description": p.description or "",
+                "required": bool(getattr(p, "required", True)),
+                "default": getattr(p, "default", None),
+            }
+            for p in tool.parameters or []
+        ],
+    }
+
+
+class ToolResultCache:
+    """
+    TTL + LRU cache of tool results, keyed by `cache_key`.
+
+    Only successful results are stored. Hits and misses are counted per tool
+    and exported as `chai_tool_cache_total`.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    def _count(self, counts: Dict[str, int], tool_name: str, result: str):
+        counts[tool_name] = counts.get(tool_name, 0) + 1
+        REGISTRY.inc("chai_tool_cache_total", tool=tool_name, result=result)
+
+    def get_or_call(self, tool_name: str, arguments: Dict[str, Any], call: Callable[[], Any]) -> Any:
+        key = cache_key(tool_name, arguments)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self._count(self.hits, tool_name, "hit")
+                return entry[1]
+            self._count(self.misses, tool_name, "miss")
+
+        value = call()
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(_content_text(c) for c in content)
+    return getattr(content, "text", None) or str(content)
+
+
+class CachedMCPTool(ClientTool):
+    """
+    Client-side proxy for one read-only MCP tool.
+
+    The agent sees the same name, description and parameters as the server
+    tool, but calls come back to the client, which answers from the cache or
+    forwards them through `tool_runtime.invoke_tool`.
+    """
+
+    def __init__(self, client, definition: dict, cache: ToolResultCache):
+        self.client = client
+        self.definition = definition
+        self.cache = cache
+
+    def get_name(self) -> str:
+        return self.definition["identifier"]
+
+    def get_description(self) -> str:
+        return self.definition["description"]
+
+    def get_params_definition(self) -> Dict[str, Parameter]:
+        return {p["name"]: Parameter(**p) for p in self.definition["parameters"]}
+
+    def _invoke(self, kwargs: Dict[str, Any]) -> str:
+        result = self.client.tool_runtime.invoke_tool(tool_name=self.get_name(), kwargs=kwargs)
+        if getattr(result, "error_message", None):
+            # raised, so the error reaches the model but is never cached
+            raise RuntimeError(result.error_message)
+        return _content_text(result.content)
+
+    def run_impl(self, **kwargs) -> str:
+        return self.cache.get_or_call(self.get_name(), kwargs, lambda: self._invoke(kwargs))
+
+    async def async_run_impl(self, **kwargs) -> str:
+        return await asyncio.to_thread(self.run_impl, **kwargs)
+
+
+def mcp_tools(
+    toolgroup: str,
+    definitions: Iterable[dict],
+    cacheable: Iterable[str],
+    client,
+    cache: Optional[ToolResultCache],
+) -> List[Any]:
+    """
+    Agent `tools` entries for an MCP toolgroup. Tools in `cacheable` become
+    `CachedMCPTool` proxies and the rest stay server-side, named one by one
+    (`toolgroup/tool`) so the group as a whole is not attached twice. Without
+    a cache or known definitions the whole toolgroup is used as before.
+    """
+    definitions = list(definitions)
+    cacheable = set(cacheable)
+    if cache is None or not definitions or not cacheable:
+        return [toolgroup]
+    tools: List[Any] = []
+    for d in definitions:
+        if d["identifier"] in cacheable:
+            tools.append(CachedMCPTool(client, d, cache))
+        else:
+            tools.append(f"{toolgroup}/{d['identifier']}")
+    unknown = cacheable - {d["identifier"] for d in definitions}
+    if unknown:
+        logger.warning("Cacheable tools not offered by %s: %s", toolgroup, sorted(unknown))
+    return tools
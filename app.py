@@ -1,38 +1,14 @@
+import time
+
 import streamlit as st
-import json
-from pathlib import Path
-from agents.chai import ChAIAgent
-from memory.chroma_store import ChromaMemoryStore
+from agents.chai import load_config
+from agents.service import ChAIService
 
 # ✅ Config
-USE_CHROMA = True
-CHAT_HISTORY_FILE = Path(".chat_history.json")
-
-def load_json_history():
-    if CHAT_HISTORY_FILE.exists():
-        return json.loads(CHAT_HISTORY_FILE.read_text())
-    return []
-
-def save_json_history(history):
-    CHAT_HISTORY_FILE.write_text(json.dumps(history, indent=2))
+HISTORY_WINDOW = 50  # messages loaded at startup and per "load older" click
+# Older messages are dropped from the page (and re-loadable) past this many
+MAX_HISTORY_IN_STATE = int(load_config().get("service", {}).get("max_history_in_state", 200))
 
-# ── Memory load ────────────────────────────────────────────────────────────────
-if "chat_history" not in st.session_state:
-    if USE_CHROMA:
-        st.session_state.chat_history = ChromaMemoryStore("chat_memory").get_messages()
-    else:
-        st.session_state.chat_history = load_json_history()
-
-# ── Agent caching ──────────────────────────────────────────────────────────────
-# Create the agent (and memory_store) only once, then reuse on every rerun:
-if "agent" not in st.session_state:
-    st.session_state.agent = ChAIAgent()
-    st.session_state.memory_store = (
-        ChromaMemoryStore("chat_memory") if USE_CHROMA else None
-    )
-
-agent = st.session_state.agent
-memory_store = st.session_state.memory_store
 
 # ── Page setup ─────────────────────────────────────────────────────────────────
 st.set_page_config(
@@ -42,6 +18,28 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# ── Shared service ─────────────────────────────────────────────────────────────
+# One agent + memory store per process, shared by every browser session;
+# each session only gets a handle (its own LlamaStack session + memory thread)
+@st.cache_resource
+def get_service() -> ChAIService:
+    return ChAIService()
+
+
+if "chai" not in st.session_state:
+    # keep the thread in the URL so a reload resumes the same conversation
+    thread_id = st.query_params.get("thread")
+    st.session_state.chai = get_service().session(thread_id)
+    st.query_params["thread"] = st.session_state.chai.thread_id
+
+chai = st.session_state.chai
+
+# ── Memory load ────────────────────────────────────────────────────────────────
+if "chat_history" not in st.session_state:
+    recent = chai.get_recent(HISTORY_WINDOW)
+    st.session_state.chat_history = recent
+    st.session_state.history_has_more = len(recent) == HISTORY_WINDOW
+
 # ── Styling ─────────────────────────────────────────────────────────────────────
 st.markdown("""
 <style>
@@ -104,18 +102,42 @@ with st.sidebar:
         <li><a href='https://github.com/FNNDSC' target='_blank'>GitHub</a></li>
         </ul>
     """, unsafe_allow_html=True)
+    # history saved before per-session threads lives in the service's default thread
+    default_thread = get_service().default_thread
+    if chai.thread_id != default_thread and st.button("🗂️ Open earlier history"):
+        st.query_params["thread"] = default_thread
+        for key in ("chai", "chat_history", "history_has_more"):
+            st.session_state.pop(key, None)
+        st.rerun()
 
 # ── Title & History ────────────────────────────────────────────────────────────
 st.title("🧠 ChAI")
 
-for msg in st.session_state.chat_history:
+if st.session_state.history_has_more and st.button("⬆️ Load older messages"):
+    oldest = next((m["ts"] for m in st.session_state.chat_history if m.get("ts")), None)
+    older = chai.get_before(oldest, HISTORY_WINDOW) if oldest else []
+    st.session_state.chat_history[:0] = older
+    st.session_state.history_has_more = len(older) == HISTORY_WINDOW
+    st.rerun()
+
+
+def render_context(refs, key):
+    """
+    RAG chunks for one answer. History holds chunk IDs only; the text is
+    fetched from the chunk store when the toggle is switched on.
+    """
+    if not st.toggle(f"📚 Show RAG Documents ({len(refs)})", key=key):
+        return
+    for i, doc in enumerate(chai.load_context(refs)):
+        preview = (doc or "(chunk no longer available)")[:1000]
+        st.markdown(f"**Doc {i+1}:**\n```text\n{preview}\n```")
+
+
+for n, msg in enumerate(st.session_state.chat_history):
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
         if msg["role"] == "assistant" and msg.get("context"):
-            with st.expander("📚 Show RAG Documents", expanded=False):
-                for i, doc in enumerate(msg["context"]):
-                    preview = doc[:1000] if isinstance(doc, str) else str(doc)[:1000]
-                    st.markdown(f"**Doc {i+1}:**\n```text\n{preview}\n```")
+            render_context(msg["context"], f"ctx-{msg.get('ts') or n}")
 
 # ── Chat Input & Response ─────────────────────────────────────────────────────
 if prompt := st.chat_input("Ask your question about ChRIS..."):
@@ -125,30 +147,47 @@ if prompt := st.chat_input("Ask your question about ChRIS..."):
 
     # Save to history & memory
     st.session_state.chat_history.append({"role": "user", "content": prompt})
-    if USE_CHROMA:
-        memory_store.append_message("user", prompt)
+    chai.append_message("user", prompt)
 
-    # Get assistant response
+    # Stream assistant response
     with st.chat_message("assistant"):
-        result = agent.ask(prompt)  # {"content": ..., "context": [...]}
-
-        # 1) Render final answer
-        st.markdown(result["content"])
-
-        # 2) Render context if any
-        if result["context"]:
-            with st.expander("📚 Show RAG Documents", expanded=False):
-                for i, chunk in enumerate(result["context"]):
-                    preview = chunk[:1000]
-                    st.markdown(f"**Doc {i+1}:**\n```text\n{preview}\n```")
+        result = {"content": "", "context": []}
+        status = st.empty()
+
+        def text_deltas():
+            for event in chai.ask(prompt, stream=True):
+                if event["type"] == "text":
+                    yield event["delta"]
+                elif event["type"] == "tool_call":
+                    status.caption(f"🛠️ Calling `{event['tool_name']}`…")
+                elif event["type"] == "context":
+                    result["context"].extend(event["chunks"])
+                elif event["type"] == "done":
+                    result["content"] = event["content"]
+            status.empty()
+
+        # 1) Render answer as it is generated
+        streamed = st.write_stream(text_deltas())
+        if not result["content"]:
+            result["content"] = streamed if isinstance(streamed, str) else "".join(map(str, streamed))
+
+        # 2) Keep only chunk IDs; the text goes to the shared chunk store
+        refs = chai.store_context(result["context"])
+        answered_at = time.time()
+        if refs:
+            render_context(refs, f"ctx-{answered_at}")
 
     # Append assistant to history & memory
     st.session_state.chat_history.append({
         "role": "assistant",
         "content": result["content"],
-        "context": result["context"]
+        "context": refs,
+        "ts": answered_at,
     })
-    if USE_CHROMA:
-        memory_store.append_message("assistant", result["content"])
-    else:
-        save_json_history(st.session_state.chat_history)
+    chai.append_message("assistant", result["content"], context=refs)
+
+    # Bound per-session state; trimmed messages stay reachable via "Load older"
+    overflow = len(st.session_state.chat_history) - MAX_HISTORY_IN_STATE
+    if overflow > 0:
+        del st.session_state.chat_history[:overflow]
+        st.session_state.history_has_more = True
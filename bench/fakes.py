@@ -0,0 +1,522 @@
+"""
+In-process stand-ins for the LlamaStack and ChromaDB HTTP servers.
+
+They speak enough of each wire protocol for `ChAIAgent` and
+`ChromaMemoryStore` to run unmodified against them, and can inject latency
+so benchmarks measure ChAI's own overhead on top of a known backend cost.
+"""
+import json
+import math
+import time
+import uuid
+import random
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _dispatch(self, method: str):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        body = json.loads(raw) if raw else {}
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.server.fake.handle(self, method, url.path, query, body)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def send_json(self, payload: Any, status: int = 200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def start_sse(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def send_sse(self, payload: Any):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+        self.wfile.flush()
+
+
+class FakeServer:
+    """
+    Base class: serves `routes` on 127.0.0.1 from a background thread.
+    `latency` seconds are slept before every request is answered.
+    """
+
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        self.latency = latency
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def routes(self) -> List[Tuple[str, str, Callable]]:
+        raise NotImplementedError
+
+    def handle(self, req: _Handler, method: str, path: str, query: dict, body: Any):
+        for m, pattern, fn in self.routes():
+            if m != method:
+                continue
+            params = _match(pattern, path)
+            if params is None:
+                continue
+            with self._lock:
+                self.requests[pattern] = self.requests.get(pattern, 0) + 1
+            if self.latency:
+                time.sleep(self.latency)
+            return fn(req, query, body, **params)
+        req.send_json({"detail": f"no route for {method} {path}"}, status=404)
+
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _match(pattern: str, path: str) -> Optional[Dict[str, str]]:
+    p_parts, parts = pattern.strip("/").split("/"), path.strip("/").split("/")
+    if len(p_parts) != len(parts):
+        return None
+    params = {}
+    for p, v in zip(p_parts, parts):
+        if p.startswith("{"):
+            params[p[1:-1]] = v
+        elif p != v:
+            return None
+    return params
+
+
+# ── LlamaStack ────────────────────────────────────────────────────────────────
+class FakeLlamaStack(FakeServer):
+    """
+    Minimal LlamaStack: toolgroups, vector DBs, RAG insert, agents, sessions
+    and streamed turns.
+
+    A turn optionally runs one scripted `knowledge_search` tool step (taking
+    `tool_latency` seconds) and then streams `answer` in `answer_tokens`
+    deltas, sleeping `token_latency` between them. A fraction `error_rate`
+    of turn requests, spread evenly (`seed` picks which ones), fail with
+    HTTP 500, which the client retries like any server error unless it
+    runs with `max_retries` 0.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        token_latency: float = 0.0,
+        tool_latency: float = 0.0,
+        insert_latency_per_doc: float = 0.0,
+        answer: str = "LLD measurements are within normal limits.",
+        answer_tokens: int = 16,
+        rag_chunks: Optional[List[str]] = None,
+        mcp_tools: Optional[List[str]] = None,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        port: int = 0,
+    ):
+        super().__init__(latency=latency, port=port)
+        self.error_rate = error_rate
+        # offset of the evenly spaced failures, so seeds differ in which turns fail
+        self._error_phase = random.Random(seed).random()
+        self.failed_turns = 0
+        self.token_latency = token_latency
+        self.tool_latency = tool_latency
+        self.insert_latency_per_doc = insert_latency_per_doc
+        self.answer = answer
+        self.answer_tokens = answer_tokens
+        self.rag_chunks = rag_chunks if rag_chunks is not None else ["[BEGIN] pl-lld_inference outputs heatmaps [END]"]
+        self.mcp_tools = mcp_tools or ["health_check", "echo"]
+        self.toolgroups = {"builtin::rag"}
+        self.vector_dbs: Dict[str, dict] = {}
+        self.inserted_docs = 0
+        self.inserted_bytes = 0
+        self.inserted_chunks = 0
+        self.turns = 0
+
+    def routes(self):
+        return [
+            ("GET", "/v1/tools", self._list_tools),
+            ("POST", "/v1/toolgroups", self._register_toolgroup),
+            ("GET", "/v1/vector-dbs", self._list_vector_dbs),
+            ("POST", "/v1/vector-dbs", self._register_vector_db),
+            ("DELETE", "/v1/vector-dbs/{vector_db_id}", self._unregister_vector_db),
+            ("POST", "/v1/tool-runtime/rag-tool/insert", self._rag_insert),
+            ("POST", "/v1/vector-io/insert", self._vector_io_insert),
+            ("POST", "/v1/tool-runtime/invoke", self._invoke_tool),
+            ("POST", "/v1/inference/chat-completion", self._chat_completion),
+            ("POST", "/v1/agents", self._create_agent),
+            ("POST", "/v1/agents/{agent_id}/session", self._create_session),
+            ("POST", "/v1/agents/{agent_id}/session/{session_id}/turn", self._create_turn),
+        ]
+
+    def _tool(self, toolgroup_id: str, name: str) -> dict:
+        return {
+            "identifier": name, "description": f"fake {name}", "parameters": [],
+            "provider_id": "fake", "toolgroup_id": toolgroup_id, "type": "tool",
+        }
+
+    def _list_tools(self, req, query, body):
+        tg = query.get("toolgroup_id")
+        tools = []
+        if tg in (None, "builtin::rag", "builtin::rag/knowledge_search") and "builtin::rag" in self.toolgroups:
+            tools.append(self._tool("builtin::rag", "knowledge_search"))
+        if tg in (None, "mcp::chris") and "mcp::chris" in self.toolgroups:
+            tools.extend(self._tool("mcp::chris", name) for name in self.mcp_tools)
+        req.send_json({"data": tools})
+
+    def _register_toolgroup(self, req, query, body):
+        self.toolgroups.add(body["toolgroup_id"])
+        req.send_json(None)
+
+    def _list_vector_dbs(self, req, query, body):
+        req.send_json({"data": list(self.vector_dbs.values())})
+
+    def _register_vector_db(self, req, query, body):
+        db = {
+            "identifier": body["vector_db_id"],
+            "provider_resource_id": body["vector_db_id"],
+            "provider_id": body.get("provider_id", "faiss"),
+            "embedding_model": body["embedding_model"],
+            "embedding_dimension": body.get("embedding_dimension", 384),
+            "type": "vector_db",
+        }
+        self.vector_dbs[body["vector_db_id"]] = db
+        req.send_json(db)
+
+    def _unregister_vector_db(self, req, query, body, vector_db_id):
+        self.vector_dbs.pop(vector_db_id, None)
+        req.send_json(None)
+
+    def _rag_insert(self, req, query, body):
+        docs = body.get("documents", [])
+        if self.insert_latency_per_doc:
+            time.sleep(self.insert_latency_per_doc * len(docs))
+        with self._lock:
+            self.inserted_docs += len(docs)
+            self.inserted_bytes += sum(len(str(d.get("content", ""))) for d in docs)
+        req.send_json(None)
+
+    def _vector_io_insert(self, req, query, body):
+        chunks = body.get("chunks", [])
+        docs = {c.get("metadata", {}).get("document_id") for c in chunks}
+        if self.insert_latency_per_doc:
+            time.sleep(self.insert_latency_per_doc * len(docs))
+        with self._lock:
+            self.inserted_docs += len(docs)
+            self.inserted_chunks += len(chunks)
+            self.inserted_bytes += sum(len(str(c.get("content", ""))) for c in chunks)
+        req.send_json(None)
+
+    def _invoke_tool(self, req, query, body):
+        if self.tool_latency:
+            time.sleep(self.tool_latency)
+        req.send_json({"content": json.dumps({"tool": body.get("tool_name"), "kwargs": body.get("kwargs")})})
+
+    def _chat_completion(self, req, query, body):
+        req.send_json({"completion_message": {
+            "role": "assistant", "content": self.answer, "stop_reason": "end_of_turn", "tool_calls": [],
+        }})
+
+    def _create_agent(self, req, query, body):
+        req.send_json({"agent_id": str(uuid.uuid4())})
+
+    def _create_session(self, req, query, body, agent_id):
+        req.send_json({"session_id": str(uuid.uuid4())})
+
+    def _create_turn(self, req, query, body, agent_id, session_id):
+        with self._lock:
+            n, phase = self.turns + self.failed_turns, self._error_phase
+            fail = int((n + 1) * self.error_rate + phase) > int(n * self.error_rate + phase)
+            if fail:
+                self.failed_turns += 1
+            else:
+                self.turns += 1
+        if fail:
+            return req.send_json({"detail": "scripted turn failure"}, status=500)
+        turn_id = str(uuid.uuid4())
+        started = _now()
+        steps = []
+
+        def event(payload):
+            return {"event": {"payload": payload}}
+
+        req.start_sse()
+        req.send_sse(event({"event_type": "turn_start", "turn_id": turn_id}))
+
+        if self.rag_chunks:
+            call = {"call_id": str(uuid.uuid4()), "tool_name": "knowledge_search",
+                    "arguments": {"query": "q"}, "arguments_json": '{"query": "q"}'}
+            t0 = _now()
+            if self.tool_latency:
+                time.sleep(self.tool_latency)
+            tool_step = {
+                "step_id": str(uuid.uuid4()), "step_type": "tool_execution", "turn_id": turn_id,
+                "tool_calls": [call],
+                "tool_responses": [{
+                    "call_id": call["call_id"], "tool_name": "knowledge_search",
+                    "content": [{"type": "text", "text": c} for c in self.rag_chunks],
+                }],
+                "started_at": t0, "completed_at": _now(),
+            }
+            steps.append(tool_step)
+            req.send_sse(event({"event_type": "step_complete", "step_type": "tool_execution",
+                                "step_id": tool_step["step_id"], "step_details": tool_step}))
+
+        step_id = str(uuid.uuid4())
+        t0 = _now()
+        words = self.answer.split(" ")
+        per = max(1, math.ceil(len(words) / max(1, self.answer_tokens)))
+        for i in range(0, len(words), per):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            text = " ".join(words[i:i + per]) + (" " if i + per < len(words) else "")
+            req.send_sse(event({"event_type": "step_progress", "step_type": "inference",
+                                "step_id": step_id, "delta": {"type": "text", "text": text}}))
+        message = {"role": "assistant", "content": self.answer, "stop_reason": "end_of_turn", "tool_calls": []}
+        inference_step = {"step_id": step_id, "step_type": "inference", "turn_id": turn_id,
+                          "model_response": message, "started_at": t0, "completed_at": _now()}
+        steps.append(inference_step)
+        req.send_sse(event({"event_type": "step_complete", "step_type": "inference",
+                            "step_id": step_id, "step_details": inference_step}))
+        req.send_sse(event({"event_type": "turn_complete", "turn": {
+            "turn_id": turn_id, "session_id": session_id, "input_messages": body.get("messages", []),
+            "steps": steps, "output_message": message, "output_attachments": [],
+            "started_at": started, "completed_at": _now(),
+        }}))
+
+
+# ── ChromaDB ──────────────────────────────────────────────────────────────────
+def _where_match(meta: dict, where: Optional[dict]) -> bool:
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(_where_match(meta, c) for c in cond):
+                return False
+            continue
+        if key == "$or":
+            if not any(_where_match(meta, c) for c in cond):
+                return False
+            continue
+        value = meta.get(key)
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        for op, target in cond.items():
+            ok = {
+                "$eq": lambda: value == target,
+                "$ne": lambda: value != target,
+                "$gt": lambda: value is not None and value > target,
+                "$gte": lambda: value is not None and value >= target,
+                "$lt": lambda: value is not None and value < target,
+                "$lte": lambda: value is not None and value <= target,
+                "$in": lambda: value in target,
+                "$nin": lambda: value not in target,
+            }[op]()
+            if not ok:
+                return False
+    return True
+
+
+class FakeChroma(FakeServer):
+    """
+    Minimal Chroma (v1 HTTP API, as spoken by chromadb 0.4.x): collections
+    with add/get/update/delete/count/query and `where` filtering.
+    """
+
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        super().__init__(latency=latency, port=port)
+        self.collections: Dict[str, dict] = {}
+
+    def routes(self):
+        api = "/api/v1"
+        return [
+            ("GET", api, self._heartbeat),
+            ("GET", f"{api}/tenants/{{name}}", self._tenant),
+            ("GET", f"{api}/databases/{{name}}", self._database),
+            ("GET", f"{api}/pre-flight-checks", self._preflight),
+            ("GET", f"{api}/collections", self._list_collections),
+            ("POST", f"{api}/collections", self._create_collection),
+            ("GET", f"{api}/collections/{{name}}", self._get_collection),
+            ("GET", f"{api}/collections/{{cid}}/count", self._count),
+            ("POST", f"{api}/collections/{{cid}}/add", self._add),
+            ("POST", f"{api}/collections/{{cid}}/upsert", self._add),
+            ("POST", f"{api}/collections/{{cid}}/update", self._update),
+            ("POST", f"{api}/collections/{{cid}}/get", self._get),
+            ("POST", f"{api}/collections/{{cid}}/delete", self._delete),
+            ("POST", f"{api}/collections/{{cid}}/query", self._query),
+        ]
+
+    def _heartbeat(self, req, query, body):
+        req.send_json({"nanosecond heartbeat": time.time_ns()})
+
+    def _tenant(self, req, query, body, name):
+        req.send_json({"name": name})
+
+    def _database(self, req, query, body, name):
+        req.send_json({"id": name, "name": name, "tenant": query.get("tenant", "default_tenant")})
+
+    def _preflight(self, req, query, body):
+        req.send_json({"max_batch_size": 41666})
+
+    def _public(self, col: dict) -> dict:
+        return {"id": col["id"], "name": col["name"], "metadata": col["metadata"]}
+
+    def _list_collections(self, req, query, body):
+        req.send_json([self._public(c) for c in self.collections.values()])
+
+    def _create_collection(self, req, query, body):
+        for col in self.collections.values():
+            if col["name"] == body["name"]:
+                return req.send_json(self._public(col))
+        col = {"id": str(uuid.uuid4()), "name": body["name"], "metadata": body.get("metadata"), "rows": {}}
+        self.collections[col["id"]] = col
+        req.send_json(self._public(col))
+
+    def _get_collection(self, req, query, body, name):
+        for col in self.collections.values():
+            if col["name"] == name:
+                return req.send_json(self._public(col))
+        req.send_json({"error": "ValueError", "message": f"Collection {name} does not exist."}, status=500)
+
+    def _count(self, req, query, body, cid):
+        req.send_json(len(self.collections[cid]["rows"]))
+
+    def _add(self, req, query, body, cid):
+        rows = self.collections[cid]["rows"]
+        with self._lock:
+            for i, id_ in enumerate(body["ids"]):
+                rows[id_] = {
+                    "embedding": (body.get("embeddings") or [None] * len(body["ids"]))[i],
+                    "metadata": (body.get("metadatas") or [None] * len(body["ids"]))[i],
+                    "document": (body.get("documents") or [None] * len(body["ids"]))[i],
+                }
+        req.send_json(True)
+
+    def _update(self, req, query, body, cid):
+        rows = self.collections[cid]["rows"]
+        with self._lock:
+            for i, id_ in enumerate(body["ids"]):
+                for field, key in (("embeddings", "embedding"), ("metadatas", "metadata"), ("documents", "document")):
+                    if body.get(field) is not None:
+                        rows[id_][key] = body[field][i]
+        req.send_json(True)
+
+    def _select(self, cid: str, body: dict) -> List[Tuple[str, dict]]:
+        rows = self.collections[cid]["rows"]
+        ids = body.get("ids")
+        items = [(i, rows[i]) for i in ids if i in rows] if ids else list(rows.items())
+        where_doc = body.get("where_document") or {}
+        return [
+            (i, r) for i, r in items
+            if _where_match(r["metadata"] or {}, body.get("where"))
+            and ("$contains" not in where_doc or where_doc["$contains"] in (r["document"] or ""))
+        ]
+
+    @staticmethod
+    def _columns(items: List[Tuple[str, dict]], include: List[str]) -> dict:
+        out = {"ids": [i for i, _ in items]}
+        for name, key in (("documents", "document"), ("metadatas", "metadata"), ("embeddings", "embedding")):
+            out[name] = [r[key] for _, r in items] if name in include else None
+        return out
+
+    def _get(self, req, query, body, cid):
+        items = self._select(cid, body)
+        offset, limit = body.get("offset") or 0, body.get("limit")
+        items = items[offset:offset + limit if limit is not None else None]
+        req.send_json(self._columns(items, body.get("include") or ["documents", "metadatas"]))
+
+    def _delete(self, req, query, body, cid):
+        items = self._select(cid, body)
+        with self._lock:
+            for i, _ in items:
+                self.collections[cid]["rows"].pop(i, None)
+        req.send_json([i for i, _ in items])
+
+    def _query(self, req, query, body, cid):
+        items = [(i, r) for i, r in self._select(cid, body) if r["embedding"] is not None]
+        include = body.get("include") or ["documents", "metadatas", "distances"]
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": None}
+        for q in body["query_embeddings"]:
+            qn = math.sqrt(sum(x * x for x in q)) or 1.0
+            scored = []
+            for i, r in items:
+                e = r["embedding"]
+                en = math.sqrt(sum(x * x for x in e)) or 1.0
+                scored.append((1 - sum(a * b for a, b in zip(q, e)) / (qn * en), i, r))
+            scored.sort(key=lambda t: t[0])
+            top = scored[:body.get("n_results", 10)]
+            out["ids"].append([i for _, i, _ in top])
+            out["distances"].append([d for d, _, _ in top])
+            out["documents"].append([r["document"] for _, _, r in top] if "documents" in include else None)
+            out["metadatas"].append([r["metadata"] for _, _, r in top] if "metadatas" in include else None)
+        req.send_json(out)
+
+
+class HashEmbedding:
+    """
+    Cheap deterministic embedding function for Chroma clients under
+    benchmark, so no embedding model has to be downloaded.
+    """
+
+    def __init__(self, dim: int = 32):
+        self.dim = dim
+
+    def __call__(self, input):
+        out = []
+        for text in input:
+            vec = [0.0] * self.dim
+            for tok in text.lower().split():
+                vec[hash(tok) % self.dim] += 1.0
+            out.append(vec)
+        return out
@@ -0,0 +1,339 @@
+"""
+ChAI load test: replay recorded prompts against ChAIAgent.
+
+Prompts come from a chat history export and are fired at a fixed arrival
+rate (open loop; latency counts from each request's scheduled arrival, so
+queueing shows up) or back to back (`--rate 0`, closed loop), with at most
+`--concurrency` requests in flight across `--users` sessions:
+
+    python -m bench.replay --prompts .chat_history.db --rate 5 --concurrency 8 \\
+        --requests 200 --latency 0.05 --token-latency 0.01 --out load.json
+
+Prompt sources: a SQLite history (`.db`), `.chat_history.json`, JSONL (one
+string or `{"prompt"|"content": ...}` per line), plain text (one prompt per
+line) or `chroma:<collection>` on a running Chroma server. Without
+`--prompts`, synthetic questions are used.
+
+By default the agent talks to an in-process stand-in LlamaStack
+(`bench.fakes.FakeLlamaStack`) with the scripted latencies and error rate
+given on the command line; `--config config.yaml` targets the real
+endpoints in that config instead. `--baseline old.json` adds the change
+against an earlier report.
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import sqlite3
+import argparse
+import platform
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import yaml
+
+from bench.fakes import FakeLlamaStack
+from bench.run import WORDS, make_corpus, summarize, write_config
+
+logger = logging.getLogger("ChAIAgent.bench.replay")
+
+
+# ── Prompt sources ────────────────────────────────────────────────────────────
+def _from_record(item) -> Optional[str]:
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict) and item.get("role", "user") == "user":
+        return item.get("prompt") or item.get("content")
+    return None
+
+
+def load_prompts(source: Optional[str], chroma_host: str = "localhost", chroma_port: int = 8000,
+                 synthetic: int = 50, seed: int = 0) -> List[str]:
+    """
+    User prompts from `source`, in their recorded order.
+    """
+    if not source:
+        rng = random.Random(seed)
+        return [f"What does {' '.join(rng.sample(WORDS, 4))} mean?" for _ in range(synthetic)]
+
+    if source.startswith("chroma:"):
+        from memory.chroma_store import ChromaMemoryStore
+        store = ChromaMemoryStore(source.split(":", 1)[1], host=chroma_host, port=chroma_port,
+                                  write_behind=False)
+        return [m["content"] for m in store.get_messages() if m["role"] == "user"]
+
+    path = Path(source)
+    if path.suffix in (".db", ".sqlite"):
+        conn = sqlite3.connect(str(path))
+        try:
+            rows = conn.execute("SELECT content FROM messages WHERE role = 'user' ORDER BY ts, id").fetchall()
+        finally:
+            conn.close()
+        return [r[0] for r in rows]
+    text = path.read_text()
+    if path.suffix == ".json":
+        items = json.loads(text or "[]")
+    elif path.suffix == ".jsonl":
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        items = text.splitlines()
+    return [p for p in map(_from_record, items) if p and p.strip()]
+
+
+def arrival_times(n: int, rate: float, arrival: str, seed: int = 0) -> List[float]:
+    """
+    Offsets (seconds from start) at which each of `n` requests is due;
+    all zero for a closed loop (`rate` 0).
+    """
+    if rate <= 0:
+        return [0.0] * n
+    rng = random.Random(seed)
+    t, out = 0.0, []
+    for _ in range(n):
+        out.append(t)
+        t += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+    return out
+
+
+# ── Drivers ───────────────────────────────────────────────────────────────────
+def _sample(i: int, user: int, due: Optional[float], started: float, finished: float,
+            error: Optional[BaseException] = None, ttft: Optional[float] = None) -> dict:
+    # closed loop: nothing is scheduled, a request is due when a worker takes it
+    return {
+        "i": i, "user": user, "due": started if due is None else due,
+        "started": started, "finished": finished,
+        "error": type(error).__name__ if error else None, "ttft": ttft,
+    }
+
+
+def run_threads(agent, prompts: List[str], offsets: List[float], args) -> List[dict]:
+    """
+    Sync `ask` (or `ask(stream=True)`) from a pool of `concurrency` threads.
+    Each user has its own LlamaStack session, used by one request at a time.
+    """
+    sessions = [agent.agent.create_session(f"replay-{u}") for u in range(args.users)]
+    locks = [threading.Lock() for _ in range(args.users)]
+    samples: List[dict] = []
+
+    def one(i: int, due: Optional[float]):
+        user = i % args.users
+        with locks[user]:
+            started = time.perf_counter()
+            ttft, error = None, None
+            try:
+                if args.mode == "stream":
+                    for event in agent.ask(prompts[i], stream=True, session_id=sessions[user]):
+                        if ttft is None and event["type"] == "text":
+                            ttft = time.perf_counter() - started
+                else:
+                    agent.ask(prompts[i], session_id=sessions[user])
+            except Exception as e:
+                error = e
+            samples.append(_sample(i, user, due, started, time.perf_counter(), error, ttft))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="replay") as pool:
+        for i, offset in enumerate(offsets):
+            delay = t0 + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, i, t0 + offset if args.rate > 0 else None)
+    return samples
+
+
+async def run_async(agent, prompts: List[str], offsets: List[float], args) -> List[dict]:
+    """
+    `aask` from one event loop; `concurrency` bounds requests in flight and
+    each user is its own session key.
+    """
+    await agent.astart()
+    gate = asyncio.Semaphore(args.concurrency)
+    samples: List[dict] = []
+    t0 = time.perf_counter()
+
+    async def one(i: int, offset: float):
+        await asyncio.sleep(max(0.0, t0 + offset - time.perf_counter()))
+        async with gate:
+            started = time.perf_counter()
+            error = None
+            try:
+                await agent.aask(prompts[i], session_key=f"replay-{i % args.users}")
+            except Exception as e:
+                error = e
+            samples.append(_sample(i, i % args.users, t0 + offset if args.rate > 0 else None,
+                                   started, time.perf_counter(), error))
+
+    await asyncio.gather(*(one(i, o) for i, o in enumerate(offsets)))
+    await agent.aclose()
+    return samples
+
+
+# ── Report ────────────────────────────────────────────────────────────────────
+def _turn_outcomes() -> Dict[str, float]:
+    from utils.metrics import REGISTRY
+
+    counts: Dict[str, float] = {}
+    for labels, value in REGISTRY.counter("chai_turns_total", "Turns by outcome").snapshot().items():
+        outcome = dict(labels).get("outcome", "ok")
+        counts[outcome] = counts.get(outcome, 0) + value
+    return counts
+
+
+def build_results(samples: List[dict], duration: float, offered_rate: float,
+                  outcomes: Dict[str, float]) -> dict:
+    ok = [s for s in samples if s["error"] is None]
+    errors: Dict[str, int] = {}
+    for s in samples:
+        if s["error"]:
+            errors[s["error"]] = errors.get(s["error"], 0) + 1
+    stats = lambda xs: summarize(xs) if xs else None
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": len(samples) - len(ok),
+        "error_rate": (len(samples) - len(ok)) / len(samples) if samples else 0.0,
+        "errors_by_type": errors,
+        "duration_seconds": duration,
+        "offered_rps": offered_rate or None,
+        "throughput_rps": len(ok) / duration if duration else 0.0,
+        # from scheduled arrival to completion, so time spent queued counts
+        "latency": stats([s["finished"] - s["due"] for s in ok]),
+        "service_time": stats([s["finished"] - s["started"] for s in ok]),
+        "queue_wait": stats([max(0.0, s["started"] - s["due"]) for s in samples]),
+        "time_to_first_token": stats([s["ttft"] for s in ok if s["ttft"] is not None]),
+        "turn_outcomes": outcomes,
+    }
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    """
+    Relative change (current / baseline - 1) of the headline numbers.
+    """
+    def rel(a, b):
+        return (a / b - 1.0) if a is not None and b else None
+
+    cur, base = current["results"], baseline["results"]
+    out = {
+        "throughput_rps": rel(cur["throughput_rps"], base["throughput_rps"]),
+        "error_rate": cur["error_rate"] - base["error_rate"],
+    }
+    for p in ("p50", "p95", "p99"):
+        out[f"latency_{p}"] = rel((cur["latency"] or {}).get(p), (base["latency"] or {}).get(p))
+    return out
+
+
+# ── Main ──────────────────────────────────────────────────────────────────────
+def _fake_config(workdir: Path, url: str, args) -> Path:
+    docs = make_corpus(workdir / "docs", 2, 1)
+    path = write_config(workdir, url, docs, workers=0)
+    cfg = yaml.safe_load(path.read_text())
+    cfg["llama_stack"]["max_concurrency"] = args.concurrency
+    # a retried scripted failure would just succeed on the next attempt
+    cfg["llama_stack"]["max_retries"] = 0
+    path.write_text(yaml.safe_dump(cfg))
+    return path
+
+
+def replay(args, config_path: str, prompts: List[str]) -> dict:
+    from agents.chai import ChAIAgent
+
+    agent = ChAIAgent(config_path)
+    n = args.requests or len(prompts)
+    order = [prompts[i % len(prompts)] for i in range(n)]
+    offsets = arrival_times(n, args.rate, args.arrival, args.seed)
+
+    if args.warmup:
+        for p in order[:args.warmup]:
+            try:
+                agent.ask(p)
+            except Exception as e:
+                logger.debug("Warmup request failed: %s", e)
+    before = _turn_outcomes()
+
+    t0 = time.perf_counter()
+    if args.mode == "async":
+        samples = asyncio.run(run_async(agent, order, offsets, args))
+    else:
+        samples = run_threads(agent, order, offsets, args)
+    duration = time.perf_counter() - t0
+
+    after = _turn_outcomes()
+    outcomes = {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+    results = build_results(samples, duration, args.rate, outcomes)
+    if args.raw:
+        results["samples"] = sorted(samples, key=lambda s: s["i"])
+    return results
+
+
+def main(argv=None) -> dict:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--prompts", help="prompt source (see above); synthetic if omitted")
+    ap.add_argument("--chroma-host", default="localhost")
+    ap.add_argument("--chroma-port", type=int, default=8000)
+    ap.add_argument("--config", help="run against the endpoints in this config instead of the fake")
+    ap.add_argument("--mode", choices=("sync", "stream", "async"), default="sync")
+    ap.add_argument("--rate", type=float, default=0.0, help="arrivals per second (0 = closed loop)")
+    ap.add_argument("--arrival", choices=("poisson", "uniform"), default="poisson")
+    ap.add_argument("--concurrency", type=int, default=8, help="max requests in flight")
+    ap.add_argument("--users", type=int, help="distinct sessions (default: --concurrency)")
+    ap.add_argument("--requests", type=int, default=0, help="total requests (default: one per prompt)")
+    ap.add_argument("--warmup", type=int, default=0, help="untimed requests sent first")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--latency", type=float, default=0.0, help="fake LlamaStack per-request latency (s)")
+    ap.add_argument("--token-latency", type=float, default=0.0)
+    ap.add_argument("--tool-latency", type=float, default=0.0, help="fake knowledge_search step (s)")
+    ap.add_argument("--answer-tokens", type=int, default=16)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fake turn failure probability")
+    ap.add_argument("--baseline", help="earlier report to compare against")
+    ap.add_argument("--raw", action="store_true", help="include per-request samples")
+    ap.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = ap.parse_args(argv)
+    args.users = args.users or args.concurrency
+
+    import agents.chai  # noqa: F401  (configures logging on import; quiet it afterwards)
+    for name in (None, "httpx", "chromadb"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    prompts = load_prompts(args.prompts, args.chroma_host, args.chroma_port, seed=args.seed)
+    if not prompts:
+        ap.error(f"no user prompts found in {args.prompts}")
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "target": args.config or "fake",
+            "prompts": {"source": args.prompts or "synthetic", "count": len(prompts),
+                        "unique": len(set(prompts))},
+            "args": vars(args),
+        },
+    }
+    if args.config:
+        report["results"] = replay(args, args.config, prompts)
+    else:
+        with tempfile.TemporaryDirectory(prefix="chai-replay-") as tmp, FakeLlamaStack(
+            latency=args.latency, token_latency=args.token_latency, tool_latency=args.tool_latency,
+            answer_tokens=args.answer_tokens, error_rate=args.error_rate, seed=args.seed,
+        ) as ls:
+            report["results"] = replay(args, str(_fake_config(Path(tmp), ls.url, args)), prompts)
+            report["results"]["injected_failures"] = ls.failed_turns
+    if args.baseline:
+        report["baseline"] = {"path": args.baseline,
+                              "delta": compare(report, json.loads(Path(args.baseline).read_text()))}
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
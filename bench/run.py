@@ -0,0 +1,257 @@
+"""
+ChAI benchmark harness.
+
+Runs ChAIAgent and the memory stores against the in-process fakes in
+`bench.fakes` and prints (or writes) a JSON report:
+
+    python -m bench.run --docs 500 --history 100,1000,5000 --out bench.json
+"""
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import statistics
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import yaml
+
+from bench.fakes import FakeChroma, FakeLlamaStack, HashEmbedding
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+WORDS = ("femur tibia landmark heatmap inference pipeline dicom plugin feed "
+         "measurement discrepancy patient report analysis image node join").split()
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    s = sorted(samples)
+    pct = lambda p: s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
+    return {
+        "n": len(s), "mean": statistics.fmean(s), "min": s[0], "max": s[-1],
+        "p50": pct(50), "p95": pct(95), "p99": pct(99),
+    }
+
+
+def make_corpus(root: Path, n_docs: int, doc_kb: int, seed: int = 0) -> Path:
+    """
+    Write `n_docs` synthetic Markdown files of roughly `doc_kb` KiB each.
+    """
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    for i in range(n_docs):
+        lines = [f"# Synthetic report {i}"]
+        while sum(len(l) for l in lines) < doc_kb * 1024:
+            lines.append(" ".join(rng.choice(WORDS) for _ in range(16)))
+        (root / f"doc_{i:05d}.md").write_text("\n".join(lines))
+    return root
+
+
+def write_config(workdir: Path, llama_url: str, docs_dir: Path, **ingestion) -> Path:
+    cfg = yaml.safe_load((REPO_ROOT / "config.yaml").read_text())
+    cfg["llama_stack"]["base_url"] = llama_url
+    cfg["llama_stack"]["bootstrap_cache_path"] = str(workdir / "bootstrap.json")
+    cfg["ingestion"].update(
+        local_docs_dir=str(docs_dir),
+        manifest_path=str(workdir / "manifest.json"),
+        embedding_cache=str(workdir / "embeddings.db"),
+        **ingestion,
+    )
+    # keep every on-disk artifact out of the repo's own, and read the repo's
+    # pipeline specs wherever the benchmark is run from
+    cfg.setdefault("retrieval", {})["index_dir"] = str(workdir / "index")
+    cfg.setdefault("pipelines", {}).update(dir=str(REPO_ROOT / "pipelines"),
+                                           cache_path=str(workdir / "pipelines.json"))
+    cfg.setdefault("cache", {})["enabled"] = False
+    cfg.setdefault("logging", {})["level"] = "WARNING"
+    path = workdir / "config.yaml"
+    path.write_text(yaml.safe_dump(cfg))
+    return path
+
+
+# ── Benchmarks ────────────────────────────────────────────────────────────────
+def bench_startup(args, workdir: Path) -> dict:
+    from agents.chai import ChAIAgent
+
+    docs = make_corpus(workdir / "startup_docs", 5, 1)
+    with FakeLlamaStack(latency=args.latency) as ls:
+        cold, warm = [], []
+        timings = None
+        for i in range(args.repeat):
+            run_dir = workdir / f"startup_{i}"
+            run_dir.mkdir()
+            cfg = write_config(run_dir, ls.url, docs, workers=0)
+            agent = ChAIAgent(str(cfg))
+            cold.append(agent.startup_seconds)
+            timings = agent.startup_timings
+            # second start reuses manifest + bootstrap cache
+            warm.append(ChAIAgent(str(cfg)).startup_seconds)
+    return {"cold": summarize(cold), "warm": summarize(warm), "last_cold_phases": timings}
+
+
+def bench_ask(args, workdir: Path) -> dict:
+    from agents.chai import ChAIAgent
+
+    docs = make_corpus(workdir / "ask_docs", 1, 1)
+    with FakeLlamaStack(latency=args.latency, token_latency=args.token_latency,
+                        tool_latency=args.tool_latency, answer_tokens=args.answer_tokens) as ls:
+        agent = ChAIAgent(str(write_config(workdir, ls.url, docs, workers=0)))
+        backend = args.latency + args.tool_latency + args.token_latency * args.answer_tokens
+        wall, overhead, ttft = [], [], []
+        for i in range(args.asks):
+            t0 = time.perf_counter()
+            agent.ask(f"question {i}")
+            dt = time.perf_counter() - t0
+            wall.append(dt)
+            overhead.append(dt - backend)
+
+            t0 = time.perf_counter()
+            for event in agent.ask(f"stream question {i}", stream=True):
+                if event["type"] == "text" and len(ttft) <= i:
+                    ttft.append(time.perf_counter() - t0)
+    return {
+        "injected_backend_seconds": backend,
+        "wall": summarize(wall),
+        "overhead": summarize(overhead),
+        "stream_time_to_first_token": summarize(ttft) if ttft else None,
+    }
+
+
+def bench_ingest(args, workdir: Path) -> dict:
+    from agents.chai import ChAIAgent
+
+    docs = make_corpus(workdir / "ingest_docs", args.docs, args.doc_kb)
+    total_bytes = sum(f.stat().st_size for f in docs.iterdir())
+    with FakeLlamaStack(latency=args.latency, insert_latency_per_doc=args.insert_latency) as ls:
+        cfg = write_config(workdir, ls.url, docs, workers=args.workers)
+        agent = ChAIAgent(str(cfg))
+        full = agent.startup_timings.get("ingest", 0.0)
+
+        # one-file edit, then re-sync
+        next(docs.iterdir()).write_text("# edited\nnew content")
+        t0 = time.perf_counter()
+        agent._ingest_documents()
+        incremental = time.perf_counter() - t0
+        inserted = ls.inserted_docs
+    return {
+        "docs": args.docs,
+        "bytes": total_bytes,
+        "workers": args.workers,
+        "full_seconds": full,
+        "docs_per_second": args.docs / full if full else None,
+        "mb_per_second": total_bytes / 1e6 / full if full else None,
+        "incremental_one_edit_seconds": incremental,
+        "server_inserted_docs": inserted,
+    }
+
+
+def _bench_store(store, sizes: List[int], appends_per_step: int) -> List[dict]:
+    results, written = [], 0
+    for size in sizes:
+        while written < size:
+            store.append_message("user" if written % 2 == 0 else "assistant", f"message {written}")
+            written += 1
+        store.flush()
+        append = []
+        for i in range(appends_per_step):
+            t0 = time.perf_counter()
+            store.append_message("user", f"probe {size}-{i}")
+            append.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        store.flush()
+        flush = time.perf_counter() - t0
+        written += appends_per_step
+
+        t0 = time.perf_counter()
+        recent = store.get_recent(50)
+        load_recent = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        everything = store.get_messages()
+        load_all = time.perf_counter() - t0
+        results.append({
+            "history_size": written,
+            "append": summarize(append),
+            "flush_seconds": flush,
+            "get_recent_50_seconds": load_recent,
+            "get_messages_seconds": load_all,
+            "loaded": [len(recent), len(everything)],
+        })
+    return results
+
+
+def bench_memory(args, workdir: Path) -> dict:
+    from memory.sqlite_store import SQLiteMemoryStore
+
+    sizes = [int(s) for s in args.history.split(",")]
+    report = {"sqlite": _bench_store(SQLiteMemoryStore(str(workdir / "history.db"), import_json=None),
+                                     sizes, args.appends)}
+    try:
+        from memory.chroma_store import ChromaMemoryStore
+    except ImportError as e:
+        report["chroma"] = {"skipped": str(e)}
+        return report
+    for write_behind in (False, True):
+        with FakeChroma(latency=args.chroma_latency) as fake:
+            store = ChromaMemoryStore(
+                "chat_memory", host="127.0.0.1", port=fake.port,
+                write_behind=write_behind, embedding_function=HashEmbedding(),
+            )
+            key = "chroma_write_behind" if write_behind else "chroma_sync"
+            report[key] = _bench_store(store, sizes, args.appends)
+            store.close()
+    return report
+
+
+BENCHMARKS = {"startup": bench_startup, "ask": bench_ask, "ingest": bench_ingest, "memory": bench_memory}
+
+
+def main(argv=None) -> dict:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--only", default=",".join(BENCHMARKS), help="comma-separated subset of benchmarks")
+    ap.add_argument("--out", help="write the JSON report here instead of stdout")
+    ap.add_argument("--repeat", type=int, default=3, help="startup repetitions")
+    ap.add_argument("--asks", type=int, default=20)
+    ap.add_argument("--docs", type=int, default=200, help="synthetic corpus size")
+    ap.add_argument("--doc-kb", type=int, default=4)
+    ap.add_argument("--workers", type=int, default=4, help="ingestion worker processes")
+    ap.add_argument("--history", default="100,1000", help="history sizes to probe")
+    ap.add_argument("--appends", type=int, default=20, help="timed appends per history size")
+    ap.add_argument("--latency", type=float, default=0.0, help="LlamaStack per-request latency (s)")
+    ap.add_argument("--token-latency", type=float, default=0.0)
+    ap.add_argument("--tool-latency", type=float, default=0.0)
+    ap.add_argument("--answer-tokens", type=int, default=16)
+    ap.add_argument("--insert-latency", type=float, default=0.0, help="RAG insert latency per doc (s)")
+    ap.add_argument("--chroma-latency", type=float, default=0.0, help="Chroma per-request latency (s)")
+    args = ap.parse_args(argv)
+
+    import agents.chai  # noqa: F401  (configures logging on import; quiet it afterwards)
+    for name in (None, "httpx", "chromadb"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": {},
+    }
+    for name in args.only.split(","):
+        with tempfile.TemporaryDirectory(prefix=f"chai-bench-{name}-") as tmp:
+            t0 = time.perf_counter()
+            report["results"][name] = BENCHMARKS[name](args, Path(tmp))
+            report["results"][name]["elapsed_seconds"] = time.perf_counter() - t0
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
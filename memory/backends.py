@@ -0,0 +1,17 @@
+from typing import Optional
+
+
+def open_memory_store(backend: str = "chroma", collection_name: str = "chat_memory",
+                      thread_id: Optional[str] = None, user_id: Optional[str] = None,
+                      sqlite_path: str = ".chat_history.db"):
+    """
+    Open a chat history store. `chroma` needs a running Chroma server;
+    `sqlite` is a local file and needs nothing else.
+    """
+    if backend == "chroma":
+        from memory.chroma_store import ChromaMemoryStore
+        return ChromaMemoryStore(collection_name, thread_id=thread_id, user_id=user_id)
+    if backend == "sqlite":
+        from memory.sqlite_store import SQLiteMemoryStore
+        return SQLiteMemoryStore(sqlite_path, thread_id=thread_id, user_id=user_id)
+    raise ValueError(f"Unknown memory backend: {backend!r}")
@@ -1,31 +1,316 @@
+import json
+import time
+import uuid
+import atexit
+import logging
+import threading
 import chromadb
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from memory.chunk_store import is_chunk_id
+
+# First window tried when paging by time; widened until enough messages are found
+INITIAL_WINDOW_SECONDS = 24 * 3600
+WINDOW_GROWTH = 4
+MAX_WINDOW_STEPS = 8
+
+# Background writer retry delay after a failed flush (doubles up to the max)
+MAX_FLUSH_BACKOFF_SECONDS = 30.0
+
+logger = logging.getLogger("ChromaMemoryStore")
+
 
 class ChromaMemoryStore:
-    def __init__(self, collection_name: str = "chat_memory"):
+    def __init__(
+        self,
+        collection_name: str = "chat_memory",
+        thread_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        host: str = "localhost",
+        port: int = 8000,
+        write_behind: bool = True,
+        max_batch: int = 32,
+        flush_interval: float = 0.5,
+        max_pending: int = 10000,
+        embedding_function=None,
+    ):
         # ✅ Connect to the running ChromaDB server (must be started with `chroma run`)
-        self.client = chromadb.HttpClient(host="localhost", port=8000)
-        self.collection = self.client.get_or_create_collection(name=collection_name)
-
-    def append_message(self, role: str, content: str):
-        timestamp = datetime.utcnow().isoformat()
-        self.collection.add(
-            documents=[content],
-            metadatas=[{"role": role, "timestamp": timestamp}],
-            ids=[f"{role}-{timestamp}"]
-        )
+        self.client = chromadb.HttpClient(host=host, port=port)
+        extra = {"embedding_function": embedding_function} if embedding_function else {}
+        self.collection = self.client.get_or_create_collection(name=collection_name, **extra)
+        # Default filters applied to reads and tags applied to writes
+        self.thread_id = thread_id
+        self.user_id = user_id
+        # legacy rows without `ts` are backfilled once, on the first short window
+        self._backfill_checked = False
+
+        # Write-behind buffer: appends are batched and flushed by a background
+        # thread on size, on time, on explicit flush() and at shutdown
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        # bound on buffered messages while Chroma is unreachable; oldest dropped first
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending: List[tuple] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._writer = None
+        if write_behind:
+            self._writer = threading.Thread(
+                target=self._writer_loop, name=f"chroma-writer-{collection_name}", daemon=True
+            )
+            self._writer.start()
+            atexit.register(self.close)
 
-    def get_messages(self):
-        results = self.collection.get(include=["documents", "metadatas"])
+    # ── Writes ───────────────────────────────────────────────────────────────
+    def _writer_loop(self):
+        backoff = 0.0
+        while True:
+            with self._cond:
+                if backoff:
+                    # after a failure only shutdown cuts the wait short, or a
+                    # full buffer would retry in a tight loop
+                    self._cond.wait_for(lambda: self._closed, timeout=backoff)
+                else:
+                    self._cond.wait_for(
+                        lambda: self._closed or len(self._pending) >= self.max_batch,
+                        timeout=self.flush_interval,
+                    )
+                closed = self._closed
+            try:
+                self.flush()
+                backoff = 0.0
+            except Exception as e:
+                backoff = min(MAX_FLUSH_BACKOFF_SECONDS, max(self.flush_interval, backoff * 2))
+                logger.warning("Background flush failed; retrying in %.1fs: %s", backoff, e)
+            if closed:
+                return
+
+    def _trim_pending(self):
+        # caller holds self._cond
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            del self._pending[:excess]
+            self.dropped += excess
+            logger.warning("Write buffer full; dropped %d oldest messages (%d total)", excess, self.dropped)
+
+    def flush(self):
+        """
+        Write all buffered messages to Chroma. Returns once they are stored.
+        """
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                ids, docs, metas = zip(*batch)
+                self.collection.add(documents=list(docs), metadatas=list(metas), ids=list(ids))
+            except Exception:
+                with self._cond:
+                    self._pending[:0] = batch
+                    self._trim_pending()
+                raise
+            logger.debug("Flushed %d messages", len(batch))
+
+    def close(self):
+        """
+        Flush outstanding messages and stop the background writer.
+        """
+        if self._writer is None:
+            return
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._writer.join()
+        self._writer = None
+        self.flush()  # anything the writer could not store
+
+    def append_message(self, role: str, content: str, thread_id: Optional[str] = None,
+                       user_id: Optional[str] = None, context: Optional[list] = None):
+        ts = time.time()
+        timestamp = datetime.fromtimestamp(ts, timezone.utc).isoformat()
+        meta = {"role": role, "timestamp": timestamp, "ts": ts}
+        # Chroma metadata is scalar-only and meant to stay small, so only
+        # chunk-store references are kept, never inline chunk text
+        if context and all(is_chunk_id(ref) for ref in context):
+            meta["context_refs"] = json.dumps(context)
+        thread_id = thread_id or self.thread_id
+        user_id = user_id or self.user_id
+        if thread_id:
+            meta["thread_id"] = thread_id
+        if user_id:
+            meta["user_id"] = user_id
+        record = (f"{role}-{uuid.uuid4().hex}", content, meta)
+        if self._writer is None:
+            self.collection.add(documents=[content], metadatas=[meta], ids=[record[0]])
+            return
+        with self._cond:
+            self._pending.append(record)
+            self._trim_pending()
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    # ── Reads ────────────────────────────────────────────────────────────────
+    def _where(self, *clauses: dict, thread_id: Optional[str] = None,
+               user_id: Optional[str] = None) -> Optional[dict]:
+        clauses = list(clauses)
+        thread_id = thread_id or self.thread_id
+        user_id = user_id or self.user_id
+        if thread_id:
+            clauses.append({"thread_id": thread_id})
+        if user_id:
+            clauses.append({"user_id": user_id})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def _get(self, where: Optional[dict]) -> List[dict]:
+        self.flush()  # read-your-writes
+        results = self.collection.get(where=where, include=["documents", "metadatas"])
         messages = []
         for doc, meta in zip(results["documents"], results["metadatas"]):
             messages.append({
                 "role": meta.get("role", "user"),
                 "content": doc,
-                "timestamp": meta.get("timestamp", "")
+                "timestamp": meta.get("timestamp", ""),
+                "ts": meta.get("ts"),
+            })
+            if meta.get("context_refs"):
+                messages[-1]["context"] = json.loads(meta["context_refs"])
+        messages.sort(key=lambda m: (m["ts"] is not None, m["ts"] or 0, m["timestamp"]))
+        return messages
+
+    def _window(self, n: int, before: Optional[float] = None, after: Optional[float] = None,
+                **filters) -> List[dict]:
+        """
+        Fetch up to `n` messages adjacent to a cursor, filtering by time range
+        inside Chroma. The range starts narrow and widens until it holds `n`
+        messages, so only about a window's worth of rows crosses the wire.
+        """
+        forward = after is not None
+        anchor = after if forward else (before if before is not None else time.time() + 1)
+        # Small collections: one bounded query is cheaper than probing windows
+        steps = 0 if self.collection.count() <= n else MAX_WINDOW_STEPS
+        window = INITIAL_WINDOW_SECONDS
+        for _ in range(steps):
+            if forward:
+                clauses = ({"ts": {"$gt": anchor}}, {"ts": {"$lte": anchor + window}})
+            else:
+                clauses = ({"ts": {"$lt": anchor}}, {"ts": {"$gte": anchor - window}})
+            messages = self._get(self._where(*clauses, **filters))
+            if len(messages) >= n or (forward and anchor + window > time.time()):
+                break
+            window *= WINDOW_GROWTH
+        else:
+            # Sparse history: drop the far bound
+            bound = {"ts": {"$gt": anchor}} if forward else {"ts": {"$lt": anchor}}
+            messages = self._get(self._where(bound, **filters))
+        if len(messages) < n and not self._backfill_checked:
+            # a short window may just be history written before `ts` existed
+            self._backfill_checked = True
+            if self.backfill_timestamps():
+                return self._window(n, before=before, after=after, **filters)
+        return messages[:n] if forward else messages[-n:]
+
+    def get_recent(self, n: int = 50, **filters) -> List[dict]:
+        """
+        The last `n` messages, oldest first.
+        """
+        return self._window(n, **filters)
+
+    def get_before(self, cursor: float, n: int = 50, **filters) -> List[dict]:
+        """
+        Up to `n` messages older than the `ts` cursor, oldest first.
+        """
+        return self._window(n, before=cursor, **filters)
+
+    def get_after(self, cursor: float, n: int = 50, **filters) -> List[dict]:
+        """
+        Up to `n` messages newer than the `ts` cursor, oldest first.
+        """
+        return self._window(n, after=cursor, **filters)
+
+    def get_messages(self, thread_id: Optional[str] = None, user_id: Optional[str] = None):
+        return self._get(self._where(thread_id=thread_id, user_id=user_id))
+
+    def recall(self, query: str, k: int = 5, since: Optional[float] = None,
+               until: Optional[float] = None, **filters) -> List[dict]:
+        """
+        The `k` past messages most similar to `query`, most relevant first,
+        each with its vector `distance`. Thread/user filters and the `ts`
+        range (`since` <= ts < `until`) are applied inside Chroma.
+        """
+        self.flush()
+        clauses = []
+        if since is not None:
+            clauses.append({"ts": {"$gte": since}})
+        if until is not None:
+            clauses.append({"ts": {"$lt": until}})
+        n = min(k, self.collection.count())
+        if n <= 0:
+            return []
+        results = self.collection.query(
+            query_texts=[query],
+            n_results=n,
+            where=self._where(*clauses, **filters),
+            include=["documents", "metadatas", "distances"],
+        )
+        messages = []
+        for doc, meta, dist in zip(results["documents"][0], results["metadatas"][0],
+                                   results["distances"][0]):
+            messages.append({
+                "role": meta.get("role", "user"),
+                "content": doc,
+                "timestamp": meta.get("timestamp", ""),
+                "ts": meta.get("ts"),
+                "distance": dist,
             })
-        messages.sort(key=lambda m: m["timestamp"])
+            if meta.get("context_refs"):
+                messages[-1]["context"] = json.loads(meta["context_refs"])
         return messages
 
+    def backfill_timestamps(self) -> int:
+        """
+        Add the numeric `ts` field to messages written before it existed, so
+        they show up in windowed reads. Runs automatically the first time a
+        window comes back short. Returns the number of rows updated.
+        """
+        self.flush()
+        results = self.collection.get(include=["metadatas"])
+        ids, metas = [], []
+        for id_, meta in zip(results["ids"], results["metadatas"]):
+            if "ts" in meta or not meta.get("timestamp"):
+                continue
+            dt = datetime.fromisoformat(meta["timestamp"])
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            ids.append(id_)
+            metas.append({**meta, "ts": dt.timestamp()})
+        if ids:
+            self.collection.update(ids=ids, metadatas=metas)
+        return len(ids)
+
+    def adopt_unthreaded(self, thread_id: str) -> int:
+        """
+        Tag messages written before threads existed with `thread_id`, so a
+        thread-scoped reader can open them. Returns the number of rows updated.
+        """
+        self.flush()
+        results = self.collection.get(include=["metadatas"])
+        ids, metas = [], []
+        for id_, meta in zip(results["ids"], results["metadatas"]):
+            if meta.get("thread_id"):
+                continue
+            ids.append(id_)
+            metas.append({**meta, "thread_id": thread_id})
+        if ids:
+            self.collection.update(ids=ids, metadatas=metas)
+        return len(ids)
+
     def clear(self):
+        with self._cond:
+            self._pending = []
         self.collection.delete(where={})  # Delete all stored messages
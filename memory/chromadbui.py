@@ -1,33 +1,120 @@
+import json
+
 import chromadb
 from chromadb.config import Settings
 import pandas as pd
 import streamlit as st
 import config as cfg
 
+PAGE_SIZES = (25, 50, 100, 250)
 
-def view_collections():
-    st.title("📂 ChromaDB Collections Viewer")
 
-    client = chromadb.HttpClient(
+@st.cache_resource
+def get_client():
+    return chromadb.HttpClient(
         host=cfg.CHROMA_HOST,
         port=cfg.CHROMA_PORT,
         settings=Settings(allow_reset=False),
     )
 
-    collections = client.list_collections()
 
-    if not collections:
+def collection_counts(client) -> pd.DataFrame:
+    """
+    One row per collection with its size; `count()` is a cheap server call,
+    so nothing else is loaded until a collection is picked.
+    """
+    rows = []
+    for collection in client.list_collections():
+        try:
+            rows.append({"collection": collection.name, "count": collection.count()})
+        except Exception as e:
+            rows.append({"collection": collection.name, "count": None, "error": str(e)})
+    return pd.DataFrame(rows)
+
+
+def fetch_page(collection, offset: int, limit: int, where=None, where_document=None,
+               with_documents: bool = True, with_embeddings: bool = False) -> pd.DataFrame:
+    """
+    One page of a collection as a DataFrame: ids, flattened metadata and,
+    if asked for, documents and embeddings.
+    """
+    include = ["metadatas"]
+    if with_documents:
+        include.append("documents")
+    if with_embeddings:
+        include.append("embeddings")
+    data = collection.get(limit=limit, offset=offset, where=where or None,
+                          where_document=where_document or None, include=include)
+
+    df = pd.DataFrame([m or {} for m in data["metadatas"]])
+    df.insert(0, "id", data["ids"])
+    if with_documents:
+        df["document"] = data["documents"]
+    if with_embeddings:
+        df["embedding"] = [list(e) for e in data["embeddings"]]
+    return df
+
+
+def _json_filter(label: str, key: str):
+    raw = st.text_input(label, key=key, placeholder='e.g. {"role": "user"}')
+    if not raw.strip():
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        st.error(f"Invalid JSON in {label.lower()}: {e}")
+        st.stop()
+
+
+def view_collections():
+    st.title("📂 ChromaDB Collections Viewer")
+
+    client = get_client()
+    counts = collection_counts(client)
+    if counts.empty:
         st.warning("No collections found.")
         return
+    st.dataframe(counts, hide_index=True)
 
-    for collection in collections:
-        st.markdown(f"### Collection: `{collection.name}`")
-        try:
-            data = collection.get()
-            df = pd.DataFrame.from_dict(data)
-            st.dataframe(df)
-        except Exception as e:
-            st.error(f"Failed to fetch data from `{collection.name}`: {e}")
+    name = st.selectbox("Collection", counts["collection"])
+    collection = client.get_collection(name)
+    total = counts.set_index("collection").loc[name, "count"]
+    # a failed count() is stored as None, which pandas turns into NaN
+    total = None if pd.isna(total) else int(total)
+
+    # ── Filters & projection (applied server-side) ──
+    with st.expander("Filter", expanded=False):
+        where = _json_filter("Metadata filter (`where`)", f"where-{name}")
+        contains = st.text_input("Document contains", key=f"contains-{name}")
+        where_document = {"$contains": contains} if contains else None
+
+    c1, c2, c3 = st.columns(3)
+    page_size = c1.selectbox("Rows per page", PAGE_SIZES, key=f"size-{name}")
+    with_documents = c2.checkbox("Documents", value=True, key=f"docs-{name}")
+    with_embeddings = c3.checkbox("Embeddings", value=False, key=f"emb-{name}")
+
+    filtered = where is not None or where_document is not None
+    pages = None if filtered or total is None else max(1, -(-total // page_size))
+    page = st.number_input(
+        f"Page (of {pages})" if pages else "Page",
+        min_value=1, max_value=pages, value=1, step=1, key=f"page-{name}",
+    )
+
+    try:
+        df = fetch_page(collection, (page - 1) * page_size, page_size, where, where_document,
+                        with_documents, with_embeddings)
+    except Exception as e:
+        st.error(f"Failed to fetch data from `{name}`: {e}")
+        return
+
+    if df.empty:
+        st.info("No rows on this page.")
+        return
+    columns = st.multiselect("Columns", list(df.columns), default=list(df.columns),
+                             key=f"cols-{name}")
+    st.dataframe(df[columns] if columns else df, hide_index=True)
+    st.caption(f"Rows {(page - 1) * page_size + 1}–{(page - 1) * page_size + len(df)}"
+               + (" (filtered)" if filtered else f" of {total}" if total is not None else ""))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+import hashlib
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger("ChunkStore")
+
+CHUNK_PREFIX = "chunk:"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id   TEXT PRIMARY KEY,
+    text TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def chunk_id(text: str) -> str:
+    return CHUNK_PREFIX + hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def is_chunk_id(ref) -> bool:
+    return isinstance(ref, str) and ref.startswith(CHUNK_PREFIX) and len(ref) == len(CHUNK_PREFIX) + 32
+
+
+class ChunkStore:
+    """
+    Content-addressed store for RAG context chunks.
+
+    Chat history keeps only chunk IDs; the text of each distinct chunk is
+    stored once, no matter how many turns retrieved it, and fetched only when
+    someone actually looks at it. Recently read chunks are kept in a small
+    in-process LRU.
+    """
+
+    def __init__(self, path: str = ".chai_chunks.db", cache_size: int = 1024):
+        self.path = Path(path)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _remember(self, ref: str, text: str):
+        self._cache[ref] = text
+        self._cache.move_to_end(ref)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def put_many(self, chunks: Iterable[str]) -> List[str]:
+        """
+        Store chunk texts and return their IDs, in order. IDs passed in are
+        returned unchanged, so this is safe to call on already-stored context.
+        """
+        refs, new = [], []
+        for chunk in chunks:
+            if is_chunk_id(chunk):
+                refs.append(chunk)
+                continue
+            ref = chunk_id(chunk)
+            refs.append(ref)
+            new.append((ref, chunk))
+        if new:
+            with self._lock, self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO chunks (id, text) VALUES (?, ?)", new)
+                for ref, text in new:
+                    self._remember(ref, text)
+        return refs
+
+    def get_many(self, refs: Iterable[str]) -> List[Optional[str]]:
+        """
+        Chunk texts for `refs` (None for unknown IDs). Anything that is not a
+        chunk ID is treated as inline text from older history and passed through.
+        """
+        refs = list(refs)
+        with self._lock:
+            found = {r: self._cache[r] for r in refs if r in self._cache}
+            missing = [r for r in set(refs) if is_chunk_id(r) and r not in found]
+            if missing:
+                marks = ",".join("?" * len(missing))
+                rows = self._conn.execute(
+                    f"SELECT id, text FROM chunks WHERE id IN ({marks})", missing
+                ).fetchall()
+                for ref, text in rows:
+                    found[ref] = text
+                    self._remember(ref, text)
+        return [found.get(r) if is_chunk_id(r) else r for r in refs]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,251 @@
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger("SQLiteMemoryStore")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts        REAL NOT NULL,
+    role      TEXT NOT NULL,
+    content   TEXT NOT NULL,
+    thread_id TEXT,
+    user_id   TEXT,
+    context   TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_thread_ts ON messages (thread_id, ts);
+CREATE INDEX IF NOT EXISTS messages_ts ON messages (ts);
+"""
+
+# Full-text index over message content for recall(), kept in sync by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, content='messages', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+FTS_TERM = re.compile(r"\w+")
+
+
+class SQLiteMemoryStore:
+    """
+    Local chat history backend with the same interface as `ChromaMemoryStore`,
+    for running without a Chroma server.
+
+    Every append is a single-row insert committed through SQLite's WAL, so a
+    crash can lose at most the message being written and never corrupts
+    earlier history. Tail reads use the (thread_id, ts) index. The WAL is
+    checkpointed and free pages reclaimed every `compact_every` appends.
+    """
+
+    def __init__(
+        self,
+        path: str = ".chat_history.db",
+        thread_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        compact_every: int = 500,
+        import_json: Optional[str] = ".chat_history.json",
+    ):
+        self.path = Path(path)
+        self.thread_id = thread_id
+        self.user_id = user_id
+        self.compact_every = compact_every
+        self._appends = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        # auto_vacuum only takes effect on a new database (before the first table)
+        self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._fts = self._create_fts()
+        if import_json:
+            self._import_json(Path(import_json))
+
+    def _create_fts(self) -> bool:
+        """
+        Create the full-text index (filling it from existing history on first
+        use). False if this SQLite build has no FTS5.
+        """
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'"
+        ).fetchone()
+        try:
+            self._conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logger.warning("Full-text recall unavailable: %s", e)
+            return False
+        if not exists:
+            with self._conn:
+                self._conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+        return True
+
+    def _import_json(self, path: Path):
+        """
+        One-time import of the legacy `.chat_history.json` into an empty store.
+        """
+        if not path.exists() or self._conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone():
+            return
+        try:
+            history = json.loads(path.read_text() or "[]")
+        except ValueError as e:
+            logger.warning("Not importing unreadable %s: %s", path, e)
+            return
+        base = time.time() - len(history)
+        with self._lock, self._conn:
+            for i, msg in enumerate(history):
+                self._conn.execute(
+                    "INSERT INTO messages (ts, role, content, thread_id, user_id, context) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (msg.get("ts") or base + i, msg.get("role", "user"), msg.get("content", ""),
+                     self.thread_id, self.user_id, json.dumps(msg.get("context") or [])),
+                )
+        logger.info("Imported %d messages from %s", len(history), path)
+
+    # ── Writes ───────────────────────────────────────────────────────────────
+    def append_message(self, role: str, content: str, thread_id: Optional[str] = None,
+                       user_id: Optional[str] = None, context: Optional[list] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO messages (ts, role, content, thread_id, user_id, context) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (time.time(), role, content, thread_id or self.thread_id,
+                 user_id or self.user_id, json.dumps(context) if context else None),
+            )
+            self._appends += 1
+        if self.compact_every and self._appends % self.compact_every == 0:
+            self.compact()
+
+    def adopt_unthreaded(self, thread_id: str) -> int:
+        """
+        Move messages stored without a thread (e.g. the imported
+        `.chat_history.json`) into `thread_id`. Returns the number moved.
+        """
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE messages SET thread_id = ? WHERE thread_id IS NULL", (thread_id,)
+            )
+        return cur.rowcount
+
+    def flush(self):
+        """
+        No-op: every append is committed immediately.
+        """
+
+    def compact(self):
+        """
+        Fold the WAL back into the main file and release free pages.
+        """
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("PRAGMA incremental_vacuum")
+        logger.debug("Compacted %s", self.path)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ── Reads ────────────────────────────────────────────────────────────────
+    def _query(self, clauses: List[str], params: list, thread_id: Optional[str],
+               user_id: Optional[str], order: str = "ASC", limit: Optional[int] = None) -> List[dict]:
+        thread_id = thread_id or self.thread_id
+        user_id = user_id or self.user_id
+        if thread_id:
+            clauses.append("thread_id = ?")
+            params.append(thread_id)
+        if user_id:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        sql = "SELECT ts, role, content, context FROM messages"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY ts {order}, id {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        messages = [self._row(r) for r in rows]
+        return messages[::-1] if order == "DESC" else messages
+
+    @staticmethod
+    def _row(r: sqlite3.Row) -> dict:
+        msg = {
+            "role": r["role"],
+            "content": r["content"],
+            "timestamp": datetime.fromtimestamp(r["ts"], timezone.utc).isoformat(),
+            "ts": r["ts"],
+        }
+        if r["context"]:
+            msg["context"] = json.loads(r["context"])
+        return msg
+
+    def get_recent(self, n: int = 50, thread_id: Optional[str] = None,
+                   user_id: Optional[str] = None) -> List[dict]:
+        return self._query([], [], thread_id, user_id, order="DESC", limit=n)
+
+    def get_before(self, cursor: float, n: int = 50, thread_id: Optional[str] = None,
+                   user_id: Optional[str] = None) -> List[dict]:
+        return self._query(["ts < ?"], [cursor], thread_id, user_id, order="DESC", limit=n)
+
+    def get_after(self, cursor: float, n: int = 50, thread_id: Optional[str] = None,
+                  user_id: Optional[str] = None) -> List[dict]:
+        return self._query(["ts > ?"], [cursor], thread_id, user_id, limit=n)
+
+    def get_messages(self, thread_id: Optional[str] = None, user_id: Optional[str] = None):
+        return self._query([], [], thread_id, user_id)
+
+    def recall(self, query: str, k: int = 5, since: Optional[float] = None,
+               until: Optional[float] = None, thread_id: Optional[str] = None,
+               user_id: Optional[str] = None) -> List[dict]:
+        """
+        The `k` past messages most relevant to `query`, most relevant first.
+        Same contract as `ChromaMemoryStore.recall`, ranked by FTS5 BM25
+        instead of vectors (`distance` is the BM25 score; lower is better).
+        """
+        terms = list(dict.fromkeys(FTS_TERM.findall(query.lower())))
+        if not self._fts or not terms or k <= 0:
+            return []
+        clauses = ["messages_fts MATCH ?"]
+        params: list = [" OR ".join(f'"{t}"' for t in terms)]
+        if since is not None:
+            clauses.append("m.ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("m.ts < ?")
+            params.append(until)
+        thread_id = thread_id or self.thread_id
+        user_id = user_id or self.user_id
+        if thread_id:
+            clauses.append("m.thread_id = ?")
+            params.append(thread_id)
+        if user_id:
+            clauses.append("m.user_id = ?")
+            params.append(user_id)
+        sql = (
+            "SELECT m.ts, m.role, m.content, m.context, bm25(messages_fts) AS score "
+            "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+            f"WHERE {' AND '.join(clauses)} ORDER BY score LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, [*params, k]).fetchall()
+        return [{**self._row(r), "distance": r["score"]} for r in rows]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages")
+        self.compact()
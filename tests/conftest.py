@@ -0,0 +1,104 @@
+import sys
+import logging
+from pathlib import Path
+
+import pytest
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from bench.fakes import FakeLlamaStack  # noqa: E402
+from bench.run import make_corpus, write_config  # noqa: E402
+
+
+@pytest.fixture
+def fake_llama():
+    """
+    Factory for a running `FakeLlamaStack`; stopped after the test.
+    """
+    servers = []
+
+    def start(**kwargs) -> FakeLlamaStack:
+        servers.append(FakeLlamaStack(**kwargs).start())
+        return servers[-1]
+
+    yield start
+    for ls in servers:
+        ls.stop()
+
+
+@pytest.fixture
+def agent_config(tmp_path):
+    """
+    Factory for a config file pointing at a fake LlamaStack, with every
+    on-disk artifact kept under `tmp_path`. Keyword args update the config
+    sections.
+    """
+    def write(ls: FakeLlamaStack, **sections) -> Path:
+        docs = make_corpus(tmp_path / "docs", 2, 1)
+        path = write_config(tmp_path, ls.url, docs, workers=0)
+        cfg = yaml.safe_load(path.read_text())
+        cfg["memory"].update(sqlite_path=str(tmp_path / "history.db"),
+                             chunk_store_path=str(tmp_path / "chunks.db"))
+        for section, values in sections.items():
+            cfg.setdefault(section, {}).update(values)
+        path.write_text(yaml.safe_dump(cfg))
+        return path
+
+    return write
+
+
+@pytest.fixture
+def make_agent(agent_config):
+    """
+    Factory for a `ChAIAgent` against a fake LlamaStack (see `agent_config`).
+    """
+    def make(ls: FakeLlamaStack, **sections):
+        from agents.chai import ChAIAgent
+
+        agent = ChAIAgent(str(agent_config(ls, **sections)))
+        logging.getLogger().setLevel(logging.WARNING)
+        return agent
+
+    return make
+
+
+@pytest.fixture
+def make_service(agent_config):
+    """
+    Factory for a `ChAIService` on the SQLite memory backend.
+    """
+    def make(ls: FakeLlamaStack, **sections):
+        from agents.service import ChAIService
+
+        sections["memory"] = {"backend": "sqlite", **sections.get("memory", {})}
+        service = ChAIService(str(agent_config(ls, **sections)))
+        logging.getLogger().setLevel(logging.WARNING)
+        return service
+
+    return make
+
+
+@pytest.fixture
+def chroma_store():
+    """
+    Factory for a `ChromaMemoryStore` on a fake Chroma server.
+    """
+    from bench.fakes import FakeChroma, HashEmbedding
+    from memory.chroma_store import ChromaMemoryStore
+
+    servers, stores = [], []
+
+    def make(**kwargs) -> ChromaMemoryStore:
+        if not servers:
+            servers.append(FakeChroma().start())
+        kwargs.setdefault("embedding_function", HashEmbedding())
+        stores.append(ChromaMemoryStore(host="127.0.0.1", port=servers[0].port, **kwargs))
+        return stores[-1]
+
+    yield make
+    for store in stores:
+        store.close()
+    for server in servers:
+        server.stop()
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from utils.metrics import REGISTRY
+
+
+class ExactCache:
+    """
+    Exact-match stand-in for `SemanticAnswerCache` (same get/put contract).
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, prompt, corpus_version):
+        return self.entries.get((prompt, corpus_version))
+
+    def put(self, prompt, result, corpus_version):
+        self.entries[(prompt, corpus_version)] = dict(result)
+
+
+def test_follow_ups_are_not_cached_or_served_from_cache(fake_llama, make_agent):
+    ls = fake_llama()
+    agent = make_agent(ls, retrieval={"enabled": False})
+    agent.answer_cache = ExactCache()
+    alice = agent.agent.create_session("alice")
+    bob = agent.agent.create_session("bob")
+
+    agent.ask("What does pl-lld_inference output?", session_id=alice)
+    assert len(agent.answer_cache.entries) == 1
+    # a follow-up depends on alice's history: neither stored nor served
+    agent.ask("Summarize that", session_id=alice)
+    assert len(agent.answer_cache.entries) == 1
+    agent.answer_cache.put("Summarize that", {"content": "alice's patient", "context": []},
+                           agent.manifest.corpus_version)
+    assert agent.ask("Summarize that", session_id=alice)["content"] != "alice's patient"
+    assert ls.turns == 3
+
+    # bob starts fresh: the first question is shared
+    agent.ask("What does pl-lld_inference output?", session_id=bob)
+    assert ls.turns == 3
+
+
+def test_turns_with_recalled_memory_are_not_shared(fake_llama, make_agent):
+    ls = fake_llama()
+    agent = make_agent(ls, retrieval={"enabled": False})
+    agent.answer_cache = ExactCache()
+    memory = [{"role": "user", "content": "Patient 42 has a 2 cm discrepancy", "ts": 1.0}]
+
+    agent.ask("What is the discrepancy?", session_id=agent.agent.create_session("a"), memory=memory)
+    assert agent.answer_cache.entries == {}
+    # a fresh caller without memory does not get the memory-informed answer
+    agent.ask("What is the discrepancy?", session_id=agent.agent.create_session("b"))
+    assert ls.turns == 2
+    assert len(agent.answer_cache.entries) == 1
+    agent.ask("What is the discrepancy?", session_id=agent.agent.create_session("c"), memory=memory)
+    assert ls.turns == 3
+
+
+def outcomes(mode):
+    turns = REGISTRY.counter("chai_turns_total", "Turns by outcome").snapshot()
+    return {dict(labels)["outcome"]: v for labels, v in turns.items() if dict(labels)["mode"] == mode}
+
+
+@pytest.mark.parametrize("mode", ["sync", "stream", "async", "async_stream"])
+def test_every_mode_runs_the_same_pipeline(fake_llama, make_agent, mode):
+    agent = make_agent(fake_llama(), retrieval={"enabled": False})
+    agent.answer_cache = ExactCache()
+
+    def ask(prompt, key):
+        if mode in ("sync", "stream"):
+            session = agent.agent.create_session(key)
+            if mode == "sync":
+                return agent.ask(prompt, session_id=session)["content"]
+            return [e for e in agent.ask(prompt, stream=True, session_id=session)][-1]["content"]
+
+        async def run():
+            try:
+                if mode == "async":
+                    return (await agent.aask(prompt, session_key=key))["content"]
+                return [e async for e in agent.astream(prompt, session_key=key)][-1]["content"]
+            finally:
+                await agent.aclose()
+
+        return asyncio.run(run())
+
+    before = outcomes(mode)
+    live = ask("What does pl-lld_inference output?", "a")
+    assert ask("What does pl-lld_inference output?", "b") == live
+    assert ask("What runs after dcm-to-mha-1?", "c").startswith("In **")
+    delta = {k: v - before.get(k, 0) for k, v in outcomes(mode).items() if v - before.get(k, 0)}
+    assert delta == {"ok": 1, "cache_hit": 1, "pipeline_index": 1}
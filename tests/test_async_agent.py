@@ -0,0 +1,81 @@
+import time
+import asyncio
+import threading
+
+import agents.chai
+
+
+def track_turns(ls):
+    """
+    Record `(server session, start, end)` for every turn the fake serves.
+    """
+    spans, lock = [], threading.Lock()
+    create_turn = ls._create_turn
+
+    def timed(req, query, body, agent_id, session_id):
+        start = time.perf_counter()
+        try:
+            return create_turn(req, query, body, agent_id, session_id)
+        finally:
+            with lock:
+                spans.append((session_id, start, time.perf_counter()))
+
+    ls._create_turn = timed
+    return spans
+
+
+def peak_overlap(spans):
+    edges = sorted([(s, 1) for _, s, _ in spans] + [(e, -1) for _, _, e in spans])
+    peak = active = 0
+    for _, step in edges:
+        active += step
+        peak = max(peak, active)
+    return peak
+
+
+def ask_all(agent, keys, per_key=1):
+    async def run():
+        answers = await asyncio.gather(*(
+            agent.aask(f"question {n} from {key}", session_key=key)
+            for key in keys for n in range(per_key)
+        ))
+        await agent.aclose()
+        return answers
+
+    return asyncio.run(run())
+
+
+def test_concurrent_first_calls_start_one_async_client(fake_llama, make_agent, monkeypatch):
+    clients = []
+
+    class CountingClient(agents.chai.AsyncLlamaStackClient):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            clients.append(self)
+
+    monkeypatch.setattr(agents.chai, "AsyncLlamaStackClient", CountingClient)
+    agent = make_agent(fake_llama(token_latency=0.01, answer_tokens=4))
+    ask_all(agent, [f"k{i}" for i in range(5)])
+    assert len(clients) == 1
+
+
+def test_session_keys_run_in_parallel_and_turns_within_a_key_do_not(fake_llama, make_agent):
+    ls = fake_llama(token_latency=0.05, answer_tokens=4)
+    spans = track_turns(ls)
+    agent = make_agent(ls, llama_stack={"max_concurrency": 8})
+    ask_all(agent, ["a", "b", "c"], per_key=2)
+
+    assert len(spans) == 6
+    assert peak_overlap(spans) >= 2
+    for session in {s for s, _, _ in spans}:
+        assert peak_overlap([span for span in spans if span[0] == session]) == 1
+
+
+def test_max_concurrency_caps_turns_in_flight(fake_llama, make_agent):
+    ls = fake_llama(token_latency=0.05, answer_tokens=4)
+    spans = track_turns(ls)
+    agent = make_agent(ls, llama_stack={"max_concurrency": 2})
+    ask_all(agent, [f"k{i}" for i in range(6)])
+
+    assert len(spans) == 6
+    assert peak_overlap(spans) == 2
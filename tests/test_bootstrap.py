@@ -0,0 +1,33 @@
+def test_lost_vector_db_is_recreated_and_refilled_within_bootstrap_ttl(fake_llama, make_agent):
+    ls = fake_llama()
+    make_agent(ls, retrieval={"enabled": False})
+    first_inserts = ls.inserted_chunks + ls.inserted_docs
+    assert first_inserts
+
+    # LlamaStack restarts and loses its vector DBs; the bootstrap cache is still fresh
+    ls.vector_dbs.clear()
+    make_agent(ls, retrieval={"enabled": False})
+    assert ls.vector_dbs
+    assert ls.inserted_chunks + ls.inserted_docs == 2 * first_inserts
+
+
+def test_failed_mcp_registration_is_retried_on_the_next_start(fake_llama, make_agent):
+    ls = fake_llama()
+    register = ls._register_toolgroup
+
+    def refuse_mcp(req, query, body):
+        if body["toolgroup_id"] == "mcp::chris":
+            return req.send_json({"detail": "MCP server unreachable"}, status=400)
+        return register(req, query, body)
+
+    ls._register_toolgroup = refuse_mcp
+    agent = make_agent(ls, retrieval={"enabled": False})
+    assert not agent.mcp_registered
+    assert "mcp::chris" not in ls.toolgroups
+
+    # the MCP server is back; a start within the bootstrap TTL registers it
+    ls._register_toolgroup = register
+    agent = make_agent(ls, retrieval={"enabled": False})
+    assert agent.mcp_registered
+    assert "mcp::chris" in ls.toolgroups
+    assert agent.mcp_tools == ls.mcp_tools
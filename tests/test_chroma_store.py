@@ -0,0 +1,38 @@
+def test_history_written_before_ts_shows_up_in_windows(chroma_store):
+    store = chroma_store(write_behind=False)
+    # rows as written before the numeric `ts` field existed
+    store.collection.add(
+        ids=["user-old", "assistant-old"],
+        documents=["old question", "old answer"],
+        metadatas=[{"role": "user", "timestamp": "2024-01-01T00:00:00+00:00"},
+                   {"role": "assistant", "timestamp": "2024-01-01T00:00:01+00:00"}],
+    )
+    store.append_message("user", "new question")
+
+    recent = store.get_recent(10)
+    assert [m["content"] for m in recent] == ["old question", "old answer", "new question"]
+    assert all(m["ts"] is not None for m in recent)
+
+
+def test_writer_backs_off_and_bounds_its_buffer_while_chroma_is_down(chroma_store, monkeypatch):
+    import time
+
+    store = chroma_store(max_batch=4, flush_interval=0.05, max_pending=10)
+    calls = []
+
+    def down(self, **kwargs):
+        calls.append(1)
+        raise ConnectionError("chroma is down")
+
+    monkeypatch.setattr(type(store.collection), "add", down)
+    for i in range(25):
+        store.append_message("user", f"message {i}")
+    time.sleep(0.5)
+    # retries at 0.05, 0.1, 0.2, ... rather than spinning on the full buffer
+    assert len(calls) <= 6
+    assert len(store._pending) == 10
+    assert store.dropped == 15
+
+    monkeypatch.undo()
+    store.close()
+    assert [m["content"] for m in store.get_recent(20)] == [f"message {i}" for i in range(15, 25)]
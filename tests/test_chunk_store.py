@@ -0,0 +1,50 @@
+from memory.chunk_store import ChunkStore, chunk_id, is_chunk_id
+
+
+def stored_rows(store: ChunkStore) -> int:
+    return store._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+
+def test_identical_chunks_are_stored_once(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.db"))
+    refs = store.put_many(["pl-dcm2niix converts DICOM", "ChRIS runs plugins",
+                           "pl-dcm2niix converts DICOM"])
+    assert refs[0] == refs[2] != refs[1]
+    assert all(is_chunk_id(r) for r in refs)
+    assert refs[0] == chunk_id("pl-dcm2niix converts DICOM")
+
+    # a later turn retrieving the same chunk adds nothing
+    assert store.put_many(["ChRIS runs plugins"]) == [refs[1]]
+    assert stored_rows(store) == 2
+
+
+def test_put_many_passes_existing_ids_through(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.db"))
+    refs = store.put_many(["pl-dcm2niix converts DICOM"])
+    unknown = chunk_id("never stored")
+
+    assert store.put_many(refs + ["ChRIS runs plugins", unknown]) == \
+        [refs[0], chunk_id("ChRIS runs plugins"), unknown]
+    assert stored_rows(store) == 2
+
+
+def test_get_many_reads_from_disk_and_passes_legacy_text_through(tmp_path):
+    path = str(tmp_path / "chunks.db")
+    refs = ChunkStore(path).put_many(["pl-dcm2niix converts DICOM", "ChRIS runs plugins"])
+
+    # a fresh store has a cold cache, so this reads SQLite
+    store = ChunkStore(path)
+    legacy = "inline context from an old history entry"
+    assert store.get_many([refs[1], legacy, chunk_id("never stored"), refs[0], refs[1]]) == [
+        "ChRIS runs plugins", legacy, None, "pl-dcm2niix converts DICOM", "ChRIS runs plugins",
+    ]
+    assert store.get_many([]) == []
+
+
+def test_read_cache_is_bounded(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.db"), cache_size=2)
+    refs = store.put_many(["a", "b", "c"])
+    assert list(store._cache) == refs[1:]
+    # evicted chunks are still read back from SQLite
+    assert store.get_many(refs) == ["a", "b", "c"]
+    assert len(store._cache) == 2
@@ -0,0 +1,47 @@
+import numpy as np
+
+from agents.chai import ChAIAgent
+
+
+class HashEmbedder:
+    """
+    `BatchEmbedder` stand-in: bag-of-words vectors, no model download.
+    """
+    model_name = "hash"
+    dim = 32
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+
+    def encode(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in zip(out, texts):
+            for tok in text.lower().split():
+                row[hash(tok) % self.dim] += 1.0
+            row /= max(np.linalg.norm(row), 1e-9)
+        return out
+
+    def embed(self, texts, hashes=None):
+        if self.fail:
+            raise RuntimeError("embedding model crashed")
+        return self.encode(list(texts))
+
+
+def test_embedding_failure_fails_the_batch_not_startup(fake_llama, make_agent, monkeypatch):
+    embedder = HashEmbedder(fail=True)
+    monkeypatch.setattr(ChAIAgent, "embedder", lambda self: embedder)
+    agent = make_agent(fake_llama(), ingestion={"pipeline": "local", "insert_retries": 1})
+    # nothing counts as ingested, so the next start retries
+    assert agent.manifest.entries == {}
+
+
+def test_answer_cache_reuses_the_shared_embedder(fake_llama, make_agent, monkeypatch):
+    embedder = HashEmbedder()
+    monkeypatch.setattr(ChAIAgent, "embedder", lambda self: embedder)
+    agent = make_agent(fake_llama(), cache={"enabled": True})
+
+    cache = agent.answer_cache
+    assert cache.embedder is embedder
+    cache.put("what is ChRIS", {"content": "a platform"})
+    assert cache.get("What is ChRIS")["content"] == "a platform"
+    assert cache.get("how do I install a plugin") is None
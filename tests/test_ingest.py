@@ -0,0 +1,109 @@
+import os
+from pathlib import Path
+
+import pytest
+
+import agents.ingest
+from agents.ingest import IngestionManifest
+
+UNREGISTER = "/v1/vector-dbs/{vector_db_id}"
+
+
+def capture_inserts(ls, fail: bool = False):
+    """
+    File names of the documents each RAG insert carries; with `fail`, every
+    insert is refused (with a status the client does not retry).
+    """
+    sources = []
+    insert = ls._rag_insert
+
+    def recording(req, query, body):
+        if fail:
+            return req.send_json({"detail": "insert refused"}, status=400)
+        sources.extend(Path(d["metadata"]["source"]).name for d in body.get("documents", []))
+        return insert(req, query, body)
+
+    ls._rag_insert = recording
+    return sources
+
+
+@pytest.fixture
+def docs(tmp_path):
+    # the corpus make_agent writes
+    return tmp_path / "docs"
+
+
+def test_one_edited_file_is_the_only_one_inserted(fake_llama, make_agent, docs):
+    ls = fake_llama()
+    sources = capture_inserts(ls)
+    agent = make_agent(ls, ingestion={"rebuild_stale_ratio": 10})
+    assert sorted(sources) == ["doc_00000.md", "doc_00001.md"]
+
+    (docs / "doc_00001.md").write_text("# Edited\nnew text")
+    sources.clear()
+    agent._ingest_documents()
+    assert sources == ["doc_00001.md"]
+    assert len(agent.manifest.stale) == 1
+
+
+def test_removed_file_moves_to_stale(fake_llama, make_agent, docs):
+    agent = make_agent(fake_llama(), ingestion={"rebuild_stale_ratio": 10})
+    key = str(docs / "doc_00000.md")
+    document_id = agent.manifest.entries[key]["document_id"]
+
+    os.remove(key)
+    agent._ingest_documents()
+    assert key not in agent.manifest.entries
+    assert agent.manifest.stale == [document_id]
+
+
+def test_crossing_the_stale_ratio_rebuilds_the_vector_db(fake_llama, make_agent, docs):
+    ls = fake_llama()
+    sources = capture_inserts(ls)
+    agent = make_agent(ls, ingestion={"rebuild_stale_ratio": 0.25})
+
+    (docs / "doc_00000.md").write_text("# Edited\nnew text")
+    sources.clear()
+    agent._ingest_documents()
+    # 1 stale of 2 live > 0.25: dropped, re-registered and refilled
+    assert ls.requests.get(UNREGISTER) == 1
+    assert sorted(sources) == ["doc_00000.md", "doc_00001.md"]
+    assert agent.manifest.stale == []
+
+
+def test_failed_batch_leaves_its_files_out_of_the_manifest(fake_llama, make_agent):
+    ls = fake_llama()
+    insert = ls._rag_insert
+    capture_inserts(ls, fail=True)
+    agent = make_agent(ls, ingestion={"insert_retries": 1})
+    assert agent.manifest.entries == {}
+
+    # inserts work again: the next sync retries every file
+    ls._rag_insert = insert
+    sources = capture_inserts(ls)
+    agent._ingest_documents()
+    assert sorted(sources) == ["doc_00000.md", "doc_00001.md"]
+    assert len(agent.manifest.entries) == 2
+
+
+def test_unchanged_pdf_is_skipped_by_mtime_and_size(tmp_path, monkeypatch):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    pdf = docs / "manual.pdf"
+    pdf.write_bytes(b"%PDF-1.4 not really parsed here")
+    manifest = IngestionManifest(tmp_path / "manifest.json", "db")
+    pending, _ = manifest.diff(docs)
+    for f, entry in pending:
+        manifest.record(str(f), entry)
+
+    def never(path):
+        raise AssertionError(f"{path} was read")
+
+    monkeypatch.setattr(agents.ingest, "file_sha256", never)
+    assert manifest.diff(docs) == ([], [])
+
+    # same size, new mtime: read again, and unchanged content is not pending
+    monkeypatch.undo()
+    st = pdf.stat()
+    os.utime(pdf, (st.st_atime, st.st_mtime + 10))
+    assert manifest.diff(docs) == ([], [])
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from utils.metrics import REGISTRY, MetricsRegistry
+
+
+def errors_recorded() -> float:
+    turns = REGISTRY.counter("chai_turns_total", "Turns by outcome").snapshot()
+    return sum(v for labels, v in turns.items() if dict(labels).get("outcome") == "error")
+
+
+def test_failed_streamed_turns_are_recorded(fake_llama, make_agent):
+    ls = fake_llama(error_rate=1.0)
+    agent = make_agent(ls, llama_stack={"max_retries": 0})
+    before = errors_recorded()
+
+    with pytest.raises(Exception):
+        list(agent.ask("what is ChRIS?", stream=True))
+
+    async def astream():
+        try:
+            async for _ in agent.astream("what is ChRIS?", session_key="k"):
+                pass
+        finally:
+            await agent.aclose()
+
+    with pytest.raises(Exception):
+        asyncio.run(astream())
+    assert errors_recorded() - before == 2
+
+
+def test_serve_starts_one_server():
+    registry = MetricsRegistry()
+    server = registry.serve(0, host="127.0.0.1")
+    try:
+        assert registry.serve(0, host="127.0.0.1") is server
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,32 @@
+import pytest
+
+from agents.pipelines import PipelineIndex
+from conftest import REPO_ROOT
+
+
+@pytest.fixture
+def index(tmp_path):
+    return PipelineIndex(REPO_ROOT / "pipelines", tmp_path / "pipelines.json")
+
+
+@pytest.mark.parametrize("question", [
+    "What happens after dcm-to-mha-1 fails? How do I debug it?",
+    "Does dcm-to-mha-1 depend on GPU memory?",
+    "Why is dcm-to-mha-1 slower than what runs after it?",
+    "What runs after pl-topologicalcopy?",
+])
+def test_questions_that_only_mention_a_node_go_to_the_model(index, question):
+    assert index.answer(question) is None
+
+
+def test_simple_structural_questions_are_answered(index):
+    after = index.answer("What runs after dcm-to-mha-1?")
+    assert after.splitlines()[1:] == ["- `generate-landmark-heatmaps-2` (pl-lld_inference v2.2.11)"]
+    before = index.answer("which nodes come before `pacs-push-9`")
+    assert "`image-to-DICOM-8`" in before
+
+
+def test_plugin_names_stand_for_their_node(index):
+    upstream = index.answer("upstream of pl-lld_inference")
+    assert "`generate-landmark-heatmaps-2` depends on" in upstream
+    assert "`dcm-to-mha-1`" in upstream and "`root-0`" in upstream
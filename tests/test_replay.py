@@ -0,0 +1,20 @@
+import json
+
+from bench import replay
+
+
+def test_scripted_failures_reach_the_error_rate(tmp_path):
+    report = replay.main(["--requests", "30", "--error-rate", "0.1", "--concurrency", "2",
+                          "--out", str(tmp_path / "load.json")])
+    results = report["results"]
+    assert results["injected_failures"] == 3
+    assert results["errors"] == results["injected_failures"]
+    assert results["error_rate"] == results["errors"] / 30
+
+
+def test_relative_paths_resolve_against_the_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    replay.main(["--requests", "4", "--concurrency", "2", "--out", "first.json"])
+    replay.main(["--requests", "4", "--concurrency", "2", "--out", "second.json",
+                 "--baseline", "first.json"])
+    assert "delta" in json.loads((tmp_path / "second.json").read_text())["baseline"]
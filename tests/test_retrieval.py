@@ -0,0 +1,62 @@
+import sys
+import threading
+import subprocess
+
+from conftest import REPO_ROOT
+from agents.retriever import HybridRetriever
+
+
+def test_local_index_is_built_in_the_background_after_startup(fake_llama, make_agent, tmp_path):
+    agent = make_agent(fake_llama(), retrieval={"enabled": True, "dense": False})
+    agent._retriever_thread.join(timeout=10)
+    assert agent.retriever is not None
+    assert (tmp_path / "index").exists()
+    assert len(agent.retrieve("pipeline", k=2)) <= 2
+
+
+def test_retrieve_returns_nothing_until_the_index_is_ready(fake_llama, make_agent, monkeypatch):
+    release = threading.Event()
+    sync = HybridRetriever.sync
+
+    def slow_sync(self, manifest):
+        release.wait(timeout=10)
+        return sync(self, manifest)
+
+    monkeypatch.setattr(HybridRetriever, "sync", slow_sync)
+    agent = make_agent(fake_llama(), retrieval={"enabled": True, "dense": False})
+    building = agent._retriever_thread
+
+    assert agent.retrieve("pipeline") == []
+    # a turn during the build neither waits for it nor starts a second one
+    assert agent._retriever_thread is building
+
+    release.set()
+    building.join(timeout=10)
+    assert agent.retrieve("pipeline", k=1)
+
+
+def test_corpus_change_rebuilds_without_blocking_search(fake_llama, make_agent, tmp_path):
+    agent = make_agent(fake_llama(), retrieval={"enabled": True, "dense": False})
+    agent._retriever_thread.join(timeout=10)
+    old = agent.retriever
+
+    (tmp_path / "docs" / "extra.md").write_text("# Extra\nfreshly added notes about pipelines")
+    agent._ingest_documents()
+    # the old index still answers while the new one is built
+    assert agent.retrieve("pipeline", k=1)
+    agent._retriever_thread.join(timeout=10)
+    assert agent.retriever is not old
+    assert agent.retriever.corpus_version == agent.manifest.corpus_version
+
+
+def test_disabled_retrieval_never_opens_an_index(fake_llama, make_agent, tmp_path):
+    agent = make_agent(fake_llama(), retrieval={"enabled": False})
+    assert agent.retrieve("pipeline") == []
+    assert agent.retriever is None
+    assert agent._retriever_thread is None
+    assert not (tmp_path / "index").exists()
+
+
+def test_importing_the_agent_does_not_load_numpy():
+    code = "import sys, agents.chai; sys.exit('numpy' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT).returncode == 0
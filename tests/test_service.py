@@ -0,0 +1,26 @@
+import json
+
+
+def test_history_without_a_thread_opens_in_the_default_thread(fake_llama, make_service,
+                                                             tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".chat_history.json").write_text(json.dumps([
+        {"role": "user", "content": "what is ChRIS?"},
+        {"role": "assistant", "content": "A platform for medical image analysis."},
+    ]))
+    service = make_service(fake_llama())
+
+    assert service.session("someone").get_recent() == []
+    history = service.session(service.default_thread).get_recent()
+    assert [m["content"] for m in history] == ["what is ChRIS?", "A platform for medical image analysis."]
+
+
+def test_chroma_history_without_a_thread_is_adopted(chroma_store):
+    store = chroma_store()
+    store.append_message("user", "older question")
+    store.append_message("user", "newer question", thread_id="t1")
+    store.flush()
+
+    assert store.adopt_unthreaded("default") == 1
+    assert [m["content"] for m in store.get_messages(thread_id="default")] == ["older question"]
+    assert [m["content"] for m in store.get_messages(thread_id="t1")] == ["newer question"]
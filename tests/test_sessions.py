@@ -0,0 +1,48 @@
+from agents.sessions import SessionLedger
+from utils.metrics import estimate_tokens
+
+
+def run_turns(ledger: SessionLedger, n: int, answer_tokens: int):
+    """
+    Drive `n` turns the way `ChAIAgent` does; the rotation count after each.
+    """
+    counts = []
+    for i in range(n):
+        if ledger.due("s"):
+            ledger.rotated("s", f"server-{i}", "summary " * 100)
+        seed = ledger.take_seed("s")
+        prompt = f"question {i}"
+        sent = f"{seed}\n\nNew question:\n{prompt}" if seed else prompt
+        answer = "x" * (answer_tokens * 4)
+        ledger.record("s", prompt, answer, estimate_tokens(sent) + estimate_tokens(answer))
+        counts.append(ledger.rotations)
+    return counts
+
+
+def test_near_budget_seed_does_not_rotate_every_turn():
+    # two carried answers plus the summary come close to the whole budget
+    ledger = SessionLedger(budget=1500, carry_turns=2)
+    counts = run_turns(ledger, 8, answer_tokens=600)
+    assert counts == [0, 0, 0, 1, 1, 1, 2, 2]
+
+
+def test_rotation_counts_only_tokens_since_the_last_rotation():
+    ledger = SessionLedger(budget=1000, carry_turns=1)
+    ledger.record("s", "q1", "a1", 1200)
+    assert ledger.due("s")
+    ledger.rotated("s", "server-1", "summary")
+    assert not ledger.due("s")
+    ledger.take_seed("s")
+    ledger.record("s", "q2", "a2", 900)
+    assert not ledger.due("s")
+    assert not ledger.fresh("s")
+
+
+def test_evicted_handles_drop_their_ledger_state(fake_llama, make_service):
+    service = make_service(fake_llama(), service={"max_sessions": 1})
+    first = service.session("a")
+    first.ask("what is ChRIS?")
+    assert not service.agent.session_ledger.fresh(first.session_id)
+
+    service.session("b")
+    assert first.session_id not in service.agent.session_ledger._state
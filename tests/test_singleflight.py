@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+from agents.singleflight import SingleFlight, TurnAbandoned
+
+PROMPT = "How is leg length measured?"
+
+
+def arrive_after_result(agent, arrivals):
+    """
+    Start a new flight for the key the moment a leader publishes its result,
+    i.e. inside the window before that leader's own cleanup runs.
+    """
+    finish = agent.inflight.finish
+
+    def wrapped(key, *args, **kwargs):
+        finish(key, *args, **kwargs)
+        if "error" not in kwargs and not arrivals:
+            arrivals.append((key, *agent.inflight.begin(key)))
+
+    agent.inflight.finish = wrapped
+
+
+def assert_next_flight_intact(agent, arrivals):
+    key, flight, leader = arrivals[0]
+    assert leader
+    assert not flight.done()
+    _, leader = agent.inflight.begin(key)
+    assert not leader
+
+
+def test_late_finish_does_not_touch_a_newer_flight():
+    flights = SingleFlight()
+    first, leader = flights.begin("k")
+    assert leader
+    flights.finish("k", first, {"content": "a"})
+
+    second, leader = flights.begin("k")
+    assert leader
+    # the first leader's cleanup arrives after the key was reused
+    flights.finish("k", first, error=TurnAbandoned())
+    assert not second.done()
+    _, leader = flights.begin("k")
+    assert not leader
+
+    flights.finish("k", second, {"content": "b"})
+    assert second.result() == {"content": "b"}
+    assert len(flights) == 0
+
+
+def test_concurrent_identical_asks_share_one_turn(fake_llama, make_agent):
+    ls = fake_llama(token_latency=0.01)
+    agent = make_agent(ls, retrieval={"enabled": False})
+
+    def burst(n):
+        sessions = [agent.agent.create_session(f"t-{i}") for i in range(n)]
+        barrier = threading.Barrier(n)
+        results = [None] * n
+
+        def ask(i):
+            barrier.wait()
+            results[i] = agent.ask(PROMPT, session_id=sessions[i])
+
+        threads = [threading.Thread(target=ask, args=(i,)) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    arrivals = []
+    arrive_after_result(agent, arrivals)
+    first = burst(8)
+    assert ls.turns == 1
+    assert_next_flight_intact(agent, arrivals)
+    agent.inflight.finish(arrivals[0][0], arrivals[0][1], error=TurnAbandoned())
+    assert all(r["content"] == first[0]["content"] for r in first)
+    # a second burst gets exactly one new leader; the first leader's
+    # cleanup must not fail it or let a second leader start
+    burst(8)
+    assert ls.turns == 2
+    assert len(agent.inflight) == 0
+
+
+def test_concurrent_identical_aasks_share_one_turn(fake_llama, make_agent):
+    ls = fake_llama(token_latency=0.01)
+    agent = make_agent(ls, retrieval={"enabled": False})
+
+    arrivals = []
+    arrive_after_result(agent, arrivals)
+
+    async def run():
+        first = await asyncio.gather(*(agent.aask(PROMPT, session_key=f"a-{i}") for i in range(5)))
+        assert_next_flight_intact(agent, arrivals)
+        agent.inflight.finish(arrivals[0][0], arrivals[0][1], error=TurnAbandoned())
+        second = await asyncio.gather(*(agent.aask(PROMPT, session_key=f"b-{i}") for i in range(5)))
+        await agent.aclose()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert ls.turns == 2
+    assert len({r["content"] for r in first + second}) == 1
+    assert len(agent.inflight) == 0
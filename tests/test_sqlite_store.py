@@ -0,0 +1,108 @@
+import json
+import time
+
+import pytest
+
+from memory.sqlite_store import SQLiteMemoryStore
+
+
+@pytest.fixture(params=["sqlite", "chroma"])
+def store(request, tmp_path):
+    """
+    Factory for a memory store on either backend, so the SQLite store is
+    held to the `ChromaMemoryStore` read contract `app.py` relies on.
+    """
+    def make(**kwargs):
+        if request.param == "chroma":
+            return request.getfixturevalue("chroma_store")(write_behind=False, **kwargs)
+        return SQLiteMemoryStore(str(tmp_path / "history.db"), import_json=None, **kwargs)
+
+    return make
+
+
+def fill(store, n: int, **kwargs):
+    for i in range(n):
+        store.append_message("user" if i % 2 == 0 else "assistant", f"message {i}", **kwargs)
+        time.sleep(0.002)  # distinct timestamps for the cursors
+
+
+def contents(messages):
+    return [m["content"] for m in messages]
+
+
+def test_windows_are_oldest_first_and_bounded(store):
+    s = store()
+    fill(s, 6)
+    history = s.get_messages()
+    assert contents(history) == [f"message {i}" for i in range(6)]
+    assert [m["role"] for m in history[:2]] == ["user", "assistant"]
+
+    assert contents(s.get_recent(3)) == ["message 3", "message 4", "message 5"]
+    assert contents(s.get_before(history[3]["ts"], 2)) == ["message 1", "message 2"]
+    assert contents(s.get_before(history[1]["ts"], 5)) == ["message 0"]
+    assert contents(s.get_after(history[1]["ts"], 2)) == ["message 2", "message 3"]
+    assert s.get_after(history[-1]["ts"], 5) == []
+
+
+def test_reads_are_filtered_by_thread(store):
+    s = store(thread_id="a")
+    fill(s, 2)
+    fill(s, 3, thread_id="b")
+
+    assert contents(s.get_recent(10)) == ["message 0", "message 1"]
+    assert contents(s.get_recent(2, thread_id="b")) == ["message 1", "message 2"]
+    assert contents(s.get_messages(thread_id="b")) == ["message 0", "message 1", "message 2"]
+    # the default thread's cursor skips over thread b's later messages
+    cursor = s.get_messages()[0]["ts"]
+    assert contents(s.get_after(cursor, 10)) == ["message 1"]
+
+
+def test_legacy_json_history_is_imported_once(tmp_path):
+    legacy = tmp_path / ".chat_history.json"
+    legacy.write_text(json.dumps([
+        {"role": "user", "content": "what is ChRIS"},
+        {"role": "assistant", "content": "a platform", "context": ["chunk:abc"]},
+    ]))
+    db = str(tmp_path / "history.db")
+
+    s = SQLiteMemoryStore(db, import_json=str(legacy))
+    history = s.get_messages()
+    assert contents(history) == ["what is ChRIS", "a platform"]
+    assert history[1]["context"] == ["chunk:abc"]
+    assert s.adopt_unthreaded("t1") == 2
+    assert contents(s.get_recent(10, thread_id="t1")) == ["what is ChRIS", "a platform"]
+    s.close()
+
+    # a non-empty store never imports again
+    s = SQLiteMemoryStore(db, import_json=str(legacy))
+    assert len(s.get_messages()) == 2
+
+
+def test_unreadable_json_history_is_skipped(tmp_path):
+    legacy = tmp_path / ".chat_history.json"
+    legacy.write_text("{not json")
+    s = SQLiteMemoryStore(str(tmp_path / "history.db"), import_json=str(legacy))
+    assert s.get_messages() == []
+
+
+def test_recall_ranks_by_full_text_match(tmp_path):
+    s = SQLiteMemoryStore(str(tmp_path / "history.db"), thread_id="a", import_json=None)
+    s.append_message("user", "how do I run a DICOM conversion pipeline?")
+    s.append_message("assistant", "use pl-dcm2niix in a pipeline")
+    time.sleep(0.002)
+    cutoff = time.time()
+    s.append_message("user", "what is the weather like")
+    s.append_message("user", "another dicom question", thread_id="b")
+
+    hits = s.recall("DICOM pipeline", k=5)
+    assert contents(hits)[0] == "how do I run a DICOM conversion pipeline?"
+    assert set(contents(hits)) == {"how do I run a DICOM conversion pipeline?",
+                                   "use pl-dcm2niix in a pipeline"}
+    assert all("distance" in h for h in hits)
+
+    assert len(s.recall("DICOM pipeline", k=1)) == 1
+    assert s.recall("pipeline", since=cutoff) == []
+    assert contents(s.recall("weather", until=cutoff)) == []
+    assert contents(s.recall("dicom", thread_id="b")) == ["another dicom question"]
+    # punctuation alone is not an FTS query
+    assert s.recall("?!") == []
@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+
+import pytest
+
+from agents.tools import CachedMCPTool, ToolResultCache, cache_key, mcp_tools
+
+
+class FakeToolRuntime:
+    """
+    `client.tool_runtime` stand-in: counts calls and fails while `error` is set.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+
+    def invoke_tool(self, tool_name, kwargs):
+        self.calls += 1
+        return SimpleNamespace(error_message=self.error, content=f"{tool_name}:{kwargs}")
+
+
+def definition(name: str) -> dict:
+    return {"identifier": name, "description": name, "parameters": []}
+
+
+def test_cache_key_ignores_argument_order_and_number_spelling():
+    assert cache_key("plugin_search", {"name": "dcm", "limit": 2}) == \
+        cache_key("plugin_search", {"limit": 2.0, "name": "dcm"})
+    assert cache_key("plugin_search", {"filter": {"b": [1.0], "a": 1}}) == \
+        cache_key("plugin_search", {"filter": {"a": 1, "b": [1]}})
+    assert cache_key("plugin_search", {"limit": 2.5}) != cache_key("plugin_search", {"limit": 2})
+    assert cache_key("plugin_search", {}) != cache_key("plugin_info", {})
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("agents.tools.time.time", lambda: now[0])
+    cache = ToolResultCache(ttl=60, max_entries=8)
+    calls = []
+
+    def call():
+        calls.append(now[0])
+        return len(calls)
+
+    assert cache.get_or_call("plugin_search", {"q": "dcm"}, call) == 1
+    now[0] += 60
+    assert cache.get_or_call("plugin_search", {"q": "dcm"}, call) == 1
+    now[0] += 1
+    assert cache.get_or_call("plugin_search", {"q": "dcm"}, call) == 2
+    assert cache.hits == {"plugin_search": 1}
+    assert cache.misses == {"plugin_search": 2}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ToolResultCache(ttl=300, max_entries=2)
+    calls = []
+
+    def lookup(q):
+        return cache.get_or_call("plugin_search", {"q": q}, lambda: calls.append(q) or q)
+
+    lookup("a")
+    lookup("b")
+    lookup("a")  # hit; "b" is now the oldest
+    lookup("c")
+    assert len(cache) == 2
+
+    lookup("a")
+    lookup("b")
+    assert calls == ["a", "b", "c", "b"]
+
+
+def test_errors_are_raised_and_never_cached():
+    runtime = FakeToolRuntime()
+    tool = CachedMCPTool(SimpleNamespace(tool_runtime=runtime), definition("plugin_search"),
+                         ToolResultCache())
+
+    runtime.error = "CUBE unreachable"
+    with pytest.raises(RuntimeError, match="CUBE unreachable"):
+        tool.run_impl(q="dcm")
+    assert len(tool.cache) == 0
+
+    runtime.error = None
+    assert tool.run_impl(q="dcm") == tool.run_impl(q="dcm")
+    assert runtime.calls == 2
+
+
+def test_mcp_tools_splits_cacheable_tools_from_server_side_ones():
+    client = SimpleNamespace(tool_runtime=FakeToolRuntime())
+    definitions = [definition("plugin_search"), definition("run_plugin")]
+
+    tools = mcp_tools("mcp::chris", definitions, ["plugin_search", "missing"], client,
+                      ToolResultCache())
+    assert len(tools) == 2
+    assert isinstance(tools[0], CachedMCPTool)
+    assert tools[0].get_name() == "plugin_search"
+    assert tools[1] == "mcp::chris/run_plugin"
+
+
+@pytest.mark.parametrize("definitions, cacheable, cache", [
+    ([definition("plugin_search")], ["plugin_search"], None),
+    ([], ["plugin_search"], ToolResultCache()),
+    ([definition("plugin_search")], [], ToolResultCache()),
+])
+def test_mcp_tools_falls_back_to_the_whole_toolgroup(definitions, cacheable, cache):
+    assert mcp_tools("mcp::chris", definitions, cacheable, None, cache) == ["mcp::chris"]
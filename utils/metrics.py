@@ -0,0 +1,170 @@
+import json
+import math
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (~4 characters per token) for when the server does
+    not report usage.
+    """
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def _labels_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = _labels_key(labels)
+        series = self._series.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, n) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                cumulative += c
+                le = 'le="%s"' % ("+Inf" if bound == math.inf else repr(float(bound)))
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {n}")
+        return "\n".join(lines)
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._series: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels_key(labels)
+        self._series[key] = self._series.get(key, 0) + amount
+
+    def snapshot(self) -> Dict[tuple, float]:
+        """
+        Current value of every label set, keyed by sorted `(label, value)` pairs.
+        """
+        return dict(self._series)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{_fmt_labels(key)} {value}")
+        return "\n".join(lines)
+
+
+class MetricsRegistry:
+    """
+    In-process metrics registry. Thread-safe; renders all metrics in the
+    Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, object] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help, buckets))
+
+    def counter(self, name: str, help: str) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help))
+
+    def observe(self, name: str, value: float, **labels):
+        with self._lock:
+            self._metrics[name].observe(value, **labels)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        with self._lock:
+            self._metrics[name].inc(amount, **labels)
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """
+        Expose `/metrics` over HTTP from a daemon thread. Only the first call
+        starts a server; later calls return it.
+        """
+        with self._lock:
+            if self._server is None:
+                self._server = self._start_server(port, host)
+            return self._server
+
+    def _start_server(self, port: int, host: str) -> ThreadingHTTPServer:
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+class TraceWriter:
+    """
+    Appends one JSON record per line to a trace file.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fh = open(self.path, "a", buffering=1, encoding="utf-8")
+
+    def write(self, record: dict):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._fh.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._fh.close()
+
+
+# Process-wide registry shared by all agents
+REGISTRY = MetricsRegistry()
+
+
+def open_trace(path: Optional[str]) -> Optional[TraceWriter]:
+    return TraceWriter(path) if path else None